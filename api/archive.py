@@ -0,0 +1,60 @@
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import router, transaction
+
+from .models import ArchivedIntake, MedicationIntake
+from .stats import ensure_rollup
+from .versions import bump_version
+
+ARCHIVE_CHUNK_SIZE = 1000
+# колонки приёма в том виде, в каком их принимает конструктор модели (schedule_id, а не schedule)
+INTAKE_FIELDS = tuple(field.attname for field in MedicationIntake._meta.concrete_fields)
+
+
+def archive_cutoff(today=None, days=None):
+    # приёмы с датой раньше этого дня лежат в архиве (или окажутся там при следующем запуске archive_intakes)
+    days = settings.INTAKE_ARCHIVE_AFTER_DAYS if days is None else days
+    return (today or date.today()) - timedelta(days=days)
+
+
+def archive_intakes(cutoff, chunk_size=ARCHIVE_CHUNK_SIZE):
+    """
+    Переносит приёмы с датой раньше cutoff из MedicationIntake в ArchivedIntake пачками по chunk_size,
+    каждую пачку - в своей транзакции. Это не удаление данных пользователем: tombstone-записи не создаются,
+    статистика не меняется (закрытые дни до переноса сворачиваются в DailyAdherence), версия коллекции
+    intakes увеличивается, чтобы ETag и кэш ответов не отдавали старые страницы. Возвращает число приёмов.
+    """
+    # база пользовательских таблиц (в командах - текущий шард из use_shard)
+    using = router.db_for_write(MedicationIntake)
+    queryset = MedicationIntake.objects.using(using).filter(scheduled_date__lt=cutoff.isoformat()).order_by('pk')
+    rolled_up = set()
+    archived = 0
+    last_pk = None
+    while True:
+        # идём по ключу: перенесённые строки из выборки исчезают, но соседние пачки не пересчитываются заново
+        chunk = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        with transaction.atomic(using=using):
+            rows = [dict(zip(INTAKE_FIELDS, row))
+                    for row in chunk.select_for_update().values_list(*INTAKE_FIELDS)[:chunk_size]]
+            if not rows:
+                break
+            user_ids = {row['user_id'] for row in rows if row['user_id']}
+            for user_id in user_ids - rolled_up:
+                # статистика закрытых дней читается из свёртки - сворачиваем до того, как приёмы уйдут из таблицы
+                ensure_rollup(user_id, cutoff - timedelta(days=1))
+            rolled_up |= user_ids
+            # приём с тем же id уже в архиве (клиент создал его заново после переноса) - остаётся более новая версия
+            ArchivedIntake.objects.using(using).bulk_create(
+                [ArchivedIntake(**row) for row in rows],
+                update_conflicts=True, unique_fields=['id'], update_fields=[field for field in INTAKE_FIELDS if field != 'id'],
+            )
+            ids = [row['id'] for row in rows]
+            MedicationIntake.objects.using(using).filter(pk__in=ids)._raw_delete(using)
+            for user_id in user_ids:
+                bump_version(user_id, 'intakes')
+        archived += len(rows)
+        last_pk = ids[-1]
+        if len(rows) < chunk_size:
+            break
+    return archived
@@ -0,0 +1,100 @@
+from datetime import date
+
+from django.http import HttpResponse, HttpResponseNotModified
+from django.views import View
+from rest_framework import exceptions
+
+from .authentication import AsyncTokenAuthentication
+from .etag import etag_matches, make_etag
+from .models import Medication, MedicationSchedule, MedicationIntake
+from .pagination import IntakePagination, KeysetPagination
+from .renderers import FastJSONRenderer
+from .rows import row_builder
+from .serializers import MedicationSerializer, MedicationScheduleSerializer, MedicationIntakeSerializer
+from .versions import aget_version
+from .views import filter_intakes, filter_schedules
+
+
+class AsyncListView(View):
+    """
+    Async-вариант list() для самых частых чтений: обычное async-представление Django (DRF async не умеет),
+    под ASGI выполняется в event loop без отдельного потока на запрос.
+    Токен проверяется AsyncTokenAuthentication, строки читаются async ORM через RowBuilder,
+    поэтому тело ответа, ETag/304 и keyset-пагинация (Link) такие же, как у синхронного эндпоинта.
+    """
+    http_method_names = ['get', 'head', 'options']
+    resource = None
+    serializer_class = None
+    pagination_class = KeysetPagination
+    authentication = AsyncTokenAuthentication()
+    renderer = FastJSONRenderer()
+
+    def get_queryset(self, request, user):
+        raise NotImplementedError
+
+    def get_etag_key(self, request):
+        # всё, от чего кроме версии коллекции зависит ответ
+        return request.get_full_path()
+
+    async def get(self, request):
+        try:
+            auth = await self.authentication.aauthenticate(request)
+            if auth is None:
+                raise exceptions.NotAuthenticated()
+            user = auth[0]
+
+            version = await aget_version(user.pk, self.resource)
+            etag = make_etag(self.resource, version, user.pk, self.get_etag_key(request))
+            headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+            if etag_matches(etag, request):
+                return HttpResponseNotModified(headers=headers)
+
+            builder = row_builder(self.serializer_class)
+            paginator = self.pagination_class()
+            rows = await paginator.apaginate_queryset(builder.values(self.get_queryset(request, user)), request)
+        except exceptions.APIException as exc:
+            return self.handle_exception(exc)
+
+        headers.update(paginator.get_headers())
+        return HttpResponse(self.renderer.render(builder.build(rows)), content_type='application/json', headers=headers)
+
+    def handle_exception(self, exc):
+        # тот же формат, что у rest_framework.views.exception_handler
+        data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+        response = HttpResponse(self.renderer.render(data), content_type='application/json', status=exc.status_code)
+        if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+            response['WWW-Authenticate'] = self.authentication.authenticate_header(None)
+        return response
+
+
+class AsyncMedicationListView(AsyncListView):
+    # GET /api/async/medications/ - как GET /api/medications/
+    resource = 'medications'
+    serializer_class = MedicationSerializer
+
+    def get_queryset(self, request, user):
+        return Medication.objects.filter(user=user)
+
+
+class AsyncScheduleListView(AsyncListView):
+    # GET /api/async/schedules/ - как GET /api/schedules/
+    resource = 'schedules'
+    serializer_class = MedicationScheduleSerializer
+
+    def get_queryset(self, request, user):
+        return filter_schedules(MedicationSchedule.objects.filter(user=user), request)
+
+
+class AsyncTodayIntakesView(AsyncListView):
+    # GET /api/async/intakes/today/ - как GET /api/intakes/?date=<сегодня>, остальные фильтры те же
+    resource = 'intakes'
+    serializer_class = MedicationIntakeSerializer
+    pagination_class = IntakePagination
+
+    def get_etag_key(self, request):
+        # после полуночи тот же путь отдаёт другой день, а версия коллекции не меняется
+        return f'{request.get_full_path()}|{date.today().isoformat()}'
+
+    def get_queryset(self, request, user):
+        queryset = MedicationIntake.objects.filter(user=user, scheduled_date=date.today().isoformat())
+        return filter_intakes(queryset, request)
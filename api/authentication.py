@@ -0,0 +1,157 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication, get_authorization_header
+
+from .routers import set_route_user, use_primary
+
+
+class TokenUserCache:
+    """
+    Кэш "ключ токена -> пользователь" с ограниченным размером (LRU) и временем жизни.
+    По умолчанию живёт в памяти процесса; если в AUTH_TOKEN_CACHE задан CACHE_ALIAS,
+    используется общий кэш Django, и сброс записи виден сразу всем воркерам.
+    """
+
+    def __init__(self, max_size=10000, ttl=60, cache_alias=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.cache_alias = cache_alias
+        self._entries = OrderedDict()  # key -> (user, expires_at)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls):
+        options = getattr(settings, 'AUTH_TOKEN_CACHE', {})
+        return cls(
+            max_size=options.get('MAX_SIZE', 10000),
+            ttl=options.get('TTL', 60),
+            cache_alias=options.get('CACHE_ALIAS'),
+        )
+
+    @staticmethod
+    def _cache_key(key):
+        return f'auth-token:{key}'
+
+    def get(self, key):
+        if self.cache_alias:
+            return caches[self.cache_alias].get(self._cache_key(key))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            user, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return user
+
+    def set(self, key, user):
+        if self.cache_alias:
+            caches[self.cache_alias].set(self._cache_key(key), user, self.ttl)
+            return
+        with self._lock:
+            self._entries[key] = (user, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    async def aget(self, key):
+        # локальный кэш читается без ввода-вывода, общий - через async API кэша Django
+        if self.cache_alias:
+            return await caches[self.cache_alias].aget(self._cache_key(key))
+        return self.get(key)
+
+    async def aset(self, key, user):
+        if self.cache_alias:
+            await caches[self.cache_alias].aset(self._cache_key(key), user, self.ttl)
+            return
+        self.set(key, user)
+
+    def evict(self, *keys):
+        if self.cache_alias:
+            caches[self.cache_alias].delete_many([self._cache_key(key) for key in keys])
+            return
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        if self.cache_alias:
+            return
+        with self._lock:
+            self._entries.clear()
+
+
+token_cache = TokenUserCache.from_settings()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication без запроса token+user к базе на каждый запрос.
+    Записи сбрасываются при выходе (удаление токена), смене пароля и деактивации (сохранение пользователя),
+    см. api/signals.py.
+    """
+
+    def authenticate_credentials(self, key):
+        user = token_cache.get(key)
+        if user is None:
+            # токен только что выданного входа мог ещё не дойти до реплики
+            with use_primary():
+                user, token = super().authenticate_credentials(key)
+            token_cache.set(key, user)
+            set_route_user(user.pk)
+            return user, token
+        # копия, чтобы изменения request.user в одном запросе не попадали в другие
+        user = copy.copy(user)
+        set_route_user(user.pk)
+        return user, self.get_model()(key=key, user=user)
+
+
+class AsyncTokenAuthentication(CachedTokenAuthentication):
+    """
+    То же для async-представлений (api/async_views.py): ключ ищется в token_cache,
+    при промахе token+user читаются async ORM без потока на запрос.
+    Ошибки и их тексты - как у TokenAuthentication.
+    """
+
+    async def aauthenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) == 1:
+            raise exceptions.AuthenticationFailed(_('Invalid token header. No credentials provided.'))
+        if len(auth) > 2:
+            raise exceptions.AuthenticationFailed(_('Invalid token header. Token string should not contain spaces.'))
+        try:
+            key = auth[1].decode()
+        except UnicodeError:
+            raise exceptions.AuthenticationFailed(
+                _('Invalid token header. Token string should not contain invalid characters.')
+            )
+        return await self.aauthenticate_credentials(key)
+
+    async def aauthenticate_credentials(self, key):
+        user = await token_cache.aget(key)
+        if user is None:
+            model = self.get_model()
+            try:
+                with use_primary():
+                    token = await model.objects.select_related('user').aget(key=key)
+            except model.DoesNotExist:
+                raise exceptions.AuthenticationFailed(_('Invalid token.'))
+            if not token.user.is_active:
+                raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+            await token_cache.aset(key, token.user)
+            set_route_user(token.user.pk)
+            return token.user, token
+        user = copy.copy(user)
+        set_route_user(user.pk)
+        return user, self.get_model()(key=key, user=user)
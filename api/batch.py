@@ -0,0 +1,165 @@
+from django.db import transaction
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+
+from .db import write_alias
+from .models import Medication, MedicationSchedule, MedicationIntake
+from .serializers import MedicationSerializer, MedicationScheduleSerializer, MedicationIntakeSerializer
+
+MAX_OPERATIONS = 500
+
+OPERATIONS = ('create', 'update', 'delete')
+SERIALIZERS = {
+    'medications': MedicationSerializer,
+    'schedules': MedicationScheduleSerializer,
+    'intakes': MedicationIntakeSerializer,
+}
+
+
+class BatchFailed(Exception):
+    pass
+
+
+def validate_operations(operations):
+    if not isinstance(operations, list) or not operations:
+        raise ValidationError({'operations': 'A non-empty list is required.'})
+    if len(operations) > MAX_OPERATIONS:
+        raise ValidationError({'operations': f'At most {MAX_OPERATIONS} operations per request.'})
+
+    errors = {}
+    for index, operation in enumerate(operations):
+        if not isinstance(operation, dict):
+            errors[index] = 'Must be an object.'
+        elif operation.get('op') not in OPERATIONS:
+            errors[index] = f'op must be one of: {", ".join(OPERATIONS)}.'
+        elif operation.get('resource') not in SERIALIZERS:
+            errors[index] = f'resource must be one of: {", ".join(SERIALIZERS)}.'
+        elif not isinstance(operation.get('data'), dict) and not (operation['op'] == 'delete' and operation.get('data') is None):
+            # у delete data можно не передавать, но если передано - это тоже объект
+            errors[index] = 'data must be an object.'
+        elif operation['op'] != 'create' and not operation.get('id'):
+            errors[index] = 'id is required.'
+    if errors:
+        raise ValidationError({'operations': errors})
+
+
+class Batch:
+    """Применяет упорядоченный список операций create/update/delete в одной транзакции."""
+
+    def __init__(self, request, operations):
+        self.request = request
+        self.user = request.user
+        self.operations = operations
+        self.objects = {resource: {} for resource in SERIALIZERS}
+
+    def prefetch(self):
+        # все объекты, на которые ссылаются операции, - одним запросом на тип
+        ids = {resource: set() for resource in SERIALIZERS}
+        for operation in self.operations:
+            resource = operation['resource']
+            data = operation['data'] if operation['op'] != 'delete' else {}
+            if operation.get('id'):
+                ids[resource].add(str(operation['id']))
+            if data.get('medicationId') and resource != 'medications':
+                ids['medications'].add(str(data['medicationId']))
+            if data.get('scheduleId') and resource == 'intakes':
+                ids['schedules'].add(str(data['scheduleId']))
+
+        if ids['intakes']:
+            self.objects['intakes'] = MedicationIntake.objects.filter(user=self.user).in_bulk(list(ids['intakes']))
+            for intake in self.objects['intakes'].values():
+                ids['schedules'].add(intake.schedule_id)
+                ids['medications'].add(intake.medication_id)
+        if ids['schedules']:
+            self.objects['schedules'] = MedicationSchedule.objects.filter(user=self.user).in_bulk(list(ids['schedules']))
+            for schedule in self.objects['schedules'].values():
+                ids['medications'].add(schedule.medication_id)
+        if ids['medications']:
+            self.objects['medications'] = Medication.objects.filter(user=self.user).in_bulk(list(ids['medications']))
+
+        # связи берём из уже загруженного, чтобы сериализаторы не ходили в базу за schedule.medication
+        for schedule in self.objects['schedules'].values():
+            if schedule.medication_id in self.objects['medications']:
+                schedule.medication = self.objects['medications'][schedule.medication_id]
+        for intake in self.objects['intakes'].values():
+            if intake.schedule_id in self.objects['schedules']:
+                intake.schedule = self.objects['schedules'][intake.schedule_id]
+            if intake.medication_id in self.objects['medications']:
+                intake.medication = self.objects['medications'][intake.medication_id]
+
+    def run(self):
+        """Возвращает (успех, результаты по каждой операции). При ошибке все изменения откатываются."""
+        results = []
+        try:
+            # все операции пакета пишутся в шард пользователя - транзакция открывается там же
+            with transaction.atomic(using=write_alias()):
+                self.prefetch()
+                for operation in self.operations:
+                    result = self.apply(operation)
+                    results.append(result)
+                    if 'errors' in result:
+                        raise BatchFailed
+        except BatchFailed:
+            return False, results
+        return True, results
+
+    def apply(self, operation):
+        op, resource = operation['op'], operation['resource']
+        object_id = str(operation['id']) if operation.get('id') else None
+        serializer_class = SERIALIZERS[resource]
+        context = {
+            'request': self.request,
+            'medications': self.objects['medications'],
+            'schedules': self.objects['schedules'],
+        }
+
+        if op == 'create':
+            data = dict(operation['data'])
+            if object_id:
+                data.setdefault('id', object_id)
+            serializer = serializer_class(data=data, context=context)
+            if not serializer.is_valid():
+                return {'status': status.HTTP_400_BAD_REQUEST, 'id': data.get('id'), 'errors': serializer.errors}
+            instance, error = self.save(serializer, user=self.user)
+            if error:
+                return {'status': status.HTTP_400_BAD_REQUEST, 'id': data.get('id'), 'errors': error}
+            self.objects[resource][instance.pk] = instance
+            return {'status': status.HTTP_201_CREATED, 'id': instance.pk, 'data': serializer.data}
+
+        instance = self.objects[resource].get(object_id)
+        if instance is None:
+            return {'status': status.HTTP_404_NOT_FOUND, 'id': object_id, 'errors': {'detail': 'Not found.'}}
+
+        if op == 'update':
+            serializer = serializer_class(instance, data=operation['data'], partial=True, context=context)
+            if not serializer.is_valid():
+                return {'status': status.HTTP_400_BAD_REQUEST, 'id': object_id, 'errors': serializer.errors}
+            _, error = self.save(serializer)
+            if error:
+                return {'status': status.HTTP_400_BAD_REQUEST, 'id': object_id, 'errors': error}
+            return {'status': status.HTTP_200_OK, 'id': object_id, 'data': serializer.data}
+
+        self.forget(resource, instance.pk)
+        instance.delete()
+        return {'status': status.HTTP_204_NO_CONTENT, 'id': object_id}
+
+    def save(self, serializer, **kwargs):
+        # сериализаторы сообщают о чужих/несуществующих связях исключениями - превращаем их в ошибку операции
+        try:
+            return serializer.save(**kwargs), None
+        except ValidationError as error:
+            return None, error.detail
+        except (Medication.DoesNotExist, MedicationSchedule.DoesNotExist):
+            return None, {'detail': 'Related object not found.'}
+
+    def forget(self, resource, object_id):
+        # удалённое (в том числе каскадом) больше нельзя обновлять в этом же пакете
+        self.objects[resource].pop(object_id, None)
+        if resource == 'medications':
+            for cache in (self.objects['schedules'], self.objects['intakes']):
+                for pk in [pk for pk, obj in cache.items() if obj.medication_id == object_id]:
+                    del cache[pk]
+        elif resource == 'schedules':
+            cache = self.objects['intakes']
+            for pk in [pk for pk, obj in cache.items() if obj.schedule_id == object_id]:
+                del cache[pk]
@@ -0,0 +1,70 @@
+import functools
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.db import OperationalError, connections, router, transaction
+
+from .models import Medication
+
+logger = logging.getLogger('api.db')
+
+LOCKED_MESSAGES = ('database is locked', 'database table is locked')
+
+
+def is_locked_error(error):
+    return isinstance(error, OperationalError) and any(message in str(error) for message in LOCKED_MESSAGES)
+
+
+def write_alias():
+    # база пользовательских таблиц текущего запроса или команды: шард пользователя, без шардов - default
+    return router.db_for_write(Medication)
+
+
+def retry_on_locked(func=None, *, attempts=None, delay=None, using=None):
+    """
+    Повторяет функцию, если SQLite ответил "database is locked" (истёк SQLITE_BUSY_TIMEOUT при конкурентной записи).
+    Каждая попытка - отдельная транзакция, так что повтор не видит половины прошлой.
+    Внутри чужого atomic-блока ошибка пробрасывается сразу: откатить и повторить можно только всю транзакцию.
+    Транзакция открывается в базе using, по умолчанию - в шарде пользователя (write_alias() на момент вызова).
+    По умолчанию число попыток и задержка берутся из DB_RETRY_ON_LOCKED.
+    """
+    if func is None:
+        return functools.partial(retry_on_locked, attempts=attempts, delay=delay, using=using)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        options = getattr(settings, 'DB_RETRY_ON_LOCKED', {})
+        max_attempts = attempts or options.get('ATTEMPTS', 3)
+        pause = delay if delay is not None else options.get('DELAY', 0.05)
+        alias = using or write_alias()
+        if connections[alias].in_atomic_block:
+            return func(*args, **kwargs)
+        for attempt in range(1, max_attempts + 1):
+            try:
+                with transaction.atomic(using=alias):
+                    return func(*args, **kwargs)
+            except OperationalError as error:
+                if not is_locked_error(error) or attempt == max_attempts:
+                    raise
+                logger.warning('%s: %s, retry %d of %d', func.__qualname__, error, attempt, max_attempts - 1)
+                # разброс, чтобы столкнувшиеся воркеры не повторяли одновременно
+                time.sleep(pause * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+    return wrapper
+
+
+class RetryOnLockedMixin:
+    """create/update/destroy viewset'а целиком повторяются при "database is locked" (request.data уже разобран)."""
+
+    @retry_on_locked
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
+
+    @retry_on_locked
+    def update(self, request, *args, **kwargs):
+        return super().update(request, *args, **kwargs)
+
+    @retry_on_locked
+    def destroy(self, request, *args, **kwargs):
+        return super().destroy(request, *args, **kwargs)
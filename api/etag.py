@@ -0,0 +1,71 @@
+import hashlib
+
+from rest_framework import status
+from rest_framework.response import Response
+
+from .response_cache import get_response_cache
+from .versions import get_version
+
+
+def parse_etags(header):
+    # слабые ETag (W/"...") сравниваем как обычные
+    return {tag.strip().removeprefix('W/') for tag in (header or '').split(',') if tag.strip()}
+
+
+def make_etag(resource, version, user_id, full_path, format='json'):
+    key = f'{user_id}|{full_path}|{format}'
+    return f'"{resource}-{version}-{hashlib.md5(key.encode()).hexdigest()[:12]}"'
+
+
+def etag_matches(etag, request):
+    client_etags = parse_etags(request.headers.get('If-None-Match'))
+    return etag in client_etags or '*' in client_etags
+
+
+class ETagMixin:
+    """
+    ETag / If-None-Match для list и retrieve. ETag строится из счётчика версий коллекции пользователя
+    (ResourceVersion), поэтому на совпадение отвечаем 304 после одного запроса к счётчику,
+    без выборки строк и сериализации.
+    При включённом RESPONSE_CACHE тот же счётчик входит в ключ кэша ответов (api/response_cache.py).
+    """
+    etag_resource = None
+
+    def get_etag(self, request, version):
+        return make_etag(
+            self.etag_resource, version, request.user.pk, request.get_full_path(), request.accepted_renderer.format
+        )
+
+    def cached_handler(self, handler, request, version, *args, **kwargs):
+        response_cache = get_response_cache()
+        if not response_cache.enabled:
+            return handler(request, *args, **kwargs)
+
+        def build():
+            response = handler(request, *args, **kwargs)
+            cacheable = response.status_code == status.HTTP_200_OK
+            # кэшируются данные и заголовки (Link), а не отрисованный ответ - формат выбирается при каждом запросе
+            headers = {name: value for name, value in response.headers.items() if name.lower() != 'content-type'}
+            return (response.data, headers, response.status_code), cacheable
+
+        key = response_cache.make_key(request.user.pk, self.etag_resource, version, request.get_full_path())
+        data, headers, status_code = response_cache.get_or_build(key, build)
+        return Response(data, status=status_code, headers=headers)
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        version = get_version(request.user.pk, self.etag_resource)
+        etag = self.get_etag(request, version)
+        headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+        if etag_matches(etag, request):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        response = self.cached_handler(handler, request, version, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            for name, value in headers.items():
+                response[name] = value
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(super().retrieve, request, *args, **kwargs)
@@ -0,0 +1,91 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from .models import MedicationIntake
+from .sharding import use_user
+from .utils import now_ms
+from .versions import bump_version
+
+FANOUT_CHUNK_SIZE = 1000
+
+# поле лекарства/расписания -> продублированное поле приёма
+MEDICATION_FIELDS = {
+    'name': 'medication_name',
+    'dosage_per_unit': 'dosage_per_unit',
+    'instructions': 'instructions',
+    'unit': 'unit',
+    'icon_name': 'icon_name',
+    'icon_color': 'icon_color',
+}
+SCHEDULE_FIELDS = {
+    'meal_relation': 'meal_relation',
+}
+
+_executor = None
+
+
+def get_executor():
+    # один фоновый поток на процесс: правки применяются по очереди и не держат запрос
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='intake-fanout')
+    return _executor
+
+
+def fan_out(lookup, changes, chunk_size=FANOUT_CHUNK_SIZE):
+    """
+    Переносит изменённые поля в ожидающие приёмы (сегодня и позже) set-based UPDATE'ами по chunk_size строк.
+    lookup - фильтр приёмов, например {'medication_id': ...}; changes - {поле приёма: значение}.
+    Возвращает число обновлённых приёмов.
+    """
+    queryset = MedicationIntake.objects.filter(
+        **lookup,
+        status=MedicationIntake.Status.PENDING,
+        scheduled_date__gte=date.today().isoformat(),
+    ).order_by('pk')
+    timestamp = now_ms()
+    updated = 0
+    last_pk = None
+    while True:
+        chunk = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        pks = list(chunk.values_list('pk', flat=True)[:chunk_size])
+        if not pks:
+            break
+        # changed_at меняется, чтобы приёмы попали в /api/sync/
+        updated += MedicationIntake.objects.filter(pk__in=pks).update(**changes, updated_at=timestamp, changed_at=timestamp)
+        if len(pks) < chunk_size:
+            break
+        last_pk = pks[-1]
+    if updated:
+        # UPDATE идёт в обход сигналов - версию коллекции приёмов меняем сами
+        bump_version(lookup.get('user_id'), 'intakes')
+    return updated
+
+
+def _run_in_background(lookup, changes):
+    close_old_connections()
+    try:
+        # в фоновом потоке нет запроса - шард пользователя задаём явно
+        with use_user(lookup.get('user_id')):
+            fan_out(lookup, changes)
+    finally:
+        close_old_connections()
+
+
+def schedule_fan_out(lookup, changes, using=None):
+    # INTAKE_FANOUT_ASYNC=True - переносим правки после коммита в фоновом потоке, иначе сразу в той же транзакции.
+    # using - база, в которую записали правку (шард пользователя): ждём коммита её транзакции, а не default
+    if not changes:
+        return
+    if getattr(settings, 'INTAKE_FANOUT_ASYNC', False):
+        transaction.on_commit(lambda: get_executor().submit(_run_in_background, lookup, changes), using=using)
+    else:
+        fan_out(lookup, changes)
+
+
+def intake_changes(instance, field_map):
+    changed = instance.changed_fields()
+    return {field_map[field]: value for field, value in changed.items() if field in field_map}
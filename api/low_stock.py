@@ -0,0 +1,62 @@
+from django.db.models import F, Q
+
+from .models import Medication
+from .utils import now_ms
+
+ALERT_BATCH_SIZE = 500
+
+
+def low_stock_medications():
+    # условия совпадают с частичным индексом medication_low_stock_idx
+    return Medication.objects.filter(
+        Q(user__notification_settings__isnull=True) | Q(user__notification_settings__low_stock_reminders_enabled=True),
+        track_stock=True,
+        remaining_quantity__lte=F('low_stock_threshold'),
+        low_stock_alerted_at__isnull=True,
+    )
+
+
+def rearm_restocked():
+    # запас пополнили выше порога - следующее снижение снова даст уведомление
+    return Medication.objects.filter(
+        low_stock_alerted_at__isnull=False,
+    ).exclude(
+        track_stock=True, remaining_quantity__lte=F('low_stock_threshold'),
+    ).update(low_stock_alerted_at=None)
+
+
+def check_low_stock(sink, batch_size=ALERT_BATCH_SIZE):
+    """
+    Находит заканчивающиеся лекарства пользователей с включёнными уведомлениями, отправляет их в sink пачками
+    и отмечает low_stock_alerted_at, чтобы не уведомлять повторно. Возвращает число уведомлений.
+    """
+    rearm_restocked()
+    queryset = low_stock_medications().order_by('pk').values_list(
+        'id', 'user_id', 'name', 'remaining_quantity', 'low_stock_threshold', 'unit'
+    )
+    sent = 0
+    last_pk = None
+    while True:
+        # идём по ключу, а не одним курсором: обновлять таблицу во время чтения курсора в SQLite небезопасно
+        chunk = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        rows = list(chunk[:batch_size])
+        if not rows:
+            break
+        sink.emit([
+            {
+                'type': 'low_stock',
+                'userId': user_id,
+                'medicationId': medication_id,
+                'medicationName': name,
+                'remainingQuantity': remaining,
+                'lowStockThreshold': threshold,
+                'unit': unit,
+            }
+            for medication_id, user_id, name, remaining, threshold, unit in rows
+        ])
+        Medication.objects.filter(pk__in=[row[0] for row in rows]).update(low_stock_alerted_at=now_ms())
+        sent += len(rows)
+        if len(rows) < batch_size:
+            break
+        last_pk = rows[-1][0]
+    return sent
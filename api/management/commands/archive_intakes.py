@@ -0,0 +1,38 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.archive import ARCHIVE_CHUNK_SIZE, archive_cutoff, archive_intakes
+from api.sharding import shard_aliases, use_shard
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит приёмы старше INTAKE_ARCHIVE_AFTER_DAYS дней в архивную таблицу пачками, '
+        'каждую пачку в своей транзакции (api/archive.py).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.INTAKE_ARCHIVE_AFTER_DAYS,
+                            help='Переносить приёмы старше стольких дней (не меньше INTAKE_ARCHIVE_AFTER_DAYS).')
+        parser.add_argument('--chunk-size', type=int, default=ARCHIVE_CHUNK_SIZE, help='Приёмов в одной транзакции.')
+        parser.add_argument('--loop', action='store_true', help='Запускать периодически, а не один раз.')
+        parser.add_argument('--interval', type=float, default=86400, help='Пауза между запусками, сек.')
+
+    def handle(self, *args, **options):
+        if options['days'] < settings.INTAKE_ARCHIVE_AFTER_DAYS:
+            # список приёмов ищет в архиве только даты раньше INTAKE_ARCHIVE_AFTER_DAYS
+            raise CommandError(f'--days must be at least INTAKE_ARCHIVE_AFTER_DAYS ({settings.INTAKE_ARCHIVE_AFTER_DAYS})')
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive')
+        while True:
+            cutoff = archive_cutoff(days=options['days'])
+            archived = 0
+            for alias in shard_aliases():
+                with use_shard(alias):
+                    archived += archive_intakes(cutoff, chunk_size=options['chunk_size'])
+            self.stdout.write(f'Archived {archived} intakes scheduled before {cutoff}')
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
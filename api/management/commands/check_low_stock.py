@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.low_stock import ALERT_BATCH_SIZE, check_low_stock
+from api.sharding import shard_aliases, use_shard
+from api.sinks import FileSink, get_sink
+
+
+class Command(BaseCommand):
+    help = 'Уведомляет о заканчивающихся лекарствах (remaining_quantity <= low_stock_threshold), без повторов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Запускать периодически, а не один раз.')
+        parser.add_argument('--interval', type=float, default=3600, help='Пауза между проверками, сек.')
+        parser.add_argument('--batch-size', type=int, default=ALERT_BATCH_SIZE)
+        parser.add_argument('--sink-file', help='Писать уведомления в файл (JSON lines) вместо NOTIFICATION_SINK.')
+
+    def handle(self, *args, **options):
+        sink = FileSink(options['sink_file']) if options['sink_file'] else get_sink()
+        while True:
+            sent = 0
+            for alias in shard_aliases():
+                with use_shard(alias):
+                    sent += check_low_stock(sink, batch_size=options['batch_size'])
+            self.stdout.write(f'Sent {sent} low stock alerts')
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
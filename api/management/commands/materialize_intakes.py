@@ -0,0 +1,31 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.materialize import SCHEDULE_CHUNK_SIZE, horizon, materialize_intakes
+from api.models import MedicationSchedule
+from api.sharding import shard_aliases, use_shard
+
+
+class Command(BaseCommand):
+    help = 'Создаёт приёмы со статусом pending по расписаниям на несколько дней вперёд (повторный запуск безопасен).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=14, help='Горизонт в днях, начиная с сегодняшнего.')
+        parser.add_argument('--user', help='Только для одного пользователя (id).')
+        parser.add_argument('--chunk-size', type=int, default=SCHEDULE_CHUNK_SIZE,
+                            help='Сколько расписаний обрабатывать за один проход.')
+
+    def handle(self, *args, **options):
+        if options['days'] < 1:
+            raise CommandError('--days must be positive')
+        start, end = horizon(date.today(), options['days'])
+        created = 0
+        # расписания и приёмы пользователя лежат в его шарде - обходим шарды по очереди
+        for alias in shard_aliases():
+            with use_shard(alias):
+                schedules = MedicationSchedule.objects.all()
+                if options['user']:
+                    schedules = schedules.filter(user_id=options['user'])
+                created += materialize_intakes(start, end, schedules, chunk_size=options['chunk_size'])
+        self.stdout.write(f'Created {created} intakes for {start}..{end}')
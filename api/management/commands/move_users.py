@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from api.models import User, UserShard
+from api.sharding import COPY_CHUNK_SIZE, hash_shard, move_user, placement, shard_aliases
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит данные пользователей между шардами без остановки сервиса (api/sharding.py): '
+        'конкретных пользователей в --to или всех, чьё место по хэшу изменилось (--rebalance, например после добавления шарда).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('users', nargs='*', help='id пользователей.')
+        parser.add_argument('--to', help='Целевой шард (alias из DATABASES).')
+        parser.add_argument('--rebalance', action='store_true',
+                            help='Перенести пользователей, которые лежат не в шарде по хэшу.')
+        parser.add_argument('--limit', type=int, help='Не больше стольких переносов за запуск.')
+        parser.add_argument('--chunk-size', type=int, default=COPY_CHUNK_SIZE, help='Строк в одной вставке.')
+        parser.add_argument('--wait', type=float,
+                            help='Пауза после переключения каталога, сек. (по умолчанию SHARDING DIRECTORY_TTL).')
+        parser.add_argument('--dry-run', action='store_true', help='Только показать, кого и куда перенести.')
+
+    def handle(self, *args, **options):
+        if len(shard_aliases()) == 1:
+            raise CommandError('Only one shard is configured (DATABASE_SHARD_URLS).')
+        if options['rebalance'] == bool(options['users']):
+            raise CommandError('Pass user ids with --to, or --rebalance.')
+        if options['users'] and options['to'] not in shard_aliases():
+            raise CommandError(f'--to must be one of: {", ".join(shard_aliases())}.')
+
+        if options['rebalance']:
+            moves = self.rebalance_moves()
+        else:
+            moves = ((user_id, options['to']) for user_id in options['users'])
+
+        moved = 0
+        for user_id, target in moves:
+            if options['limit'] is not None and moved >= options['limit']:
+                break
+            source = placement(user_id)[0]
+            if source == target:
+                self.stdout.write(f'{user_id}: already in {target}')
+                continue
+            if options['dry_run']:
+                self.stdout.write(f'{user_id}: {source} -> {target}')
+            else:
+                move_user(user_id, target, chunk_size=options['chunk_size'], wait=options['wait'],
+                          log=self.stdout.write)
+            moved += 1
+        self.stdout.write(f'{"Would move" if options["dry_run"] else "Moved"} {moved} users')
+
+    def rebalance_moves(self):
+        # пользователи без записи в каталоге лежат в default
+        current = dict(UserShard.objects.using(DEFAULT_DB_ALIAS).values_list('user_id', 'shard'))
+        user_ids = User.objects.using(DEFAULT_DB_ALIAS).order_by('pk').values_list('pk', flat=True)
+        for user_id in user_ids.iterator():
+            target = hash_shard(user_id)
+            if current.get(user_id, DEFAULT_DB_ALIAS) != target:
+                yield user_id, target
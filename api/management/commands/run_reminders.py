@@ -0,0 +1,42 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from api.reminders import ReminderScheduler
+from api.sharding import shard_aliases, use_shard
+from api.sinks import FileSink, get_sink
+
+
+class Command(BaseCommand):
+    help = 'Рассылает напоминания о приёмах с учётом NotificationSettings (долгоживущий процесс).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Один проход и выход (для cron и проверки).')
+        parser.add_argument('--interval', type=float, default=30, help='Максимальная пауза между проходами, сек.')
+        parser.add_argument('--lookahead', type=int, default=5, help='На сколько минут вперёд держать приёмы в памяти.')
+        parser.add_argument('--sink-file', help='Писать напоминания в файл (JSON lines) вместо NOTIFICATION_SINK.')
+
+    def handle(self, *args, **options):
+        sink = FileSink(options['sink_file']) if options['sink_file'] else get_sink()
+        # у каждого шарда свой планировщик со своим окном приёмов
+        schedulers = {
+            alias: ReminderScheduler(sink, lookahead=timedelta(minutes=options['lookahead']))
+            for alias in shard_aliases()
+        }
+        if options['once']:
+            self.stdout.write(f'Sent {self.run_once(schedulers)} reminders')
+            return
+        self.stdout.write('Reminder dispatcher started')
+        while True:
+            self.run_once(schedulers)
+            time.sleep(max(1.0, min(
+                scheduler.seconds_until_next(scheduler.now(), options['interval']) for scheduler in schedulers.values()
+            )))
+
+    def run_once(self, schedulers):
+        sent = 0
+        for alias, scheduler in schedulers.items():
+            with use_shard(alias):
+                sent += scheduler.run_once()
+        return sent
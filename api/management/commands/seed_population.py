@@ -0,0 +1,62 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.seed import CHUNK_SIZE, seed_population
+
+
+def medication_range(value):
+    # "4" или "1-8"
+    low, _, high = value.partition('-')
+    try:
+        low, high = int(low), int(high or low)
+    except ValueError:
+        raise CommandError('--medications must be N or MIN-MAX')
+    if not 0 <= low <= high:
+        raise CommandError('--medications must be N or MIN-MAX with 0 <= MIN <= MAX')
+    return low, high
+
+
+class Command(BaseCommand):
+    help = 'Создаёт синтетических пользователей с лекарствами, расписаниями и приёмами для нагрузочных проверок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100, help='Сколько пользователей создать.')
+        parser.add_argument('--start', type=int, default=0, help='Номер первого пользователя (id = <prefix><номер>).')
+        parser.add_argument('--prefix', default='seed-', help='Префикс id и email пользователей.')
+        parser.add_argument('--medications', default='1-8', help='Лекарств на пользователя: N или MIN-MAX.')
+        parser.add_argument('--days', type=int, default=90, help='Дней истории приёмов до сегодняшнего.')
+        parser.add_argument('--future-days', type=int, default=7, help='Дней приёмов вперёд (pending).')
+        parser.add_argument('--taken-ratio', type=float, default=0.8, help='Доля принятых среди прошлых приёмов.')
+        parser.add_argument('--missed-ratio', type=float, default=0.15, help='Доля пропущенных среди прошлых приёмов.')
+        parser.add_argument('--seed', type=int, default=0, help='Зерно генератора: одинаковое - одинаковые данные.')
+        parser.add_argument('--password', default='password', help='Пароль всех созданных пользователей.')
+        parser.add_argument('--workers', type=int, default=1, help='Число процессов (нужен fork).')
+        parser.add_argument('--keep-indexes', action='store_true',
+                            help='SQLite: не снимать индексы таблицы приёмов на время загрузки.')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                            help='Сколько приёмов копить перед записью одной транзакцией.')
+
+    def handle(self, *args, **options):
+        if options['users'] < 1:
+            raise CommandError('--users must be positive')
+        if options['days'] < 0 or options['future_days'] < 0:
+            raise CommandError('--days and --future-days must not be negative')
+        if not (0 <= options['taken_ratio'] and 0 <= options['missed_ratio']
+                and options['taken_ratio'] + options['missed_ratio'] <= 1):
+            raise CommandError('--taken-ratio and --missed-ratio must be non-negative and sum to at most 1')
+
+        started = time.perf_counter()
+        counts = seed_population(
+            options['users'], start=options['start'], workers=options['workers'], chunk_size=options['chunk_size'],
+            defer_indexes=not options['keep_indexes'],
+            password=options['password'], seed=options['seed'], prefix=options['prefix'],
+            medications=medication_range(options['medications']), days=options['days'],
+            future_days=options['future_days'], taken_ratio=options['taken_ratio'],
+            missed_ratio=options['missed_ratio'],
+        )
+        self.stdout.write(
+            f'Created {counts["users"]} users, {counts["medications"]} medications, '
+            f'{counts["schedules"]} schedules, {counts["intakes"]} intakes '
+            f'in {time.perf_counter() - started:.1f}s'
+        )
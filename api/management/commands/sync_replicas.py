@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from api.routers import replica_aliases
+
+SQLITE = 'django.db.backends.sqlite3'
+
+
+class Command(BaseCommand):
+    help = (
+        'Копирует SQLite-базу default в SQLite-реплики из READ_REPLICAS (sqlite3 backup). '
+        'Для локальной проверки маршрутизации чтений, где настоящей репликации нет.'
+    )
+
+    def handle(self, *args, **options):
+        aliases = replica_aliases()
+        if not aliases:
+            raise CommandError('No read replicas configured (DATABASE_REPLICA_URLS).')
+        source = connections[DEFAULT_DB_ALIAS]
+        if source.vendor != 'sqlite':
+            raise CommandError('Only SQLite databases can be copied; use the database replication instead.')
+        for alias in aliases:
+            config = settings.DATABASES[alias]
+            if config['ENGINE'] != SQLITE:
+                raise CommandError(f'{alias} is not a SQLite database.')
+            # своё подключение реплики закрываем, чтобы backup не ждал его блокировок
+            connections[alias].close()
+            target = connections[alias].get_new_connection(connections[alias].get_connection_params())
+            try:
+                source.ensure_connection()
+                source.connection.backup(target)
+            finally:
+                target.close()
+            self.stdout.write(f'Copied {DEFAULT_DB_ALIAS} to {alias} ({config["NAME"]})')
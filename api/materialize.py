@@ -0,0 +1,105 @@
+import hashlib
+from datetime import timedelta
+
+from django.db import router, transaction
+
+from .models import MedicationIntake, MedicationSchedule
+from .occurrences import active_between, expand_schedules
+from .utils import now_ms
+from .versions import bump_version
+
+SCHEDULE_CHUNK_SIZE = 500
+BULK_BATCH_SIZE = 1000
+
+
+def intake_id(schedule_id, scheduled_date, scheduled_time):
+    # детерминированный id: один и тот же приём всегда получает один и тот же ключ (id ограничен 20 символами)
+    key = f'{schedule_id}|{scheduled_date}|{scheduled_time}'
+    return hashlib.sha1(key.encode()).hexdigest()[:20]
+
+
+def horizon(start, days):
+    return start, start + timedelta(days=days - 1)
+
+
+def _build_intakes(schedules, start, end, timestamp):
+    by_id = {schedule.id: schedule for schedule in schedules}
+    # приёмы, которые уже есть (в том числе созданные клиентом со своим id), не дублируем
+    existing = set(
+        MedicationIntake.objects.filter(
+            schedule_id__in=list(by_id),
+            scheduled_date__gte=start.isoformat(),
+            scheduled_date__lte=end.isoformat(),
+        ).values_list('schedule_id', 'scheduled_date', 'scheduled_time')
+    )
+    for occurrence in expand_schedules(schedules, start, end):
+        scheduled_date = occurrence.scheduled_date.isoformat()
+        if (occurrence.schedule_id, scheduled_date, occurrence.scheduled_time) in existing:
+            continue
+        schedule = by_id[occurrence.schedule_id]
+        medication = schedule.medication
+        yield MedicationIntake(
+            id=intake_id(schedule.id, scheduled_date, occurrence.scheduled_time),
+            schedule_id=schedule.id,
+            medication_id=medication.id,
+            user_id=schedule.user_id,
+            scheduled_time=occurrence.scheduled_time,
+            scheduled_date=scheduled_date,
+            status=MedicationIntake.Status.PENDING,
+            created_at=timestamp,
+            updated_at=timestamp,
+            # те же денормализованные поля, что проставляет MedicationIntakeSerializer.create
+            medication_name=medication.name,
+            meal_relation=schedule.meal_relation,
+            dosage_per_unit=medication.dosage_per_unit,
+            instructions=medication.instructions,
+            dosage_by_time=occurrence.dosage[:20],
+            unit=medication.unit,
+            icon_name=medication.icon_name,
+            icon_color=medication.icon_color,
+        )
+
+
+def materialize_intakes(start, end, schedules=None, chunk_size=SCHEDULE_CHUNK_SIZE):
+    """Создаёт недостающие приёмы со статусом pending за период [start, end]. Повторный запуск ничего не меняет."""
+    if schedules is None:
+        schedules = MedicationSchedule.objects.all()
+    schedules = schedules.select_related('medication').filter(active_between(start, end)).order_by('pk')
+
+    timestamp = now_ms()
+    created = 0
+    chunk = []
+    for schedule in schedules.iterator(chunk_size=chunk_size):
+        chunk.append(schedule)
+        if len(chunk) >= chunk_size:
+            created += _save(chunk, start, end, timestamp)
+            chunk = []
+    if chunk:
+        created += _save(chunk, start, end, timestamp)
+    return created
+
+
+def _count_existing(ids, using):
+    return sum(
+        MedicationIntake.objects.using(using).filter(pk__in=ids[index:index + BULK_BATCH_SIZE]).count()
+        for index in range(0, len(ids), BULK_BATCH_SIZE)
+    )
+
+
+def _save(schedules, start, end, timestamp):
+    intakes = list(_build_intakes(schedules, start, end, timestamp))
+    if not intakes:
+        return 0
+    using = router.db_for_write(MedicationIntake)
+    ids = [intake.id for intake in intakes]
+    with transaction.atomic(using=using):
+        # ignore_conflicts - на случай параллельного запуска с тем же детерминированным id;
+        # такие строки пропускаются, поэтому созданными считаем только новые ключи
+        before = _count_existing(ids, using)
+        MedicationIntake.objects.using(using).bulk_create(intakes, batch_size=BULK_BATCH_SIZE, ignore_conflicts=True)
+        created = _count_existing(ids, using) - before
+    # bulk_create не шлёт сигналы - версии коллекций меняем по одному разу на пользователя
+    if created:
+        for user_id in {intake.user_id for intake in intakes}:
+            bump_version(user_id, 'intakes')
+    return created
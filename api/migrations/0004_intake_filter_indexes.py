@@ -0,0 +1,21 @@
+# Generated by Django 5.2 on 2026-10-18 10:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_remove_user_photo_alter_medicationintake_user'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='medicationintake',
+            index=models.Index(fields=['user', 'scheduled_date', 'scheduled_time'], name='intake_user_date_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='medicationintake',
+            index=models.Index(fields=['user', 'status', 'scheduled_date'], name='intake_user_status_date_idx'),
+        ),
+    ]
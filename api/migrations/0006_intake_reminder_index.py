@@ -0,0 +1,17 @@
+# Generated by Django 5.2 on 2026-10-18 10:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_sync_indexes_and_tombstones'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='medicationintake',
+            index=models.Index(fields=['status', 'scheduled_date', 'scheduled_time'], name='intake_status_date_time_idx'),
+        ),
+    ]
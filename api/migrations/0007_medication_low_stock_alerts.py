@@ -0,0 +1,26 @@
+# Generated by Django 5.2 on 2026-10-18 10:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_intake_reminder_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='medication',
+            name='low_stock_alerted_at',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='medication',
+            index=models.Index(condition=models.Q(('remaining_quantity__lte', models.F('low_stock_threshold')), ('track_stock', True)), fields=['low_stock_alerted_at', 'id'], name='medication_low_stock_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='medication',
+            index=models.Index(condition=models.Q(('low_stock_alerted_at__isnull', False)), fields=['id'], name='medication_stock_alerted_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2 on 2026-10-18 10:16
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_medication_low_stock_alerts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AdherenceRollupState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('closed_through', models.DateField(blank=True, null=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='adherence_rollup', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailyAdherence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('taken', models.IntegerField(default=0)),
+                ('missed', models.IntegerField(default=0)),
+                ('pending', models.IntegerField(default=0)),
+                ('medication', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_adherence', to='api.medication')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_adherence', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Daily Adherence',
+                'verbose_name_plural': 'Daily Adherence',
+                'constraints': [models.UniqueConstraint(fields=('user', 'date', 'medication'), name='daily_adherence_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2 on 2026-10-18 11:11
+
+import django.core.validators
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_user_shards'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedIntake',
+            fields=[
+                ('id', models.CharField(max_length=20, primary_key=True, serialize=False)),
+                ('scheduled_time', models.CharField(max_length=5, validators=[django.core.validators.RegexValidator('^\\d{2}:\\d{2}$', 'Time must be in HH:MM format.')])),
+                ('scheduled_date', models.CharField(max_length=10, validators=[django.core.validators.RegexValidator('^\\d{4}-\\d{2}-\\d{2}$', 'Date must be in YYYY-MM-DD format.')])),
+                ('status', models.CharField(choices=[('taken', 'Принято'), ('missed', 'Пропущено'), ('pending', 'Ожидается')], default='pending', max_length=10)),
+                ('taken_at', models.BigIntegerField(blank=True, null=True)),
+                ('created_at', models.BigIntegerField()),
+                ('updated_at', models.BigIntegerField()),
+                ('medication_name', models.CharField(max_length=100, validators=[django.core.validators.MinLengthValidator(1)])),
+                ('meal_relation', models.CharField(choices=[('before_meal', 'До еды'), ('after_meal', 'После еды'), ('with_meal', 'Во время еды'), ('no_relation', 'Не связано с едой')], max_length=30)),
+                ('dosage_per_unit', models.CharField(blank=True, max_length=100, null=True)),
+                ('instructions', models.TextField()),
+                ('dosage_by_time', models.CharField(max_length=20, validators=[django.core.validators.MinLengthValidator(1)])),
+                ('unit', models.CharField(max_length=20, validators=[django.core.validators.MinLengthValidator(1)])),
+                ('icon_name', models.CharField(max_length=50)),
+                ('icon_color', models.CharField(max_length=50)),
+                ('medication', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_intakes', to='api.medication')),
+                ('schedule', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_intakes', to='api.medicationschedule')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='archived_intakes', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Archived Intake',
+                'verbose_name_plural': 'Archived Intakes',
+                'indexes': [models.Index(fields=['user', 'scheduled_date', 'scheduled_time'], name='archive_user_date_time_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2 on 2026-10-18 11:15
+
+from django.db import migrations, models
+
+from api.utils import effective_end_date
+
+
+def backfill_effective_end_date(apps, schema_editor):
+    # у бессрочных расписаний (без end_date и duration_days) effective_end_date остаётся NULL
+    MedicationSchedule = apps.get_model('api', 'MedicationSchedule')
+    alias = schema_editor.connection.alias
+    schedules = MedicationSchedule.objects.using(alias).filter(
+        models.Q(end_date__isnull=False) | models.Q(duration_days__isnull=False)
+    ).only('start_date', 'end_date', 'duration_days').order_by('pk')
+    batch = []
+    for schedule in schedules.iterator(chunk_size=1000):
+        schedule.effective_end_date = effective_end_date(schedule.start_date, schedule.end_date, schedule.duration_days)
+        batch.append(schedule)
+        if len(batch) >= 1000:
+            MedicationSchedule.objects.using(alias).bulk_update(batch, ['effective_end_date'])
+            batch = []
+    if batch:
+        MedicationSchedule.objects.using(alias).bulk_update(batch, ['effective_end_date'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_intake_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='medicationschedule',
+            name='effective_end_date',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_effective_end_date, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='medicationschedule',
+            index=models.Index(fields=['user', 'start_date', 'effective_end_date'], name='schedule_user_active_idx'),
+        ),
+    ]
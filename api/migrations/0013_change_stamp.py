@@ -0,0 +1,51 @@
+# Generated by Django 5.2 on 2026-10-18 11:34
+
+import api.utils
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_schedule_effective_end_date'),
+    ]
+
+    # существующие строки получают время миграции: клиенты один раз получат их при следующей синхронизации
+    operations = [
+        migrations.RemoveIndex(
+            model_name='medicationintake',
+            name='intake_user_updated_idx',
+        ),
+        migrations.AddField(
+            model_name='archivedintake',
+            name='changed_at',
+            field=models.BigIntegerField(default=api.utils.now_ms, editable=False),
+        ),
+        migrations.AddField(
+            model_name='medication',
+            name='changed_at',
+            field=models.BigIntegerField(default=api.utils.now_ms, editable=False),
+        ),
+        migrations.AddField(
+            model_name='medicationintake',
+            name='changed_at',
+            field=models.BigIntegerField(default=api.utils.now_ms, editable=False),
+        ),
+        migrations.AddField(
+            model_name='medicationschedule',
+            name='changed_at',
+            field=models.BigIntegerField(default=api.utils.now_ms, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='medication',
+            index=models.Index(fields=['user', 'changed_at', 'id'], name='medication_user_changed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='medicationintake',
+            index=models.Index(fields=['user', 'changed_at', 'id'], name='intake_user_changed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='medicationschedule',
+            index=models.Index(fields=['user', 'changed_at', 'id'], name='schedule_user_changed_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2 on 2026-10-18 11:41
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_change_stamp'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='archivedintake',
+            name='unit',
+            field=models.CharField(max_length=50, validators=[django.core.validators.MinLengthValidator(1)]),
+        ),
+        migrations.AlterField(
+            model_name='medicationintake',
+            name='unit',
+            field=models.CharField(max_length=50, validators=[django.core.validators.MinLengthValidator(1)]),
+        ),
+    ]
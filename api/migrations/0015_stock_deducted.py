@@ -0,0 +1,28 @@
+# Generated by Django 5.2 on 2026-10-18 11:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_intake_unit_length'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedintake',
+            name='stock_deducted',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='medication',
+            name='remaining_fraction',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='medicationintake',
+            name='stock_deducted',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+    ]
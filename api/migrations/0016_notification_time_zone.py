@@ -0,0 +1,38 @@
+# Generated by Django 5.2 on 2026-10-18 12:11
+
+import api.models
+import django.core.validators
+from django.db import migrations, models
+
+
+def clamp_lead(apps, schema_editor):
+    # упреждение, сохранённое до проверки диапазона
+    NotificationSettings = apps.get_model('api', 'NotificationSettings')
+    settings = NotificationSettings.objects.using(schema_editor.connection.alias)
+    settings.filter(minutes_before_scheduled_time__gt=1440).update(minutes_before_scheduled_time=1440)
+    settings.filter(minutes_before_scheduled_time__lt=0).update(minutes_before_scheduled_time=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_stock_deducted'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificationsettings',
+            name='time_zone',
+            field=models.CharField(blank=True, default='', max_length=64, validators=[api.models.validate_time_zone]),
+        ),
+        migrations.RunPython(clamp_lead, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='notificationsettings',
+            name='minutes_before_scheduled_time',
+            field=models.IntegerField(default=15, validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(1440)]),
+        ),
+        migrations.AddIndex(
+            model_name='notificationsettings',
+            index=models.Index(fields=['medication_reminders_enabled', 'time_zone', 'minutes_before_scheduled_time'], name='notif_reminder_zone_idx'),
+        ),
+    ]
@@ -1,6 +1,72 @@
-from django.core.validators import MinValueValidator, MinLengthValidator, RegexValidator
-from django.db import models
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.core.exceptions import ValidationError
+from django.core.validators import MaxValueValidator, MinValueValidator, MinLengthValidator, RegexValidator
+from django.db import models, router, transaction
 from django.contrib.auth.models import AbstractUser
+from django.dispatch import Signal
+
+from .utils import effective_end_date, now_ms
+
+MAX_LEAD_MINUTES = 24 * 60
+
+
+def validate_time_zone(value):
+    try:
+        ZoneInfo(value)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValidationError("Unknown time zone. Expected an IANA name such as Europe/Moscow.")
+
+
+class TrackedFieldsMixin:
+    # запоминает значения полей tracked_fields при загрузке из базы, чтобы после save понять, что изменилось
+    tracked_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.reset_tracking()
+        return instance
+
+    def reset_tracking(self):
+        self._loaded_values = {field: getattr(self, field) for field in self.tracked_fields if field in self.__dict__}
+
+    def changed_fields(self):
+        loaded = getattr(self, '_loaded_values', {})
+        return {field: getattr(self, field) for field, value in loaded.items() if getattr(self, field) != value}
+
+
+class ChangeStampMixin:
+    # changed_at - серверное время последней записи (мс); по нему /api/sync/ ищет изменения, updated_at ставит клиент
+    def save(self, *args, **kwargs):
+        self.changed_at = now_ms()
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'changed_at'}
+        super().save(*args, **kwargs)
+
+
+# шлётся перед удалением через delete() объекта или QuerySet: queryset - удаляемые строки, using - база.
+# tombstone-записи и версии коллекций пишутся по нему одной пачкой (api/signals.py); обработчиков
+# post_delete у этих моделей нет, поэтому каскад Django удаляет без построчных запросов
+deleting = Signal()
+
+
+class DeletingQuerySet(models.QuerySet):
+    def delete(self):
+        queryset = self._chain()
+        queryset._for_write = True
+        with transaction.atomic(using=queryset.db):
+            deleting.send(sender=self.model, queryset=queryset, using=queryset.db)
+            return super(DeletingQuerySet, queryset).delete()
+
+
+class DeletingMixin:
+    # вместе с ним модель объявляет objects = DeletingQuerySet.as_manager()
+    def delete(self, using=None, keep_parents=False):
+        using = using or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            deleting.send(sender=type(self), queryset=type(self)._base_manager.using(using).filter(pk=self.pk), using=using)
+            return super().delete(using=using, keep_parents=keep_parents)
 
 
 class User(AbstractUser):
@@ -20,7 +86,7 @@ class User(AbstractUser):
         verbose_name = "User"
         verbose_name_plural = "Users"
 
-class Medication(models.Model):
+class Medication(TrackedFieldsMixin, ChangeStampMixin, DeletingMixin, models.Model):
     class Form(models.TextChoices):
         TABLET = "tablet", "Таблетки"
         CAPSULE = "capsule", "Капсулы"
@@ -30,6 +96,11 @@ class Medication(models.Model):
         SPRAY = "spray", "Спрей"
         POWDER = "powder", "Порошок"
 
+    # поля, которые продублированы в MedicationIntake (см. api/fanout.py)
+    tracked_fields = ('name', 'dosage_per_unit', 'instructions', 'unit', 'icon_name', 'icon_color')
+
+    objects = DeletingQuerySet.as_manager()
+
     id = models.CharField(max_length=20, primary_key=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='medications')
     name = models.CharField(max_length=100)
@@ -51,12 +122,17 @@ class Medication(models.Model):
         validators=[MinValueValidator(0)]
     )
     track_stock = models.BooleanField(default=True)
+    # тысячные доли начатой единицы сверх remaining_quantity (дробные дозы, api/stock.py); в API не отдаётся
+    remaining_fraction = models.IntegerField(default=0, editable=False)
     icon_name = models.CharField(max_length=50)
     icon_color = models.CharField(max_length=50)
+    #когда последний раз уведомили о заканчивающемся запасе (мс); сбрасывается, когда запас пополнили
+    low_stock_alerted_at = models.BigIntegerField(blank=True, null=True)
 
     #время на фронте хранится в миллисекундах (Date.now()) поэтому пусть тут и далле будет просто число
     created_at = models.BigIntegerField()
     updated_at = models.BigIntegerField()
+    changed_at = models.BigIntegerField(default=now_ms, editable=False)
 
     def __str__(self):
         return self.name
@@ -64,9 +140,25 @@ class Medication(models.Model):
     class Meta:
         verbose_name = "Medication"
         verbose_name_plural = "Medications"
+        indexes = [
+            models.Index(fields=['user', 'updated_at'], name='medication_user_updated_idx'),
+            # синхронизация по серверной метке изменения
+            models.Index(fields=['user', 'changed_at', 'id'], name='medication_user_changed_idx'),
+            # частичные индексы для проверки запасов: в них попадают только заканчивающиеся лекарства
+            models.Index(
+                fields=['low_stock_alerted_at', 'id'],
+                condition=models.Q(track_stock=True, remaining_quantity__lte=models.F('low_stock_threshold')),
+                name='medication_low_stock_idx',
+            ),
+            models.Index(
+                fields=['id'],
+                condition=models.Q(low_stock_alerted_at__isnull=False),
+                name='medication_stock_alerted_idx',
+            ),
+        ]
 
 
-class MedicationSchedule(models.Model):
+class MedicationSchedule(TrackedFieldsMixin, ChangeStampMixin, DeletingMixin, models.Model):
     class Frequency(models.TextChoices):
         DAILY = "daily", "Ежедневно"
         EVERY_OTHER_DAY = "every_other_day", "Через день"
@@ -79,6 +171,10 @@ class MedicationSchedule(models.Model):
         WITH_MEAL = "with_meal", "Во время еды"
         NO_RELATION = "no_relation", "Не связано с едой"
 
+    tracked_fields = ('meal_relation',)
+
+    objects = DeletingQuerySet.as_manager()
+
     id = models.CharField(max_length=20, primary_key=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='schedules')
     medication = models.ForeignKey(Medication, on_delete=models.CASCADE, related_name='schedules')
@@ -95,27 +191,44 @@ class MedicationSchedule(models.Model):
         null=True,
         validators=[MinValueValidator(1)]
     )
+    # последний день приёма, считается из end_date и duration_days при сохранении; None - бессрочно
+    effective_end_date = models.DateField(blank=True, null=True, editable=False)
     #снова меняем на миллисекунды
     created_at = models.BigIntegerField()
     updated_at = models.BigIntegerField()
+    changed_at = models.BigIntegerField(default=now_ms, editable=False)
 
     def __str__(self):
         return f"{self.medication.name} ({self.start_date})"
 
+    def set_effective_end_date(self):
+        # bulk_create не вызывает save - там, где расписания создаются пачкой, вызывается явно
+        self.effective_end_date = effective_end_date(self.start_date, self.end_date, self.duration_days)
+
+    def save(self, *args, **kwargs):
+        self.set_effective_end_date()
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'effective_end_date'}
+        super().save(*args, **kwargs)
+
     class Meta:
         verbose_name = "Medication Schedule"
         verbose_name_plural = "Medication Schedules"
+        indexes = [
+            models.Index(fields=['user', 'updated_at'], name='schedule_user_updated_idx'),
+            models.Index(fields=['user', 'changed_at', 'id'], name='schedule_user_changed_idx'),
+            # расписания, действующие в день D: start_date <= D и (effective_end_date IS NULL или >= D)
+            models.Index(fields=['user', 'start_date', 'effective_end_date'], name='schedule_user_active_idx'),
+        ]
 
-class MedicationIntake(models.Model):
+class BaseIntake(models.Model):
+    # общая схема оперативной таблицы приёмов и архива (ArchivedIntake); связи объявляют наследники
     class Status(models.TextChoices):
         TAKEN = "taken", "Принято"
         MISSED = "missed", "Пропущено"
         PENDING = "pending", "Ожидается"
 
     id = models.CharField(max_length=20, primary_key=True)
-    schedule = models.ForeignKey(MedicationSchedule, on_delete=models.CASCADE, related_name='intakes')
-    medication = models.ForeignKey(Medication, on_delete=models.CASCADE, related_name='intakes')
-    user = models.ForeignKey(User, on_delete=models.CASCADE, blank=True, null=True)
     scheduled_time = models.CharField( #используем charfield как во фронте
         max_length=5,
         validators=[RegexValidator(r'^\d{2}:\d{2}$', "Time must be in HH:MM format.")]
@@ -126,8 +239,11 @@ class MedicationIntake(models.Model):
     )
     status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING)
     taken_at = models.BigIntegerField(blank=True, null=True)
+    # сколько списано с остатка лекарства при отметке taken (тысячные единицы); при отмене возвращается ровно столько
+    stock_deducted = models.IntegerField(default=0, editable=False)
     created_at = models.BigIntegerField()
     updated_at = models.BigIntegerField()
+    changed_at = models.BigIntegerField(default=now_ms, editable=False)
 
     # Дублируем поля для быстрого доступа
     medication_name = models.CharField(max_length=100, validators=[MinLengthValidator(1)])
@@ -135,23 +251,158 @@ class MedicationIntake(models.Model):
     dosage_per_unit = models.CharField(max_length=100, blank=True, null=True)
     instructions = models.TextField()
     dosage_by_time = models.CharField(max_length=20, validators=[MinLengthValidator(1)])
-    unit = models.CharField(max_length=20, validators=[MinLengthValidator(1)])
+    unit = models.CharField(max_length=50, validators=[MinLengthValidator(1)])  # как Medication.unit: копируется при fan-out
     icon_name = models.CharField(max_length=50)
     icon_color = models.CharField(max_length=50)
 
     def __str__(self):
         return f"{self.medication_name} at {self.scheduled_time} on {self.scheduled_date}"
 
+    class Meta:
+        abstract = True
+
+
+class MedicationIntake(TrackedFieldsMixin, ChangeStampMixin, DeletingMixin, BaseIntake):
+    # для инкрементального обновления дневной статистики (DailyAdherence)
+    tracked_fields = ('status', 'scheduled_date', 'medication_id')
+
+    objects = DeletingQuerySet.as_manager()
+
+    schedule = models.ForeignKey(MedicationSchedule, on_delete=models.CASCADE, related_name='intakes')
+    medication = models.ForeignKey(Medication, on_delete=models.CASCADE, related_name='intakes')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, blank=True, null=True)
+
     class Meta:
         verbose_name = "Medication Intake"
         verbose_name_plural = "Medication Intakes"
+        indexes = [
+            # экран "сегодня"/"неделя": диапазон по дате внутри пользователя
+            models.Index(fields=['user', 'scheduled_date', 'scheduled_time'], name='intake_user_date_time_idx'),
+            # "ожидающие" приёмы пользователя
+            models.Index(fields=['user', 'status', 'scheduled_date'], name='intake_user_status_date_idx'),
+            # синхронизация по серверной метке изменения
+            models.Index(fields=['user', 'changed_at', 'id'], name='intake_user_changed_idx'),
+            # окно ближайших ожидающих приёмов всех пользователей для напоминаний
+            models.Index(fields=['status', 'scheduled_date', 'scheduled_time'], name='intake_status_date_time_idx'),
+        ]
 
 
-class NotificationSettings(models.Model):
+class ArchivedIntake(BaseIntake):
+    # приёмы старше INTAKE_ARCHIVE_AFTER_DAYS, перенесённые archive_intakes (api/archive.py); только для чтения
+    schedule = models.ForeignKey(MedicationSchedule, on_delete=models.CASCADE, related_name='archived_intakes')
+    medication = models.ForeignKey(Medication, on_delete=models.CASCADE, related_name='archived_intakes')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, blank=True, null=True, related_name='archived_intakes')
+
+    class Meta:
+        verbose_name = "Archived Intake"
+        verbose_name_plural = "Archived Intakes"
+        indexes = [
+            # архив читается только диапазонами дат пользователя
+            models.Index(fields=['user', 'scheduled_date', 'scheduled_time'], name='archive_user_date_time_idx'),
+        ]
+
+
+class DailyAdherence(models.Model):
+    # свёртка приёмов за закрытый (прошедший) день: сколько принято/пропущено/осталось ожидающими
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_adherence')
+    medication = models.ForeignKey(Medication, on_delete=models.CASCADE, related_name='daily_adherence')
+    date = models.DateField()
+    taken = models.IntegerField(default=0)
+    missed = models.IntegerField(default=0)
+    pending = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.medication_id} on {self.date}: {self.taken}/{self.missed}/{self.pending}"
+
+    class Meta:
+        verbose_name = "Daily Adherence"
+        verbose_name_plural = "Daily Adherence"
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'date', 'medication'], name='daily_adherence_unique'),
+        ]
+
+
+class AdherenceRollupState(models.Model):
+    # до какого дня включительно статистика пользователя уже свёрнута в DailyAdherence
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='adherence_rollup')
+    closed_through = models.DateField(blank=True, null=True)
+
+    def __str__(self):
+        return f"Adherence rollup for {self.user_id} through {self.closed_through}"
+
+
+class NotificationSettings(DeletingMixin, models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='notification_settings')
     medication_reminders_enabled = models.BooleanField(default=True)
-    minutes_before_scheduled_time = models.IntegerField(default=15)
+    minutes_before_scheduled_time = models.IntegerField(
+        default=15,
+        validators=[MinValueValidator(0), MaxValueValidator(MAX_LEAD_MINUTES)]
+    )
     low_stock_reminders_enabled = models.BooleanField(default=True)
+    # пояс IANA, в котором заданы даты и время приёмов пользователя; пусто - REMINDER_DEFAULT_TIME_ZONE
+    time_zone = models.CharField(max_length=64, blank=True, default='', validators=[validate_time_zone])
+    #на фронте у настроек нет меток времени, поэтому проставляем на сервере (нужно для синхронизации)
+    updated_at = models.BigIntegerField(default=0)
+
+    objects = DeletingQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # планировщик напоминаний раз в минуту группирует по поясу (api/reminders.py)
+            models.Index(
+                fields=['medication_reminders_enabled', 'time_zone', 'minutes_before_scheduled_time'],
+                name='notif_reminder_zone_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f"Notification settings for {self.user.email}"
+
+    def save(self, *args, **kwargs):
+        self.updated_at = now_ms()
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'updated_at'}
+        super().save(*args, **kwargs)
+
+
+class ResourceVersion(models.Model):
+    # счётчик изменений коллекции пользователя (medications / schedules / intakes / notifications) для ETag
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='resource_versions')
+    resource = models.CharField(max_length=20)
+    version = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user_id} {self.resource} v{self.version}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'resource'], name='resource_version_unique'),
+        ]
+
+
+class Tombstone(models.Model):
+    # запись об удалённом объекте, чтобы клиент при синхронизации узнал об удалении
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='tombstones')
+    resource = models.CharField(max_length=20)  # medications / schedules / intakes / notifications
+    object_id = models.CharField(max_length=20)
+    deleted_at = models.BigIntegerField()
+
+    def __str__(self):
+        return f"{self.resource}:{self.object_id} deleted at {self.deleted_at}"
+
+    class Meta:
+        verbose_name = "Tombstone"
+        verbose_name_plural = "Tombstones"
+        indexes = [
+            models.Index(fields=['user', 'deleted_at'], name='tombstone_user_deleted_idx'),
+        ]
+
+
+class UserShard(models.Model):
+    # каталог шардов: в какой базе лежат данные пользователя (api/sharding.py); хранится только в default
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='shard')
+    shard = models.CharField(max_length=50)
+    moving = models.BooleanField(default=False)  # данные переносятся в другой шард, запись временно запрещена
 
     def __str__(self):
-        return f"Notification settings for {self.user.email}"
\ No newline at end of file
+        return f"{self.user_id} on {self.shard}{' (moving)' if self.moving else ''}"
@@ -0,0 +1,108 @@
+import heapq
+from bisect import bisect_left, bisect_right
+from datetime import date, timedelta
+from typing import NamedTuple
+
+from django.db.models import Q
+
+from .models import MedicationSchedule
+from .utils import effective_end_date
+
+Frequency = MedicationSchedule.Frequency
+
+
+class Occurrence(NamedTuple):
+    # порядок полей важен: кортежи сортируются по дате, затем по времени
+    scheduled_date: date
+    scheduled_time: str
+    schedule_id: str
+    medication_id: str
+    dosage: str
+    unit: str
+
+
+def active_between(start, end):
+    """
+    Условие на расписания, которые действуют хотя бы в один день из [start, end]
+    (по хранимому effective_end_date, под индекс schedule_user_active_idx).
+    """
+    return Q(start_date__lte=end) & (Q(effective_end_date__isnull=True) | Q(effective_end_date__gte=start))
+
+
+def _parse_times(times):
+    # times хранится как массив { time: "HH:MM", dosage: "value", unit: "мг" }
+    result = []
+    for item in times or []:
+        if isinstance(item, dict) and item.get('time'):
+            result.append((str(item['time']), str(item.get('dosage', '')), str(item.get('unit', ''))))
+    result.sort()
+    return result
+
+
+def _parse_dates(dates):
+    result = set()
+    for value in dates or []:
+        try:
+            result.add(date.fromisoformat(str(value)[:10]))
+        except ValueError:
+            continue
+    return sorted(result)
+
+
+def _days(schedule, first, last):
+    # генератор дней приёма в отрезке [first, last]; принадлежность считается один раз на расписание
+    frequency = schedule.frequency
+    if frequency == Frequency.DAILY:
+        step, current = 1, first
+    elif frequency == Frequency.EVERY_OTHER_DAY:
+        # чётность отсчитывается от start_date
+        step, current = 2, first + timedelta(days=(first - schedule.start_date).days % 2)
+    elif frequency == Frequency.SPECIFIC_DAYS:
+        # days - числа 1-7 (понедельник–воскресенье), как date.isoweekday()
+        weekdays = {int(d) for d in schedule.days or [] if str(d).isdigit() and 1 <= int(d) <= 7}
+        offsets = sorted((weekday - first.isoweekday()) % 7 for weekday in weekdays)
+        if not offsets:
+            return
+        week = first
+        while week <= last:
+            for offset in offsets:
+                day = week + timedelta(days=offset)
+                if day > last:
+                    return
+                yield day
+            week += timedelta(days=7)
+        return
+    elif frequency == Frequency.SPECIFIC_DATES:
+        dates = _parse_dates(schedule.dates)
+        yield from dates[bisect_left(dates, first):bisect_right(dates, last)]
+        return
+    else:
+        return
+
+    delta = timedelta(days=step)
+    while current <= last:
+        yield current
+        current += delta
+
+
+def expand_schedule(schedule, start, end):
+    """Лениво разворачивает правило расписания в приёмы в диапазоне [start, end] по возрастанию."""
+    times = _parse_times(schedule.times)
+    if not times:
+        return
+    first = max(start, schedule.start_date)
+    last_day = effective_end_date(schedule.start_date, schedule.end_date, schedule.duration_days)
+    last = end if last_day is None else min(end, last_day)
+    if first > last:
+        return
+
+    schedule_id = schedule.id
+    medication_id = schedule.medication_id
+    for day in _days(schedule, first, last):
+        for time, dosage, unit in times:
+            yield Occurrence(day, time, schedule_id, medication_id, dosage, unit)
+
+
+def expand_schedules(schedules, start, end):
+    """Объединяет приёмы нескольких расписаний в один ленивый поток, упорядоченный по дате и времени."""
+    return heapq.merge(*(expand_schedule(schedule, start, end) for schedule in schedules))
@@ -0,0 +1,195 @@
+import base64
+import heapq
+import itertools
+import json
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, length):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (TypeError, ValueError):
+        raise NotFound('Invalid cursor')
+    if not isinstance(values, list) or len(values) != length:
+        raise NotFound('Invalid cursor')
+    return values
+
+
+def clean_cursor(model, ordering, values):
+    # значения курсора приходят от клиента: только скаляры JSON, приведённые к типу поля сортировки
+    cleaned = []
+    for name, value in zip(ordering, values):
+        if isinstance(value, bool) or not isinstance(value, (str, int)):
+            raise NotFound('Invalid cursor')
+        try:
+            cleaned.append(model._meta.get_field(name).to_python(value))
+        except ValidationError:
+            raise NotFound('Invalid cursor')
+    return cleaned
+
+
+def keyset_filter(ordering, values):
+    # (a, b, c) > (x, y, z)  ->  a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z)
+    conditions = []
+    for index, field in enumerate(ordering):
+        equal = {name: value for name, value in zip(ordering[:index], values[:index])}
+        conditions.append(Q(**equal, **{f'{field}__gt': values[index]}))
+    return reduce(or_, conditions)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Постраничная выдача по ключу (keyset): следующая страница начинается строго после последней строки
+    предыдущей, без OFFSET, поэтому вставки во время листания не сдвигают страницы.
+    Тело ответа остаётся обычным списком, ссылка на следующую страницу передаётся в заголовке Link.
+    """
+    ordering = ('updated_at', 'id')
+    page_size = api_settings.PAGE_SIZE or 100
+    max_page_size = 1000
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+
+    def get_page_size(self, request):
+        value = request.GET.get(self.page_size_query_param)
+        if value is None:
+            return self.page_size
+        try:
+            size = int(value)
+        except ValueError:
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def get_page_queryset(self, queryset, request):
+        # request.GET работает и с Request DRF, и с HttpRequest async-представлений
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.next_cursor = None
+
+        cursor = request.GET.get(self.cursor_query_param)
+        if cursor:
+            values = clean_cursor(queryset.model, self.ordering, decode_cursor(cursor, len(self.ordering)))
+            queryset = queryset.filter(keyset_filter(self.ordering, values))
+        return queryset.order_by(*self.ordering)[:self.page_size + 1]
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.trim_page(list(self.get_page_queryset(queryset, request)))
+
+    def paginate_querysets(self, querysets, request):
+        # одна страница из нескольких таблиц с одинаковым ключом сортировки (приёмы и их архив):
+        # из каждой берётся не больше страницы, строки сливаются по ключу
+        pages = [list(self.get_page_queryset(queryset, request)) for queryset in querysets]
+        merged = heapq.merge(*pages, key=self.get_key)
+        return self.trim_page(list(itertools.islice(merged, self.page_size + 1)))
+
+    async def apaginate_queryset(self, queryset, request):
+        return self.trim_page([row async for row in self.get_page_queryset(queryset, request)])
+
+    def trim_page(self, rows):
+        if len(rows) > self.page_size:
+            rows = rows[:self.page_size]
+            self.next_cursor = encode_cursor(self.get_key(rows[-1]))
+        return rows
+
+    def get_key(self, row):
+        if isinstance(row, dict):
+            return [row[field] for field in self.ordering]
+        return [getattr(row, field) for field in self.ordering]
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_headers(self):
+        headers = {}
+        next_link = self.get_next_link()
+        if next_link:
+            headers['Link'] = f'<{next_link}>; rel="next"'
+        return headers
+
+    def get_paginated_response(self, data):
+        return Response(data, headers=self.get_headers())
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {'name': self.cursor_query_param, 'required': False, 'in': 'query', 'schema': {'type': 'string'}},
+            {'name': self.page_size_query_param, 'required': False, 'in': 'query', 'schema': {'type': 'integer'}},
+        ]
+
+
+class IntakePagination(KeysetPagination):
+    # приёмы листаются в хронологическом порядке
+    ordering = ('scheduled_date', 'scheduled_time', 'id')
+    page_size = 500
+
+
+class SyncPagination(KeysetPagination):
+    """
+    Постраничная выдача /api/sync/: каждая коллекция листается по своему ключу (серверная метка, id)
+    внутри одного окна (since, watermark]. Курсор хранит since, watermark и позицию каждой коллекции;
+    коллекции, выданные до конца, на следующих страницах не читаются.
+    """
+    page_size = 500
+
+    def paginate_sources(self, sources, request, since, watermark):
+        # sources - {имя: (queryset, поле метки)}; возвращает ({имя: строки страницы}, since, watermark)
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.next_cursor = None
+
+        positions = [None] * len(sources)
+        cursor = request.GET.get(self.cursor_query_param)
+        if cursor:
+            since, watermark, positions = self.decode_sync_cursor(cursor, sources)
+
+        pages = {}
+        next_positions = []
+        for (name, (queryset, key)), position in zip(sources.items(), positions):
+            if position is False:
+                pages[name] = []
+                next_positions.append(False)
+                continue
+            ordering = (key, 'id')
+            queryset = queryset.filter(**{f'{key}__gt': since, f'{key}__lte': watermark})
+            if position is not None:
+                queryset = queryset.filter(keyset_filter(ordering, position))
+            rows = list(queryset.order_by(*ordering)[:self.page_size + 1])
+            if len(rows) > self.page_size:
+                rows = rows[:self.page_size]
+                next_positions.append([getattr(rows[-1], field) for field in ordering])
+            else:
+                next_positions.append(False)
+            pages[name] = rows
+        if any(next_positions):
+            self.next_cursor = encode_cursor([since, watermark, next_positions])
+        return pages, since, watermark
+
+    def decode_sync_cursor(self, cursor, sources):
+        since, watermark, positions = decode_cursor(cursor, 3)
+        bounds_valid = all(isinstance(value, int) and not isinstance(value, bool) for value in (since, watermark))
+        if not bounds_valid or not isinstance(positions, list) or len(positions) != len(sources):
+            raise NotFound('Invalid cursor')
+        cleaned = []
+        for (queryset, key), position in zip(sources.values(), positions):
+            if position is False:
+                cleaned.append(False)
+            elif isinstance(position, list) and len(position) == 2:
+                cleaned.append(clean_cursor(queryset.model, (key, 'id'), position))
+            else:
+                raise NotFound('Invalid cursor')
+        return since, watermark, cleaned
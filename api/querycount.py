@@ -0,0 +1,89 @@
+import logging
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('api.queries')
+
+
+class QueryCounter:
+    """
+    Считает SQL-запросы и их суммарное время во всех подключениях внутри блока with
+    (через connection.execute_wrapper, работает и при DEBUG=False).
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0  # секунды
+        self.queries = []
+        self._stack = None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self.queries.append(sql)
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+        self._stack = None
+
+
+class QueryCountMiddleware:
+    """
+    Число запросов и время SQL на каждый HTTP-запрос: пишется в лог api.queries (DEBUG),
+    а при QUERY_COUNT_HEADERS = True ещё и в заголовки X-Query-Count и X-SQL-Time (мс).
+    Если для эндпоинта (имени url) задан бюджет в QUERY_BUDGETS и он превышен - предупреждение в лог.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # под ASGI цепочка middleware остаётся асинхронной, и async-представления не уходят в поток
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with QueryCounter() as counter:
+            response = self.get_response(request)
+        return self.report(request, response, counter)
+
+    async def __acall__(self, request):
+        # async ORM выполняет запросы в потоке запроса (thread_sensitive), обёртка ставится на его подключения
+        counter = QueryCounter()
+        await sync_to_async(counter.__enter__)()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(counter.__exit__)(None, None, None)
+        return self.report(request, response, counter)
+
+    def report(self, request, response, counter):
+        duration_ms = counter.duration * 1000
+        match = getattr(request, 'resolver_match', None)
+        endpoint = match.url_name if match else None
+        logger.debug('%s %s: %d queries, %.1f ms', request.method, request.path, counter.count, duration_ms)
+        budget = getattr(settings, 'QUERY_BUDGETS', {}).get(endpoint)
+        if budget is not None and counter.count > budget:
+            logger.warning('%s %s: %d queries, budget for %s is %d',
+                           request.method, request.path, counter.count, endpoint, budget)
+        if getattr(settings, 'QUERY_COUNT_HEADERS', False):
+            response['X-Query-Count'] = str(counter.count)
+            response['X-SQL-Time'] = f'{duration_ms:.1f}'
+        return response
@@ -0,0 +1,176 @@
+import heapq
+import logging
+from datetime import UTC, datetime, timedelta
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.conf import settings
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from .models import MAX_LEAD_MINUTES, MedicationIntake, NotificationSettings
+
+logger = logging.getLogger('api.reminders')
+
+DEFAULT_LEAD_MINUTES = NotificationSettings._meta.get_field('minutes_before_scheduled_time').default
+QUERY_CHUNK_SIZE = 2000
+SETTINGS_PREFIX = 'user__notification_settings__'
+
+
+def server_now():
+    return timezone.now()
+
+
+def current_minute(now):
+    # наивное время часов считается временем TIME_ZONE сервера
+    if timezone.is_naive(now):
+        now = timezone.make_aware(now)
+    return now.astimezone(UTC).replace(second=0, microsecond=0)
+
+
+def clamp_lead(minutes):
+    # значения вне 0..MAX_LEAD_MINUTES могли остаться в базе в обход сериализатора
+    return min(max(minutes, 0), MAX_LEAD_MINUTES)
+
+
+def resolve_zone(name):
+    # пустой или неизвестный пояс - REMINDER_DEFAULT_TIME_ZONE
+    try:
+        return ZoneInfo(name or settings.REMINDER_DEFAULT_TIME_ZONE)
+    except (ZoneInfoNotFoundError, ValueError):
+        logger.warning('Unknown time zone %r, using %s', name, settings.REMINDER_DEFAULT_TIME_ZONE)
+        return ZoneInfo(settings.REMINDER_DEFAULT_TIME_ZONE)
+
+
+def window_filter(start, end):
+    # приёмы с датой-временем в полуинтервале (start, end]; дата и время хранятся строками YYYY-MM-DD и HH:MM
+    start_date, start_time = start.date().isoformat(), start.strftime('%H:%M')
+    end_date, end_time = end.date().isoformat(), end.strftime('%H:%M')
+    if start_date == end_date:
+        return Q(scheduled_date=start_date, scheduled_time__gt=start_time, scheduled_time__lte=end_time)
+    return (
+        Q(scheduled_date=start_date, scheduled_time__gt=start_time)
+        | Q(scheduled_date__gt=start_date, scheduled_date__lt=end_date)
+        | Q(scheduled_date=end_date, scheduled_time__lte=end_time)
+    )
+
+
+class ReminderScheduler:
+    """
+    Напоминания о приёмах. Дата и время приёма - местные "YYYY-MM-DD"/"HH:MM" пользователя,
+    пояс берётся из NotificationSettings.time_zone. В памяти держится только min-heap приёмов ближайшего окна
+    (lookahead плюс наибольшее упреждение в поясе, не больше суток). Раз в минуту окно перечитывается целиком:
+    по запросу на каждый пояс пользователей по индексу (status, scheduled_date, scheduled_time), без обхода
+    пользователей, - так подхватываются приёмы, созданные позже, и новые упреждение и пояс в настройках.
+    Время отправки в куче - UTC.
+    """
+
+    def __init__(self, sink, lookahead=timedelta(minutes=5), clock=None):
+        self.sink = sink
+        self.lookahead = lookahead
+        self.clock = clock or server_now
+        self.heap = []  # (время отправки, id приёма, время приёма, уведомление)
+        self.refilled_at = None
+        self.fired = {}  # id приёма -> время приёма; уже отправленные не повторяются при перечитывании окна
+
+    def now(self):
+        return current_minute(self.clock())
+
+    def zones(self):
+        # {пояс: наибольшее упреждение} среди пользователей с включёнными напоминаниями, один GROUP BY
+        # по индексу notif_reminder_zone_idx; '' - пояс по умолчанию, в нём и пользователи без настроек
+        rows = (
+            NotificationSettings.objects.filter(medication_reminders_enabled=True)
+            .values_list('time_zone').annotate(lead=Max('minutes_before_scheduled_time')).order_by()
+        )
+        zones = {name: clamp_lead(lead) for name, lead in rows}
+        zones[''] = max(zones.get('', 0), DEFAULT_LEAD_MINUTES)
+        return zones
+
+    def refill(self, now):
+        # окно каждого пояса - приёмы со временем от текущей местной минуты до + lookahead + упреждение;
+        # на той же минуте не перечитываем
+        if now == self.refilled_at:
+            return 0
+        heap = []
+        for name, max_lead in self.zones().items():
+            heap += self.zone_entries(now, name, max_lead)
+        heapq.heapify(heap)
+        self.heap = heap
+        # приёмы, время которых прошло, в окно больше не попадут
+        self.fired = {intake_id: scheduled for intake_id, scheduled in self.fired.items() if scheduled >= now}
+        self.refilled_at = now
+        return len(heap)
+
+    def zone_entries(self, now, name, max_lead):
+        zone = resolve_zone(name)
+        local = now.astimezone(zone).replace(tzinfo=None)
+        users = Q(**{f'{SETTINGS_PREFIX}medication_reminders_enabled': True, f'{SETTINGS_PREFIX}time_zone': name})
+        if not name:
+            users |= Q(**{f'{SETTINGS_PREFIX}isnull': True})
+        rows = (
+            MedicationIntake.objects
+            .filter(
+                window_filter(local - timedelta(minutes=1), local + self.lookahead + timedelta(minutes=max_lead)),
+                status=MedicationIntake.Status.PENDING,
+            )
+            .filter(users)
+            .values_list(
+                'id', 'user_id', 'scheduled_date', 'scheduled_time', 'medication_name', 'dosage_by_time', 'unit',
+                f'{SETTINGS_PREFIX}minutes_before_scheduled_time',
+            )
+        )
+        entries = []
+        for intake_id, user_id, scheduled_date, scheduled_time, medication_name, dosage, unit, lead in rows.iterator(
+                chunk_size=QUERY_CHUNK_SIZE):
+            if intake_id in self.fired:
+                continue
+            try:
+                scheduled = datetime.fromisoformat(f'{scheduled_date}T{scheduled_time}')
+            except ValueError:
+                continue
+            scheduled = scheduled.replace(tzinfo=zone).astimezone(UTC)
+            # приём, созданный уже после своего времени напоминания, напоминается сразу
+            fire_at = scheduled - timedelta(minutes=DEFAULT_LEAD_MINUTES if lead is None else clamp_lead(lead))
+            entries.append((fire_at, intake_id, scheduled, {
+                'type': 'medication_reminder',
+                'userId': user_id,
+                'intakeId': intake_id,
+                'medicationName': medication_name,
+                'dosageByTime': dosage,
+                'unit': unit,
+                'scheduledDate': scheduled_date,
+                'scheduledTime': scheduled_time,
+            }))
+        return entries
+
+    def pop_due(self, now):
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            _, intake_id, scheduled, notification = heapq.heappop(self.heap)
+            self.fired[intake_id] = scheduled
+            due.append(notification)
+        return due
+
+    def dispatch(self, due):
+        if not due:
+            return 0
+        # приём могли отметить после загрузки в окно - перепроверяем одним запросом
+        still_pending = set(
+            MedicationIntake.objects.filter(
+                pk__in=[notification['intakeId'] for notification in due],
+                status=MedicationIntake.Status.PENDING,
+            ).values_list('pk', flat=True)
+        )
+        notifications = [notification for notification in due if notification['intakeId'] in still_pending]
+        self.sink.emit(notifications)
+        return len(notifications)
+
+    def run_once(self):
+        now = self.now()
+        self.refill(now)
+        return self.dispatch(self.pop_due(now))
+
+    def seconds_until_next(self, now, default):
+        if not self.heap:
+            return default
+        return max(0.0, min(default, (self.heap[0][0] - now).total_seconds()))
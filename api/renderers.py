@@ -0,0 +1,37 @@
+import logging
+
+from rest_framework.renderers import JSONRenderer
+
+logger = logging.getLogger('api.renderers')
+
+try:
+    import orjson
+except ImportError:
+    # orjson в requirements.txt; без него ответы те же, но сериализация заметно медленнее
+    orjson = None
+    logger.warning('orjson is not installed, FastJSONRenderer falls back to the standard json module')
+
+PASSTHROUGH = (orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS) if orjson else 0
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer через orjson, если он установлен. Строки, целые и даты совпадают с JSONRenderer байт в байт:
+    компактные разделители, UTF-8 без \\u-экранирования, U+2028/U+2029 экранируются.
+    Дробные числа (они бывают только в JSON-полях от клиента) записываются короче, но с тем же значением:
+    1e-05 -> 0.00001, 1e+16 -> 1e16. NaN и Infinity отдаются как null, JSONRenderer на них падает.
+    С отступами (?format=json; indent=..., browsable API), ensure_ascii или на типах,
+    которые orjson не знает, используется обычный JSONRenderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            # даты, Decimal и прочее отдаём тому же JSONEncoder, что и у DRF, чтобы формат не отличался
+            ret = orjson.dumps(data, default=self.encoder_class().default, option=PASSTHROUGH)
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
@@ -0,0 +1,78 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+LOCK_POLL_SECONDS = 0.01
+
+
+class ResponseCache:
+    """
+    Кэш ответов GET по ключу (пользователь, коллекция, версия коллекции, путь с параметрами).
+    Версия (ResourceVersion) растёт при каждой записи в коллекцию, поэтому после изменения
+    старые ключи просто перестают читаться и доживают до TTL.
+    Одновременные промахи по одному ключу собираются в одну пересборку (single-flight) через cache.add.
+    """
+
+    def __init__(self, enabled=False, cache_alias='default', ttl=300, lock_timeout=10):
+        self.enabled = enabled
+        self.cache_alias = cache_alias
+        self.ttl = ttl
+        self.lock_timeout = lock_timeout
+
+    @classmethod
+    def from_settings(cls):
+        options = getattr(settings, 'RESPONSE_CACHE', {})
+        return cls(
+            enabled=options.get('ENABLED', False),
+            cache_alias=options.get('CACHE_ALIAS', 'default'),
+            ttl=options.get('TTL', 300),
+            lock_timeout=options.get('LOCK_TIMEOUT', 10),
+        )
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    @staticmethod
+    def make_key(user_id, resource, version, path):
+        digest = hashlib.md5(path.encode()).hexdigest()
+        return f'response:{user_id}:{resource}:{version}:{digest}'
+
+    def get_or_build(self, key, build):
+        """
+        Возвращает закэшированное значение или результат build().
+        build() возвращает (значение, можно_ли_кэшировать) - например, ошибки не кэшируются.
+        """
+        value = self.cache.get(key)
+        if value is not None:
+            return value
+
+        lock_key = f'{key}:lock'
+        if not self.cache.add(lock_key, 1, self.lock_timeout):
+            # ключ уже пересобирает другой запрос - ждём его результат
+            deadline = time.monotonic() + self.lock_timeout
+            while time.monotonic() < deadline:
+                time.sleep(LOCK_POLL_SECONDS)
+                value = self.cache.get(key)
+                if value is not None:
+                    return value
+                if self.cache.get(lock_key) is None:
+                    break
+            # владелец блокировки не положил результат (ошибка или таймаут) - собираем сами
+            value, cacheable = build()
+            return value
+
+        try:
+            value, cacheable = build()
+            if cacheable:
+                self.cache.set(key, value, self.ttl)
+            return value
+        finally:
+            self.cache.delete(lock_key)
+
+
+def get_response_cache():
+    # настройки читаются на каждый запрос, чтобы RESPONSE_CACHE можно было менять в тестах
+    return ResponseCache.from_settings()
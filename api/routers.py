@@ -0,0 +1,144 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+@dataclass
+class Route:
+    # маршрут чтений текущего запроса; объект изменяемый, чтобы его видели и копии контекста (sync_to_async)
+    replica: bool
+    user_id: object = None
+    pinned: bool | None = None  # None - ещё не проверяли отметку о недавней записи
+    shard: str | None = None  # шард задан явно (use_shard в командах по всем пользователям)
+    placement: tuple | None = None  # (шард пользователя, идёт ли перенос) - найден один раз на запрос
+
+
+_route = ContextVar('db_route', default=None)
+
+
+def replica_aliases():
+    return getattr(settings, 'READ_REPLICAS', {}).get('ALIASES', [])
+
+
+def _sticky_cache():
+    return caches[settings.READ_REPLICAS.get('CACHE_ALIAS', 'default')]
+
+
+def _sticky_key(user_id):
+    return f'db-primary:{user_id}'
+
+
+def pin_to_primary(user_id):
+    # после записи пользователь какое-то время читает с default, пока реплики догоняют
+    seconds = settings.READ_REPLICAS.get('STICKY_SECONDS', 10)
+    if seconds:
+        _sticky_cache().set(_sticky_key(user_id), 1, seconds)
+
+
+def is_pinned(user_id):
+    return _sticky_cache().get(_sticky_key(user_id)) is not None
+
+
+def set_route_user(user_id):
+    # вызывается аутентификацией: с этого момента чтения запроса учитывают отметку пользователя
+    route = _route.get()
+    if route is not None and route.user_id != user_id:
+        route.user_id = user_id
+        route.pinned = None
+        route.placement = None
+
+
+@contextmanager
+def use_primary():
+    # чтения внутри блока идут в default (например, только что созданный токен ещё может не дойти до реплики)
+    token = _route.set(Route(replica=False))
+    try:
+        yield
+    finally:
+        _route.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Запись - всегда в default. Чтения - в default, кроме запросов GET/HEAD/OPTIONS,
+    размеченных ReplicaRoutingMiddleware: они читают со случайной реплики из READ_REPLICAS,
+    если пользователь недавно ничего не записывал (read-your-writes).
+    Без реплик, в командах и фоновых потоках всё идёт в default.
+    """
+
+    def db_for_read(self, model, **hints):
+        route = _route.get()
+        aliases = replica_aliases()
+        if route is None or not route.replica or not aliases:
+            return DEFAULT_DB_ALIAS
+        if route.user_id is not None:
+            if route.pinned is None:
+                route.pinned = is_pinned(route.user_id)
+            if route.pinned:
+                return DEFAULT_DB_ALIAS
+        return random.choice(aliases)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # реплики - копии default, объекты из них можно связывать между собой
+        databases = {DEFAULT_DB_ALIAS, *replica_aliases()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # схема реплик приходит вместе с репликацией
+        if db in replica_aliases():
+            return False
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Размечает запрос для ReplicaRouter: безопасные методы могут читать с реплик.
+    После небезопасного запроса аутентифицированного пользователя его чтения
+    STICKY_SECONDS секунд идут в default.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        route = Route(replica=request.method in SAFE_METHODS)
+        token = _route.set(route)
+        try:
+            response = self.get_response(request)
+        finally:
+            _route.reset(token)
+        self.after_response(route)
+        return response
+
+    async def __acall__(self, request):
+        route = Route(replica=request.method in SAFE_METHODS)
+        token = _route.set(route)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _route.reset(token)
+        self.after_response(route)
+        return response
+
+    def after_response(self, route):
+        if not route.replica and route.user_id is not None and replica_aliases():
+            pin_to_primary(route.user_id)
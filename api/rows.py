@@ -0,0 +1,118 @@
+from functools import lru_cache
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from rest_framework import serializers
+from rest_framework.response import Response
+
+# поля, у которых to_representation для значения из базы ничего не меняет (str(str), int(int), ...)
+PASSTHROUGH_FIELDS = {
+    serializers.CharField: (models.CharField, models.TextField),
+    serializers.IntegerField: (models.IntegerField,),
+    serializers.BooleanField: (models.BooleanField,),
+    serializers.JSONField: (models.JSONField,),
+}
+
+
+def _column(model, field):
+    # source сериализатора -> колонка модели: 'name' -> name, 'medication.id' и 'medication_id' -> medication_id
+    attrs = field.source_attrs
+    if not attrs or len(attrs) > 2:
+        return None
+    try:
+        model_field = model._meta.get_field(attrs[0])
+    except FieldDoesNotExist:
+        return None
+    if len(attrs) == 2:
+        if not model_field.many_to_one or attrs[1] not in ('id', 'pk', model_field.target_field.attname):
+            return None
+        return model_field.attname, model_field.target_field
+    if model_field.is_relation:
+        # source='medication_id' - сама колонка FK
+        if model_field.many_to_one and attrs[0] == model_field.attname:
+            return model_field.attname, model_field.target_field
+        return None
+    return model_field.attname, model_field
+
+
+def _converter(field, model_field):
+    for serializer_type, model_types in PASSTHROUGH_FIELDS.items():
+        if type(field) is serializer_type and isinstance(model_field, model_types):
+            return None
+    # ChoiceField со строковыми ключами отдаёт строку из базы как есть (и для значений вне choices тоже)
+    if (type(field) is serializers.ChoiceField and isinstance(model_field, models.CharField)
+            and all(isinstance(key, str) for key in field.choice_strings_to_values.values())):
+        return None
+    return field.to_representation
+
+
+class RowBuilder:
+    """
+    Быстрый вывод списков без сериализатора: values_list() ровно по выходным колонкам
+    и заранее собранное соответствие колонка -> ключ camelCase.
+    Результат совпадает с serializer_class(many=True).data: тот же порядок ключей,
+    None остаётся None, остальное проходит через to_representation поля, если оно что-то меняет.
+    """
+
+    def __init__(self, keys, columns, converters):
+        self.keys = keys
+        self.columns = columns
+        self.converters = converters
+
+    @classmethod
+    def for_serializer(cls, serializer_class):
+        # None, если у сериализатора есть поля, которые не сводятся к колонкам (SerializerMethodField и т.п.)
+        serializer = serializer_class()
+        model = serializer_class.Meta.model
+        keys, columns, converters = [], [], []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            column = _column(model, field)
+            if column is None:
+                return None
+            attname, model_field = column
+            keys.append(name)
+            columns.append(attname)
+            converters.append(_converter(field, model_field))
+        return cls(tuple(keys), tuple(columns), tuple(converters))
+
+    def values(self, queryset):
+        # именованные кортежи: keyset-пагинация читает из них поля сортировки по имени
+        return queryset.values_list(*self.columns, named=True)
+
+    def build(self, rows):
+        keys = self.keys
+        if not any(self.converters):
+            return [dict(zip(keys, row)) for row in rows]
+        converters = self.converters
+        return [
+            dict(zip(keys, [
+                value if convert is None or value is None else convert(value)
+                for convert, value in zip(converters, row)
+            ]))
+            for row in rows
+        ]
+
+
+@lru_cache(maxsize=None)
+def row_builder(serializer_class):
+    # собирается один раз на класс сериализатора
+    return RowBuilder.for_serializer(serializer_class)
+
+
+class FastListMixin:
+    """list() через RowBuilder вместо создания моделей и сериализатора на каждую строку."""
+
+    def get_row_builder(self):
+        return row_builder(self.get_serializer_class())
+
+    def list(self, request, *args, **kwargs):
+        builder = self.get_row_builder()
+        if builder is None:
+            return super().list(request, *args, **kwargs)
+        queryset = builder.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(builder.build(page))
+        return Response(builder.build(queryset))
@@ -0,0 +1,289 @@
+import multiprocessing
+import random
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager, nullcontext
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+
+from django.contrib.auth.hashers import make_password
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from rest_framework.authtoken.models import Token
+
+from .materialize import intake_id
+from .models import Medication, MedicationIntake, MedicationSchedule, NotificationSettings, User, UserShard
+from .occurrences import expand_schedule
+from .sharding import shard_aliases
+
+Form = Medication.Form
+Frequency = MedicationSchedule.Frequency
+Status = MedicationIntake.Status
+PENDING, TAKEN, MISSED = Status.PENDING.value, Status.TAKEN.value, Status.MISSED.value
+
+# доли примерно как у реальных пользователей: в основном таблетки и ежедневный приём
+FORM_WEIGHTS = {
+    Form.TABLET: 45, Form.CAPSULE: 20, Form.DROPS: 10, Form.LIQUID: 10,
+    Form.OINTMENT: 5, Form.SPRAY: 5, Form.POWDER: 5,
+}
+FREQUENCY_WEIGHTS = {
+    Frequency.DAILY: 60, Frequency.EVERY_OTHER_DAY: 15, Frequency.SPECIFIC_DAYS: 15, Frequency.SPECIFIC_DATES: 10,
+}
+# форма -> (дозировка единицы, единица, доза на приём)
+FORM_DOSAGES = {
+    Form.TABLET: ('500mg', 'мг', '1'), Form.CAPSULE: ('250mg', 'мг', '1'), Form.DROPS: (None, 'капли', '10'),
+    Form.LIQUID: ('100mg', 'мл', '5'), Form.OINTMENT: (None, 'г', '1'), Form.SPRAY: (None, 'впрыск', '2'),
+    Form.POWDER: ('1g', 'г', '1'),
+}
+NAMES = (
+    'Парацетамол', 'Ибупрофен', 'Аспирин', 'Омепразол', 'Метформин', 'Лизиноприл', 'Аторвастатин',
+    'Амоксициллин', 'Витамин D', 'Магний B6', 'Цетиризин', 'Левотироксин',
+)
+TIMES = ('07:00', '08:00', '09:00', '12:00', '13:00', '14:00', '18:00', '19:00', '21:00', '22:00')
+COLORS = ('blue', 'red', 'green', 'orange', 'purple')
+
+# порядок колонок приёма для вставки кортежами (см. insert_rows)
+INTAKE_COLUMNS = tuple(field.column for field in MedicationIntake._meta.concrete_fields)
+CHUNK_SIZE = 20000
+
+
+@lru_cache(maxsize=4096)
+def day_ms(day):
+    # полночь дня в локальном времени, в мс (как createdAt на фронте)
+    return int(datetime.combine(day, datetime.min.time()).timestamp() * 1000)
+
+
+@lru_cache(maxsize=1440)
+def minute_ms(time):
+    hours, minutes = time.split(':')
+    return (int(hours) * 60 + int(minutes)) * 60_000
+
+
+def row_template(**constant):
+    # заготовка строки приёма в порядке INTAKE_COLUMNS с общими для расписания значениями
+    return [constant.get(column) for column in INTAKE_COLUMNS]
+
+
+ID, SCHEDULED_TIME, SCHEDULED_DATE, STATUS, TAKEN_AT, CREATED_AT, UPDATED_AT, CHANGED_AT, DOSAGE_BY_TIME = (
+    INTAKE_COLUMNS.index(column) for column in (
+        'id', 'scheduled_time', 'scheduled_date', 'status', 'taken_at', 'created_at', 'updated_at', 'changed_at',
+        'dosage_by_time',
+    )
+)
+
+
+def insert_rows(model, columns, rows):
+    """
+    Вставка уже подготовленных кортежей одним executemany. bulk_create готовит каждое значение через
+    поле модели и на SQLite режет вставку на пачки по 999 параметров - для миллиона приёмов это в разы медленнее.
+    """
+    if not rows:
+        return
+    quote = connection.ops.quote_name
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        quote(model._meta.db_table), ', '.join(quote(column) for column in columns), ', '.join(['%s'] * len(columns))
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, rows)
+
+
+class UserData:
+    """Всё, что генерируется для одного пользователя: объекты для bulk_create и кортежи приёмов."""
+
+    def __init__(self):
+        self.users = []
+        self.settings = []
+        self.tokens = []
+        self.medications = []
+        self.schedules = []
+        self.intakes = []
+
+    def extend(self, other):
+        for name, rows in vars(other).items():
+            getattr(self, name).extend(rows)
+
+    def counts(self):
+        return {name: len(rows) for name, rows in vars(self).items()}
+
+
+def generate_user(index, *, seed=0, prefix='seed-', medications=(1, 8), days=90, future_days=7,
+                  taken_ratio=0.8, missed_ratio=0.15, password_hash='', today=None):
+    """
+    Пользователь с лекарствами, расписаниями всех видов частоты и приёмами за days дней назад
+    и future_days вперёд. Прошлые приёмы - taken с вероятностью taken_ratio, missed - missed_ratio,
+    остальные так и остались pending; сегодняшние и будущие - pending.
+    Данные зависят только от seed и id пользователя, а не от того, в каком процессе он создаётся.
+    """
+    rng = random.Random(f'{seed}:{prefix}{index}')
+    today = today or date.today()
+    first_day = today - timedelta(days=days)
+    last_day = today + timedelta(days=future_days)
+    data = UserData()
+
+    user_id = f'{prefix}{index}'
+    created_at = day_ms(first_day)
+    user = User(id=user_id, email=f'{user_id}@example.com', username=user_id, password=password_hash)
+    data.users.append(user)
+    data.settings.append(NotificationSettings(
+        user=user, medication_reminders_enabled=rng.random() < 0.9,
+        minutes_before_scheduled_time=rng.choice((0, 5, 10, 15, 30)),
+        low_stock_reminders_enabled=rng.random() < 0.7, updated_at=created_at,
+    ))
+    data.tokens.append(Token(key=f'{rng.getrandbits(160):040x}', user=user))
+
+    forms, form_weights = zip(*FORM_WEIGHTS.items())
+    frequencies, frequency_weights = zip(*FREQUENCY_WEIGHTS.items())
+    for number in range(rng.randint(*medications)):
+        form = rng.choices(forms, form_weights)[0]
+        dosage_per_unit, unit, dose = FORM_DOSAGES[form]
+        total = rng.choice((10, 20, 30, 60, 100))
+        medication = Medication(
+            id=f'{user_id}-m{number}', user=user, name=rng.choice(NAMES), form=form,
+            dosage_per_unit=dosage_per_unit, unit=unit, instructions=rng.choice(('После еды', 'До еды', 'Запивать водой')),
+            total_quantity=total, remaining_quantity=rng.randint(0, total), low_stock_threshold=rng.choice((0, 5, 10)),
+            track_stock=rng.random() < 0.8, icon_name='pill', icon_color=rng.choice(COLORS),
+            created_at=created_at, updated_at=created_at + number, changed_at=created_at + number,
+        )
+        data.medications.append(medication)
+
+        frequency = rng.choices(frequencies, frequency_weights)[0]
+        start_date = first_day + timedelta(days=rng.randint(0, days // 3))
+        schedule = MedicationSchedule(
+            id=f'{user_id}-s{number}', user=user, medication=medication, frequency=frequency,
+            days=sorted(rng.sample(range(1, 8), rng.randint(1, 4))) if frequency == Frequency.SPECIFIC_DAYS else [],
+            dates=sorted(
+                (start_date + timedelta(days=offset)).isoformat()
+                for offset in rng.sample(range(days + future_days), min(days + future_days, rng.randint(3, 15)))
+            ) if frequency == Frequency.SPECIFIC_DATES else [],
+            times=[{'time': time, 'dosage': dose, 'unit': unit} for time in sorted(rng.sample(TIMES, rng.randint(1, 3)))],
+            meal_relation=rng.choice(MedicationSchedule.MealRelation.values),
+            start_date=start_date, end_date=None,
+            # примерно треть - курсы на ограниченное число дней
+            duration_days=rng.randint(7, 60) if rng.random() < 0.3 else None,
+            created_at=created_at, updated_at=created_at + number, changed_at=created_at + number,
+        )
+        schedule.set_effective_end_date()
+        data.schedules.append(schedule)
+
+        # колонки, одинаковые у всех приёмов расписания; меняются только id, дата, время, статус и метки
+        template = row_template(
+            schedule_id=schedule.id, medication_id=medication.id, user_id=user_id,
+            medication_name=medication.name, meal_relation=schedule.meal_relation,
+            dosage_per_unit=medication.dosage_per_unit, instructions=medication.instructions,
+            unit=medication.unit, icon_name=medication.icon_name, icon_color=medication.icon_color, stock_deducted=0,
+        )
+        for day, time, _, _, dosage, _ in expand_schedule(schedule, first_day, last_day):
+            scheduled_date = day.isoformat()
+            timestamp = day_ms(day)
+            values = template.copy()
+            values[ID] = intake_id(schedule.id, scheduled_date, time)
+            values[SCHEDULED_DATE] = scheduled_date
+            values[SCHEDULED_TIME] = time
+            values[DOSAGE_BY_TIME] = dosage
+            values[STATUS] = PENDING
+            values[CREATED_AT] = values[UPDATED_AT] = timestamp
+            if day < today:
+                roll = rng.random()
+                if roll < taken_ratio:
+                    values[STATUS] = TAKEN
+                    values[TAKEN_AT] = values[UPDATED_AT] = timestamp + minute_ms(time) + rng.randrange(3_600_000)
+                elif roll < taken_ratio + missed_ratio:
+                    values[STATUS] = MISSED
+            values[CHANGED_AT] = values[UPDATED_AT]
+            data.intakes.append(tuple(values))
+    return data
+
+
+_write_lock = None  # общий замок записи для процессов при --workers на SQLite (там один писатель)
+
+
+def save(data):
+    # один пакет пользователей - одна транзакция; связи уже проставлены объектами
+    with _write_lock or nullcontext(), transaction.atomic():
+        User.objects.bulk_create(data.users)
+        NotificationSettings.objects.bulk_create(data.settings)
+        Token.objects.bulk_create(data.tokens)
+        Medication.objects.bulk_create(data.medications)
+        MedicationSchedule.objects.bulk_create(data.schedules)
+        insert_rows(MedicationIntake, INTAKE_COLUMNS, data.intakes)
+        if len(shard_aliases()) > 1:
+            # всё записано в default; по шардам пользователей разносит move_users --rebalance
+            UserShard.objects.bulk_create([UserShard(user=user, shard=DEFAULT_DB_ALIAS) for user in data.users])
+
+
+@contextmanager
+def deferred_indexes(model):
+    """
+    SQLite: вторичные индексы таблицы снимаются на время загрузки и строятся заново в конце -
+    одна сортировка вместо вставки в восемь B-деревьев на каждую строку. На других базах ничего не делает.
+    """
+    if connection.vendor != 'sqlite':
+        yield
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = %s AND sql IS NOT NULL",
+            [model._meta.db_table],
+        )
+        indexes = cursor.fetchall()
+        for name, _ in indexes:
+            cursor.execute(f'DROP INDEX {connection.ops.quote_name(name)}')
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            for _, sql in indexes:
+                cursor.execute(sql)
+
+
+def seed_users(indexes, chunk_size=CHUNK_SIZE, **options):
+    """Создаёт пользователей с номерами indexes, сбрасывая в базу каждые chunk_size приёмов. Возвращает счётчики."""
+    totals = {}
+    pending = UserData()
+    for index in indexes:
+        pending.extend(generate_user(index, **options))
+        if len(pending.intakes) >= chunk_size:
+            save(pending)
+            for name, count in pending.counts().items():
+                totals[name] = totals.get(name, 0) + count
+            pending = UserData()
+    save(pending)
+    for name, count in pending.counts().items():
+        totals[name] = totals.get(name, 0) + count
+    return totals
+
+
+def _init_worker(lock):
+    global _write_lock
+    _write_lock = lock
+    # у дочернего процесса своё подключение, унаследованное от родителя не используем
+    connections.close_all()
+
+
+def _seed_slice(args):
+    indexes, chunk_size, options = args
+    return seed_users(indexes, chunk_size, **options)
+
+
+def seed_population(users, start=0, workers=1, chunk_size=CHUNK_SIZE, password='password', defer_indexes=True,
+                    **options):
+    """
+    Создаёт users синтетических пользователей с номерами start..start+users-1 (см. generate_user).
+    defer_indexes - на SQLite индексы приёмов строятся один раз после загрузки (см. deferred_indexes).
+    workers > 1 - пользователи генерируются в нескольких процессах (где доступен fork); на SQLite запись
+    по очереди под общим замком, на остальных базах параллельно. Возвращает счётчики созданных строк.
+    """
+    options['password_hash'] = make_password(password)  # один хэш на всех: PBKDF2 на каждого слишком долгий
+    indexes = range(start, start + users)
+    with deferred_indexes(MedicationIntake) if defer_indexes else nullcontext():
+        if workers <= 1 or 'fork' not in multiprocessing.get_all_start_methods():
+            return seed_users(indexes, chunk_size, **options)
+
+        context = multiprocessing.get_context('fork')
+        lock = context.Lock() if connection.vendor == 'sqlite' else None
+        connections.close_all()
+        slices = [(indexes[number::workers], chunk_size, options) for number in range(workers)]
+        totals = {}
+        with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker, initargs=(lock,)) as executor:
+            for counts in executor.map(_seed_slice, slices):
+                for name, count in counts.items():
+                    totals[name] = totals.get(name, 0) + count
+        return totals
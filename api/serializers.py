@@ -1,9 +1,11 @@
 import re
 
+from django.db import router, transaction
 from django.utils import timezone
 from rest_framework import serializers
 from .models import User, Medication, MedicationSchedule, MedicationIntake, NotificationSettings
 from djoser.serializers import UserCreateSerializer as BaseUserCreateSerializer
+from .stock import change_intake_status, deduct_stock, dose_amount
 
 class UserCreateSerializer(BaseUserCreateSerializer):
     name = serializers.CharField(source='username')
@@ -29,6 +31,15 @@ class UserSerializer(serializers.ModelSerializer):
     #     return None
 
 
+def save_fields(instance, validated_data):
+    # сохраняет только присланные поля: полный save перезаписал бы остаток и статус,
+    # которые параллельно поменяли атомарные UPDATE (api/stock.py)
+    for field, value in validated_data.items():
+        setattr(instance, field, value)
+    instance.save(update_fields=list(validated_data))
+    return instance
+
+
 class MedicationSerializer(serializers.ModelSerializer):
     #переписываем все названия в camelCase как во фронтенде
     dosagePerUnit = serializers.CharField(source='dosage_per_unit', allow_blank=True, allow_null=True, required=False)
@@ -61,9 +72,33 @@ class MedicationSerializer(serializers.ModelSerializer):
         #убрала переопределение created_at и updated_at
         return Medication.objects.create(**validated_data)
 
-class MedicationScheduleSerializer(serializers.ModelSerializer):
+    def update(self, instance, validated_data):
+        # остаток задан вручную (например, купили новую упаковку) - начатая единица больше не учитывается
+        if 'remaining_quantity' in validated_data:
+            validated_data['remaining_fraction'] = 0
+        return save_fields(instance, validated_data)
+
+class RelatedLookupMixin:
+    # поиск связанных объектов пользователя; пакетная запись (/api/batch/) заранее загружает их
+    # одним запросом на тип и передаёт в context как словари {id: объект}
+
+    def get_medication(self, medication_id):
+        cached = self.context.get('medications', {}).get(medication_id)
+        if cached is not None:
+            return cached
+        return Medication.objects.get(id=medication_id, user=self.context['request'].user)
+
+    def get_schedule(self, schedule_id):
+        cached = self.context.get('schedules', {}).get(schedule_id)
+        if cached is not None:
+            return cached
+        return MedicationSchedule.objects.get(id=schedule_id, user=self.context['request'].user)
+
+
+class MedicationScheduleSerializer(RelatedLookupMixin, serializers.ModelSerializer):
     #все в camelCase
-    medicationId = serializers.CharField(source='medication.id')
+    # *_id читается из колонки FK без загрузки связанного объекта (иначе по запросу на строку)
+    medicationId = serializers.CharField(source='medication_id')
     mealRelation = serializers.CharField(source='meal_relation')
     startDate = serializers.DateField(source='start_date')
     endDate = serializers.DateField(source='end_date', allow_null=True, required=False)
@@ -93,11 +128,7 @@ class MedicationScheduleSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         try:
             validated_data['user'] = self.context['request'].user
-            medication_id = validated_data.pop('medication').get('id')
-            validated_data['medication'] = Medication.objects.get(
-                id=medication_id, 
-                user=self.context['request'].user
-            )
+            validated_data['medication'] = self.get_medication(validated_data.pop('medication_id'))
             return MedicationSchedule.objects.create(**validated_data)
         except Medication.DoesNotExist:
             raise serializers.ValidationError(
@@ -105,15 +136,14 @@ class MedicationScheduleSerializer(serializers.ModelSerializer):
             )
 
     def update(self, instance, validated_data):
-        if 'medication' in validated_data:
-            medication_id = validated_data.pop('medication').get('id')
-            validated_data['medication'] = Medication.objects.get(id=medication_id, user=self.context['request'].user)
+        if 'medication_id' in validated_data:
+            validated_data['medication'] = self.get_medication(validated_data.pop('medication_id'))
         return super().update(instance, validated_data)
 
 
-class MedicationIntakeSerializer(serializers.ModelSerializer):
-    scheduleId = serializers.CharField(source='schedule.id')
-    medicationId = serializers.CharField(source='medication.id')
+class MedicationIntakeSerializer(RelatedLookupMixin, serializers.ModelSerializer):
+    scheduleId = serializers.CharField(source='schedule_id')
+    medicationId = serializers.CharField(source='medication_id')
     #используем CharField как во фронтенде
     scheduledTime = serializers.CharField(source='scheduled_time')
     scheduledDate = serializers.CharField(source='scheduled_date')
@@ -138,14 +168,13 @@ class MedicationIntakeSerializer(serializers.ModelSerializer):
         ]
 
     def create(self, validated_data):
-        # Получаем ID расписания
-        schedule_data = validated_data.pop('schedule')  # это dict: {'id': '...'}
-        schedule_id = schedule_data['id']
+        # Получаем ID расписания; medicationId берётся из расписания
+        schedule_id = validated_data.pop('schedule_id')
+        validated_data.pop('medication_id', None)
 
         # Получаем объект расписания из базы
-        user = self.context['request'].user
         try:
-            schedule = MedicationSchedule.objects.get(id=schedule_id, user=user)
+            schedule = self.get_schedule(schedule_id)
         except MedicationSchedule.DoesNotExist:
             raise serializers.ValidationError("Расписание с таким ID не найдено или не принадлежит пользователю")
 
@@ -163,27 +192,36 @@ class MedicationIntakeSerializer(serializers.ModelSerializer):
         validated_data['icon_name'] = medication.icon_name
         validated_data['icon_color'] = medication.icon_color
 
-        return super().create(validated_data)
+        with transaction.atomic(using=router.db_for_write(MedicationIntake), savepoint=False):
+            # приём, сразу отмеченный как принятый, тоже списывает дозу
+            if validated_data.get('status') == MedicationIntake.Status.TAKEN:
+                validated_data['stock_deducted'] = deduct_stock(
+                    medication.id, dose_amount(validated_data.get('dosage_by_time')), medication.user_id
+                )
+            return super().create(validated_data)
 
     def update(self, instance, validated_data):
-        if 'schedule' in validated_data:
-            schedule_id = validated_data.pop('schedule').get('id')
-            validated_data['schedule'] = MedicationSchedule.objects.get(id=schedule_id,
-                                                                        user=self.context['request'].user)
-        if 'medication' in validated_data:
-            medication_id = validated_data.pop('medication').get('id')
-            validated_data['medication'] = Medication.objects.get(id=medication_id, user=self.context['request'].user)
+        if 'schedule_id' in validated_data:
+            validated_data['schedule'] = self.get_schedule(validated_data.pop('schedule_id'))
+        if 'medication_id' in validated_data:
+            validated_data['medication'] = self.get_medication(validated_data.pop('medication_id'))
 
         if 'schedule' in validated_data or 'medication' in validated_data:
-            validated_data['medication_name'] = validated_data['medication'].name
-            validated_data['meal_relation'] = validated_data['schedule'].meal_relation
-            validated_data['dosage_per_unit'] = validated_data['medication'].dosage_per_unit
-            validated_data['instructions'] = validated_data['medication'].instructions
-            validated_data['unit'] = validated_data['medication'].unit
-            validated_data['icon_name'] = validated_data['medication'].icon_name
-            validated_data['icon_color'] = validated_data['medication'].icon_color
-
-        return super().update(instance, validated_data)
+            medication = validated_data.get('medication') or instance.medication
+            schedule = validated_data.get('schedule') or instance.schedule
+            validated_data['medication_name'] = medication.name
+            validated_data['meal_relation'] = schedule.meal_relation
+            validated_data['dosage_per_unit'] = medication.dosage_per_unit
+            validated_data['instructions'] = medication.instructions
+            validated_data['unit'] = medication.unit
+            validated_data['icon_name'] = medication.icon_name
+            validated_data['icon_color'] = medication.icon_color
+
+        with transaction.atomic(using=router.db_for_write(MedicationIntake, instance=instance), savepoint=False):
+            # смена статуса и списание/возврат остатка - отдельными атомарными UPDATE
+            if 'status' in validated_data:
+                change_intake_status(instance, validated_data['status'])
+            return save_fields(instance, validated_data)
 
 
 class NotificationSettingsSerializer(serializers.ModelSerializer):
@@ -191,7 +229,7 @@ class NotificationSettingsSerializer(serializers.ModelSerializer):
         model = NotificationSettings
         fields = [
             'id', 'medication_reminders_enabled',
-            'minutes_before_scheduled_time', 'low_stock_reminders_enabled'
+            'minutes_before_scheduled_time', 'low_stock_reminders_enabled', 'time_zone'
         ]
         # скрываем поле user от входа, оно задаётся на сервере
         extra_kwargs = {
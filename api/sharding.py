@@ -0,0 +1,275 @@
+import copy
+import hashlib
+import logging
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .models import (
+    User, Medication, MedicationSchedule, MedicationIntake, ArchivedIntake, DailyAdherence, AdherenceRollupState,
+    NotificationSettings, ResourceVersion, Tombstone, UserShard,
+)
+from .routers import Route, _route, replica_aliases
+
+logger = logging.getLogger('api.sharding')
+
+# пользовательские таблицы, которые живут в шарде пользователя; порядок - порядок копирования (сначала то, на что ссылаются)
+SHARDED_MODELS = (
+    Medication, MedicationSchedule, MedicationIntake, ArchivedIntake, DailyAdherence, AdherenceRollupState,
+    NotificationSettings, ResourceVersion, Tombstone,
+)
+COPY_CHUNK_SIZE = 2000
+
+
+class UserMoving(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'User data is being moved, retry shortly.'
+    default_code = 'user_moving'
+
+
+def _options():
+    return getattr(settings, 'SHARDING', {})
+
+
+def shard_aliases():
+    return _options().get('SHARDS', [DEFAULT_DB_ALIAS])
+
+
+def hash_shard(user_id, aliases=None):
+    """
+    Шард по стабильному хэшу id (rendezvous hashing): при добавлении шарда новое место получает
+    примерно 1/N пользователей, остальные остаются где были.
+    """
+    aliases = aliases or shard_aliases()
+    return max(aliases, key=lambda alias: hashlib.md5(f'{alias}:{user_id}'.encode()).digest())
+
+
+def _directory_cache():
+    return caches[_options().get('CACHE_ALIAS', 'default')]
+
+
+def _directory_key(user_id):
+    return f'user-shard:{user_id}'
+
+
+def forget_placement(user_id):
+    _directory_cache().delete(_directory_key(user_id))
+
+
+def placement(user_id):
+    """
+    (шард, идёт ли перенос) для пользователя. Каталог UserShard главный; пользователи без записи
+    (созданные до включения шардов) живут в default. Результат кэшируется на DIRECTORY_TTL секунд.
+    """
+    if len(shard_aliases()) == 1:
+        return shard_aliases()[0], False
+    key = _directory_key(user_id)
+    cached = _directory_cache().get(key)
+    if cached is not None:
+        return cached
+    entry = UserShard.objects.using(DEFAULT_DB_ALIAS).filter(user_id=user_id).values_list('shard', 'moving').first()
+    result = tuple(entry) if entry else (DEFAULT_DB_ALIAS, False)
+    _directory_cache().set(key, result, _options().get('DIRECTORY_TTL', 5))
+    return result
+
+
+@contextmanager
+def use_shard(alias):
+    # все пользовательские таблицы внутри блока - в шарде alias (команды, которые обходят всех пользователей)
+    token = _route.set(Route(replica=False, shard=alias))
+    try:
+        yield
+    finally:
+        _route.reset(token)
+
+
+@contextmanager
+def use_user(user_id):
+    # как запрос этого пользователя: его таблицы - в его шарде
+    token = _route.set(Route(replica=False, user_id=user_id))
+    try:
+        yield
+    finally:
+        _route.reset(token)
+
+
+class ShardRouter:
+    """
+    Пользовательские таблицы (SHARDED_MODELS) - в шарде пользователя: из явного use_shard,
+    по user_id сохраняемого объекта или по пользователю текущего запроса (его задаёт аутентификация).
+    Пользователи, токены и каталог шардов - в default. Если шард - default, решение остаётся за
+    следующим роутером (ReplicaRouter: реплики для чтения).
+    Запись данных пользователя, которого сейчас переносят, отклоняется с 503.
+    """
+
+    def _placement(self, model, hints):
+        if model not in SHARDED_MODELS or len(shard_aliases()) == 1:
+            return None
+        route = _route.get()
+        if route is not None and route.shard:
+            return route.shard, False
+        user_id = getattr(hints.get('instance'), 'user_id', None)
+        if user_id is not None:
+            return placement(user_id)
+        if route is None or route.user_id is None:
+            return None
+        if route.placement is None:
+            route.placement = placement(route.user_id)
+        return route.placement
+
+    def db_for_read(self, model, **hints):
+        shard = self._placement(model, hints)
+        if shard is None or shard[0] == DEFAULT_DB_ALIAS:
+            return None
+        return shard[0]
+
+    def db_for_write(self, model, **hints):
+        shard = self._placement(model, hints)
+        if shard is None:
+            return None
+        alias, moving = shard
+        if moving:
+            raise UserMoving()
+        return alias
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # пользователь из default и его данные в шарде (в шарде есть копия строки пользователя)
+        databases = {*shard_aliases(), *replica_aliases()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # схема во всех шардах одна и та же
+        return None
+
+
+def mirror_user(user, alias):
+    # строка пользователя в шарде нужна для внешних ключей его данных
+    if alias != DEFAULT_DB_ALIAS:
+        copy.copy(user).save(using=alias)
+
+
+def assign_shard(user):
+    # новый пользователь получает шард по хэшу и сразу запись в каталоге
+    alias = hash_shard(user.pk)
+    UserShard.objects.using(DEFAULT_DB_ALIAS).create(user=user, shard=alias)
+    mirror_user(user, alias)
+
+
+def delete_user_shard_data(user_id):
+    # удаление аккаунта: данные в шарде пользователя удаляются вместе с копией строки пользователя
+    alias, _ = placement(user_id)
+    if alias != DEFAULT_DB_ALIAS:
+        with transaction.atomic(using=alias):
+            _delete_user_data(user_id, alias)
+            User.objects.using(alias).filter(pk=user_id)._raw_delete(alias)
+    forget_placement(user_id)
+
+
+@contextmanager
+def _snapshot(alias):
+    """
+    Одна читающая транзакция на все таблицы пользователя: запись между копированием двух таблиц
+    (например, сводка статистики - DailyAdherence и AdherenceRollupState) не попадает в копию наполовину.
+    PostgreSQL - REPEATABLE READ (снимок на всю транзакцию); SQLite - BEGIN IMMEDIATE (см. settings),
+    запись в шард ждёт конца копирования.
+    """
+    connection = connections[alias]
+    outermost = not connection.in_atomic_block
+    with transaction.atomic(using=alias):
+        if connection.vendor == 'postgresql' and outermost:
+            with connection.cursor() as cursor:
+                cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ')
+        yield
+
+
+def _copy_user_data(user_id, source, target, chunk_size):
+    copied = 0
+    for model in SHARDED_MODELS:
+        queryset = model.objects.using(source).filter(user_id=user_id).order_by('pk')
+        batch = []
+        for obj in queryset.iterator(chunk_size=chunk_size):
+            batch.append(obj)
+            if len(batch) >= chunk_size:
+                model.objects.using(target).bulk_create(batch)
+                copied += len(batch)
+                batch = []
+        if batch:
+            model.objects.using(target).bulk_create(batch)
+            copied += len(batch)
+    return copied
+
+
+def _delete_user_data(user_id, alias):
+    # без сигналов: это не удаление данных пользователем, tombstone и версии не нужны
+    for model in reversed(SHARDED_MODELS):
+        model.objects.using(alias).filter(user_id=user_id)._raw_delete(alias)
+
+
+def _versions(user_id, alias):
+    return dict(ResourceVersion.objects.using(alias).filter(user_id=user_id).values_list('resource', 'version'))
+
+
+def move_user(user_id, target, *, chunk_size=COPY_CHUNK_SIZE, wait=None, log=logger.info):
+    """
+    Переносит данные пользователя в шард target, не останавливая сервис:
+    1. копирует всё в target, пока пользователь продолжает работать со старым шардом;
+    2. помечает перенос в каталоге (запись - 503) и ждёт, пока все воркеры увидят отметку;
+    3. если за время копирования версии коллекций (ResourceVersion) изменились - копирует заново;
+       запись без версии (сводки статистики, отметки о запасе) после копирования теряется, но не разрывает данные:
+       каждая копия читается из одного снимка шарда-источника;
+    4. переключает каталог на target и, когда старые записи каталога истекут, удаляет данные из старого шарда.
+    Возвращает число скопированных строк.
+    """
+    if target not in shard_aliases():
+        raise ValueError(f'Unknown shard: {target}')
+    wait = _options().get('DIRECTORY_TTL', 5) if wait is None else wait
+    user = User.objects.using(DEFAULT_DB_ALIAS).get(pk=user_id)
+    forget_placement(user_id)
+    source, moving = placement(user_id)
+    if moving:
+        raise UserMoving()
+    if source == target:
+        return 0
+
+    mirror_user(user, target)
+    # остатки прерванного переноса
+    _delete_user_data(user_id, target)
+    before = _versions(user_id, source)
+    with transaction.atomic(using=target), _snapshot(source):
+        copied = _copy_user_data(user_id, source, target, chunk_size)
+    log(f'{user_id}: copied {copied} rows {source} -> {target}')
+
+    UserShard.objects.using(DEFAULT_DB_ALIAS).update_or_create(user_id=user_id, defaults={
+        'shard': source, 'moving': True,
+    })
+    forget_placement(user_id)
+    try:
+        time.sleep(wait)
+        if _versions(user_id, source) != before:
+            # пользователь успел что-то записать - копируем заново, запись уже закрыта
+            with transaction.atomic(using=target), _snapshot(source):
+                _delete_user_data(user_id, target)
+                copied = _copy_user_data(user_id, source, target, chunk_size)
+            log(f'{user_id}: changed during copy, copied {copied} rows again')
+    except BaseException:
+        UserShard.objects.using(DEFAULT_DB_ALIAS).filter(user_id=user_id).update(moving=False)
+        forget_placement(user_id)
+        raise
+
+    UserShard.objects.using(DEFAULT_DB_ALIAS).filter(user_id=user_id).update(shard=target, moving=False)
+    forget_placement(user_id)
+    # воркеры с закэшированным старым шардом видят в нём отметку переноса (запись закрыта) и те же данные
+    time.sleep(wait)
+    with transaction.atomic(using=source):
+        _delete_user_data(user_id, source)
+        if source != DEFAULT_DB_ALIAS:
+            User.objects.using(source).filter(pk=user_id)._raw_delete(source)
+    log(f'{user_id}: moved to {target}')
+    return copied
@@ -0,0 +1,135 @@
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import token_cache
+from .fanout import MEDICATION_FIELDS, SCHEDULE_FIELDS, intake_changes, schedule_fan_out
+from .sharding import assign_shard, delete_user_shard_data, mirror_user, placement, shard_aliases
+from .stats import bump_rollup, unroll_intakes
+from .versions import bump_version
+from .models import User, Medication, MedicationSchedule, MedicationIntake, NotificationSettings, Tombstone, deleting
+from .utils import now_ms
+
+# имя ресурса в API для каждой пользовательской модели
+RESOURCES = {
+    Medication: 'medications',
+    MedicationSchedule: 'schedules',
+    MedicationIntake: 'intakes',
+    NotificationSettings: 'notifications',
+}
+
+@receiver(pre_delete, sender=User)
+def user_shard_pre_delete(sender, instance, using, **kwargs):
+    # данные пользователя в другом шарде каскад из default не достанет
+    if using == DEFAULT_DB_ALIAS and len(shard_aliases()) > 1:
+        delete_user_shard_data(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def user_shard_post_save(sender, instance, created, using, **kwargs):
+    # новый пользователь получает шард; копия строки пользователя в шарде обновляется вместе с основной
+    if using != DEFAULT_DB_ALIAS or len(shard_aliases()) == 1:
+        return
+    if created:
+        assign_shard(instance)
+    else:
+        mirror_user(instance, placement(instance.pk)[0])
+
+
+def touch_collection(sender, instance, **kwargs):
+    # любая запись меняет версию коллекции, а значит и ETag её списка
+    if instance.user_id is not None:
+        bump_version(instance.user_id, RESOURCES[sender])
+
+
+for model in RESOURCES:
+    post_save.connect(touch_collection, sender=model, dispatch_uid=f'touch_save_{model.__name__}')
+
+
+@receiver(deleting)
+def record_deletions(sender, queryset, using, **kwargs):
+    """
+    Удаление через delete() объекта или QuerySet: tombstone-записи удаляемых объектов вместе с каскадом,
+    версии коллекций и свёртка статистики - несколькими запросами на всю пачку, а не на каждую строку.
+    Каскад от удаления пользователя сюда не попадает: его данные уходят целиком, tombstone не нужны.
+    """
+    doomed = {sender: queryset}
+    if sender is Medication:
+        doomed[MedicationSchedule] = MedicationSchedule.objects.using(using).filter(medication__in=queryset)
+        doomed[MedicationIntake] = MedicationIntake.objects.using(using).filter(
+            Q(medication__in=queryset) | Q(schedule__medication__in=queryset)
+        )
+    elif sender is MedicationSchedule:
+        doomed[MedicationIntake] = MedicationIntake.objects.using(using).filter(schedule__in=queryset)
+
+    timestamp = now_ms()
+    tombstones = []
+    touched = set()
+    for model, objects in doomed.items():
+        resource = RESOURCES[model]
+        for user_id, object_id in objects.values_list('user_id', 'pk'):
+            if user_id is None:
+                continue
+            tombstones.append(Tombstone(user_id=user_id, resource=resource, object_id=str(object_id), deleted_at=timestamp))
+            touched.add((user_id, resource))
+    Tombstone.objects.using(using).bulk_create(tombstones, batch_size=1000)
+
+    intake_users = {user_id for user_id, resource in touched if resource == 'intakes'}
+    if intake_users:
+        unroll_intakes(doomed[MedicationIntake], intake_users, using)
+    for user_id, resource in touched:
+        bump_version(user_id, resource)
+
+
+@receiver(post_delete, sender=Token)
+def token_post_delete(sender, instance, **kwargs):
+    # выход (djoser token/logout удаляет токен) - кэш аутентификации сбрасываем сразу
+    token_cache.evict(instance.key)
+
+
+@receiver(post_save, sender=User)
+def user_post_save(sender, instance, created, **kwargs):
+    # смена пароля, деактивация и любые правки пользователя - в кэше не должно остаться старой копии
+    if created:
+        return
+    keys = list(Token.objects.filter(user_id=instance.pk).values_list('key', flat=True))
+    if keys:
+        token_cache.evict(*keys)
+
+
+@receiver(post_save, sender=Medication)
+def medication_post_save(sender, instance, created, **kwargs):
+    # правки лекарства переносим в продублированные поля будущих приёмов
+    if not created:
+        schedule_fan_out(
+            {'user_id': instance.user_id, 'medication_id': instance.pk},
+            intake_changes(instance, MEDICATION_FIELDS),
+            using=kwargs['using'],
+        )
+    instance.reset_tracking()
+
+
+@receiver(post_save, sender=MedicationSchedule)
+def schedule_post_save(sender, instance, created, **kwargs):
+    if not created:
+        schedule_fan_out(
+            {'user_id': instance.user_id, 'schedule_id': instance.pk},
+            intake_changes(instance, SCHEDULE_FIELDS),
+            using=kwargs['using'],
+        )
+    instance.reset_tracking()
+
+
+@receiver(post_save, sender=MedicationIntake)
+def intake_post_save(sender, instance, created, **kwargs):
+    # статистика закрытых дней обновляется инкрементально: -1 старому статусу, +1 новому
+    loaded = {} if created else getattr(instance, '_loaded_values', {})
+    old = (loaded.get('medication_id'), loaded.get('scheduled_date'), loaded.get('status'))
+    new = (instance.medication_id, instance.scheduled_date, instance.status)
+    if old != new:
+        if not created and loaded:
+            bump_rollup(instance.user_id, *old, -1)
+        bump_rollup(instance.user_id, *new, 1)
+    instance.reset_tracking()
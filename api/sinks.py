@@ -0,0 +1,47 @@
+import json
+import logging
+import threading
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger('api.notifications')
+
+
+class LogSink:
+    """Пишет уведомления в лог (logger api.notifications). Достаточно для разработки."""
+
+    def emit(self, notifications):
+        for notification in notifications:
+            logger.info('%s %s', notification.get('type'), json.dumps(notification, ensure_ascii=False))
+
+
+class FileSink:
+    """Дописывает уведомления в файл, по одному JSON-объекту на строку."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def emit(self, notifications):
+        if not notifications:
+            return
+        lines = ''.join(json.dumps(notification, ensure_ascii=False) + '\n' for notification in notifications)
+        with self._lock, open(self.path, 'a', encoding='utf-8') as file:
+            file.write(lines)
+
+
+class MemorySink:
+    """Копит уведомления в списке - для тестов."""
+
+    def __init__(self):
+        self.notifications = []
+
+    def emit(self, notifications):
+        self.notifications.extend(notifications)
+
+
+def get_sink():
+    # NOTIFICATION_SINK - путь к классу с методом emit(notifications), NOTIFICATION_SINK_OPTIONS - его аргументы
+    sink_class = import_string(getattr(settings, 'NOTIFICATION_SINK', 'api.sinks.LogSink'))
+    return sink_class(**getattr(settings, 'NOTIFICATION_SINK_OPTIONS', {}))
@@ -0,0 +1,196 @@
+from datetime import date, timedelta
+
+from django.db import router, transaction
+from django.db.models import CharField, Count, Exists, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Cast, Coalesce
+
+from .models import AdherenceRollupState, ArchivedIntake, DailyAdherence, MedicationIntake, MedicationSchedule
+from .occurrences import active_between, expand_schedules
+
+Status = MedicationIntake.Status
+STATUSES = (Status.TAKEN, Status.MISSED, Status.PENDING)
+GROUP_BY = ('day', 'week', 'medication')
+
+
+def count_by_status(queryset):
+    # условная агрегация: все три счётчика за один проход
+    return queryset.annotate(**{
+        str(status): Count('pk', filter=Q(status=status)) for status in STATUSES
+    })
+
+
+def intake_counts(user_id, start=None, end=None):
+    """Счётчики приёмов по (лекарство, день) прямо из MedicationIntake, границы включительно."""
+    queryset = MedicationIntake.objects.filter(user_id=user_id)
+    if start:
+        queryset = queryset.filter(scheduled_date__gte=start.isoformat())
+    if end:
+        queryset = queryset.filter(scheduled_date__lte=end.isoformat())
+    return count_by_status(queryset.values('medication_id', 'scheduled_date').order_by())
+
+
+def ensure_rollup(user_id, through):
+    """Досворачивает закрытые дни пользователя до through включительно. Возвращает дату, до которой свёрнуто."""
+    state, _ = AdherenceRollupState.objects.get_or_create(user_id=user_id)
+    if state.closed_through and state.closed_through >= through:
+        return state.closed_through
+
+    start = state.closed_through + timedelta(days=1) if state.closed_through else None
+    with transaction.atomic(using=router.db_for_write(DailyAdherence)):
+        rows = []
+        for row in intake_counts(user_id, start, through):
+            try:
+                day = date.fromisoformat(row['scheduled_date'])
+            except ValueError:
+                continue
+            rows.append(DailyAdherence(
+                user_id=user_id, medication_id=row['medication_id'], date=day,
+                taken=row['taken'], missed=row['missed'], pending=row['pending'],
+            ))
+        # при параллельном построении вторая вставка совпадёт с первой
+        DailyAdherence.objects.bulk_create(rows, batch_size=1000, ignore_conflicts=True)
+        AdherenceRollupState.objects.filter(pk=state.pk).update(closed_through=through)
+    return through
+
+
+def bump_rollup(user_id, medication_id, scheduled_date, status, delta):
+    """Инкрементально правит свёртку, если день уже закрыт. Вызывается при изменении приёма (api/signals.py)."""
+    if not user_id or status not in STATUSES:
+        return
+    try:
+        day = date.fromisoformat(scheduled_date)
+    except (TypeError, ValueError):
+        return
+    if day >= date.today():
+        return
+    closed_through = AdherenceRollupState.objects.filter(user_id=user_id).values_list(
+        'closed_through', flat=True
+    ).first()
+    if not closed_through or day > closed_through:
+        return
+    updated = DailyAdherence.objects.filter(user_id=user_id, medication_id=medication_id, date=day).update(
+        **{status: F(status) + delta}
+    )
+    if not updated and delta > 0:
+        DailyAdherence.objects.create(user_id=user_id, medication_id=medication_id, date=day, **{status: delta})
+
+
+def unroll_intakes(intakes, user_ids, using):
+    """
+    Вычитает удаляемые приёмы из свёртки одним UPDATE на всю пачку. Строки DailyAdherence есть только
+    у закрытых дней, поэтому текущие и будущие приёмы на свёртку не влияют.
+    """
+    matching = intakes.filter(
+        user_id=OuterRef('user_id'),
+        medication_id=OuterRef('medication_id'),
+        scheduled_date=Cast(OuterRef('date'), CharField()),
+    ).order_by()
+    counts = {
+        str(status): Coalesce(Subquery(
+            matching.filter(status=status).values('user_id').annotate(count=Count('pk')).values('count')
+        ), 0)
+        for status in STATUSES
+    }
+    DailyAdherence.objects.using(using).filter(user_id__in=user_ids).filter(Exists(matching)).update(
+        **{status: F(status) - count for status, count in counts.items()}
+    )
+
+
+def _group_key(group_by, day, medication_id):
+    if group_by == 'day':
+        return day.isoformat()
+    if group_by == 'week':
+        return (day - timedelta(days=day.weekday())).isoformat()
+    return medication_id
+
+
+def adherence(user_id, start, end, group_by='day', today=None):
+    """
+    Статистика за [start, end]. Закрытые дни читаются из DailyAdherence (по строке на лекарство и день),
+    текущие и будущие - условной агрегацией по MedicationIntake.
+    """
+    today = today or date.today()
+    groups = {}
+
+    def add(key, taken, missed, pending):
+        counts = groups.setdefault(key, {'taken': 0, 'missed': 0, 'pending': 0})
+        counts['taken'] += taken
+        counts['missed'] += missed
+        counts['pending'] += pending
+
+    yesterday = today - timedelta(days=1)
+    if start <= yesterday:
+        closed_end = min(end, yesterday)
+        ensure_rollup(user_id, yesterday)
+        rows = DailyAdherence.objects.filter(user_id=user_id, date__gte=start, date__lte=closed_end)
+        fields = ('medication_id',) if group_by == 'medication' else ('date',)
+        rows = rows.values(*fields).annotate(
+            sum_taken=Sum('taken'), sum_missed=Sum('missed'), sum_pending=Sum('pending')
+        ).order_by()
+        for row in rows:
+            add(_group_key(group_by, row.get('date'), row.get('medication_id')),
+                row['sum_taken'], row['sum_missed'], row['sum_pending'])
+
+    if end >= today:
+        for row in intake_counts(user_id, max(start, today), end):
+            try:
+                day = date.fromisoformat(row['scheduled_date'])
+            except ValueError:
+                continue
+            add(_group_key(group_by, day, row['medication_id']), row['taken'], row['missed'], row['pending'])
+
+    key_name = {'day': 'date', 'week': 'weekStart', 'medication': 'medicationId'}[group_by]
+    items = []
+    totals = {'taken': 0, 'missed': 0, 'pending': 0}
+    for key in sorted(groups):
+        counts = groups[key]
+        for status in totals:
+            totals[status] += counts[status]
+        items.append({key_name: key, **counts, 'rate': _rate(counts)})
+    return {'totals': {**totals, 'rate': _rate(totals)}, 'items': items}
+
+
+def _rate(counts):
+    # доля принятых среди уже решённых (принято + пропущено)
+    decided = counts['taken'] + counts['missed']
+    return round(counts['taken'] / decided, 4) if decided else None
+
+
+def month_calendar(user_id, first, last, today=None, archived=False):
+    """
+    Счётчики приёмов по каждому дню [first, last]: один сгруппированный запрос по (user, scheduled_date, status)
+    (и такой же по архиву, если archived). Будущие дни без приёмов заполняются приёмами, которые дадут
+    действующие расписания, - как pending.
+    """
+    today = today or date.today()
+    days = {}
+    day = first
+    while day <= last:
+        days[day] = {'taken': 0, 'missed': 0, 'pending': 0}
+        day += timedelta(days=1)
+
+    models = (MedicationIntake, ArchivedIntake) if archived else (MedicationIntake,)
+    seen = set()
+    for model in models:
+        rows = model.objects.filter(
+            user_id=user_id, scheduled_date__gte=first.isoformat(), scheduled_date__lte=last.isoformat(),
+        ).values_list('scheduled_date', 'status').annotate(count=Count('pk')).order_by()
+        for scheduled_date, status, count in rows:
+            try:
+                day = date.fromisoformat(scheduled_date)
+            except ValueError:
+                continue
+            seen.add(day)
+            if status in days[day]:
+                days[day][status] += count
+
+    missing = {day for day in days if day >= today and day not in seen}
+    if missing:
+        start = min(missing)
+        schedules = MedicationSchedule.objects.filter(active_between(start, last), user_id=user_id).only(
+            'id', 'medication_id', 'frequency', 'days', 'dates', 'times', 'start_date', 'end_date', 'duration_days'
+        )
+        for occurrence in expand_schedules(schedules, start, last):
+            if occurrence.scheduled_date in missing:
+                days[occurrence.scheduled_date]['pending'] += 1
+    return [{'date': day.isoformat(), **counts} for day, counts in days.items()]
@@ -0,0 +1,110 @@
+import re
+from decimal import Decimal, ROUND_DOWN
+
+from django.db.models import F
+from django.db.models.lookups import GreaterThanOrEqual
+
+from .models import Medication, MedicationIntake
+from .utils import now_ms
+from .versions import bump_version
+
+_NUMBER = re.compile(r'\d+(?:[.,]\d+)?')
+
+# остаток хранится целыми единицами (remaining_quantity) и тысячными долями начатой единицы (remaining_fraction);
+# дозы считаются в тех же тысячных, поэтому половина таблетки списывает ровно половину
+UNIT = 1000
+
+
+def dose_amount(dosage_by_time):
+    # dosage_by_time - строка с фронта ("1", "0.5", "2 таб"); доза в тысячных долях единицы
+    match = _NUMBER.search(dosage_by_time or '')
+    if not match:
+        return 0
+    return int((Decimal(match.group().replace(',', '.')) * UNIT).to_integral_value(ROUND_DOWN))
+
+
+def _total():
+    return F('remaining_quantity') * UNIT + F('remaining_fraction')
+
+
+def _shift_stock(queryset, delta, user_id):
+    # один UPDATE с F()-выражениями: без потерянных обновлений; delta в тысячных
+    total = _total() + delta
+    timestamp = now_ms()
+    updated = queryset.update(
+        remaining_quantity=total / UNIT,
+        remaining_fraction=total % UNIT,
+        updated_at=timestamp,
+        changed_at=timestamp,
+    )
+    if updated:
+        bump_version(user_id, 'medications')
+    return updated
+
+
+def deduct_stock(medication_id, amount, user_id=None):
+    """
+    Списывает amount тысячных единицы, но не больше остатка; у лекарства без учёта запаса ничего не списывает.
+    Возвращает, сколько списано на самом деле: ровно это и вернёт restore_stock. Вызывается внутри транзакции.
+    """
+    if amount <= 0:
+        return 0
+    tracked = Medication.objects.filter(pk=medication_id, track_stock=True)
+    # обычный случай - остатка хватает: один условный UPDATE без чтения
+    if _shift_stock(tracked.filter(GreaterThanOrEqual(_total(), amount)), -amount, user_id):
+        return amount
+    # остатка меньше дозы (или запас не учитывается) - списываем всё, что осталось
+    available = tracked.select_for_update().annotate(total=_total()).values_list('total', flat=True).first()
+    if available:
+        _shift_stock(tracked, -available, user_id)
+    return available or 0
+
+
+def restore_stock(medication_id, amount, user_id=None):
+    # возвращает ранее списанное (независимо от того, учитывается ли запас сейчас)
+    if amount > 0:
+        _shift_stock(Medication.objects.filter(pk=medication_id), amount, user_id)
+
+
+def adjust_stock(medication_id, delta, user_id=None):
+    # правка остатка на delta целых единиц (списание - не больше остатка); возвращает изменение в тысячных
+    if delta < 0:
+        return -deduct_stock(medication_id, -delta * UNIT, user_id)
+    restore_stock(medication_id, delta * UNIT, user_id)
+    return delta * UNIT
+
+
+def change_intake_status(intake, new_status, attempts=3):
+    """
+    Атомарно переводит приём в new_status и корректирует остаток лекарства:
+    переход в taken списывает дозу (сколько списано - запоминается в stock_deducted),
+    выход из taken возвращает ровно списанное. Статус и stock_deducted пишутся одним условным UPDATE
+    по прочитанным значениям, поэтому два устройства не спишут и не вернут одну дозу дважды.
+    Вызывается внутри транзакции.
+    """
+    taken = MedicationIntake.Status.TAKEN
+    for _ in range(attempts):
+        current, deducted = intake.status, intake.stock_deducted
+        if current == new_status:
+            return
+        if new_status == taken:
+            amount = deduct_stock(intake.medication_id, dose_amount(intake.dosage_by_time), intake.user_id)
+        else:
+            amount = 0 if current == taken else deducted
+        claimed = MedicationIntake.objects.filter(pk=intake.pk, status=current, stock_deducted=deducted).update(
+            status=new_status, stock_deducted=amount, changed_at=now_ms()
+        )
+        if claimed:
+            if current == taken:
+                restore_stock(intake.medication_id, deducted, intake.user_id)
+            intake.status, intake.stock_deducted = new_status, amount
+            return
+        # статус успели поменять с другого устройства - возвращаем своё списание, перечитываем и пробуем ещё раз
+        if new_status == taken:
+            restore_stock(intake.medication_id, amount, intake.user_id)
+        row = MedicationIntake.objects.filter(pk=intake.pk).values_list('status', 'stock_deducted').first()
+        if row is None:
+            return
+        intake.status, intake.stock_deducted = row
+        # чужой переход уже учтён в статистике, при сохранении считаем от актуального статуса
+        intake.reset_tracking()
@@ -0,0 +1,10 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def single_shard_by_default(request, settings):
+    # с DATABASE_SHARD_URLS пользователи раскладываются по шардам; тесты шардов просят все базы
+    # (django_db(databases="__all__")), остальные проверяют логику в одной базе default
+    marker = request.node.get_closest_marker("django_db")
+    if marker is None or marker.kwargs.get("databases") != "__all__":
+        settings.SHARDING = {**settings.SHARDING, "SHARDS": ["default"]}
@@ -0,0 +1,125 @@
+import pytest
+import time
+from datetime import date, timedelta
+from io import StringIO
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from rest_framework.test import APIClient
+from api.archive import archive_cutoff, archive_intakes
+from api.models import ArchivedIntake, DailyAdherence, Medication, MedicationIntake, MedicationSchedule, Tombstone, User
+from api.stats import adherence
+from api.versions import get_version
+
+
+@pytest.fixture
+def user(db):
+    return User.objects.create_user(
+        id="testuser123",
+        email="test@example.com",
+        password="testpass123",
+        username="TestUser"
+    )
+
+
+@pytest.fixture
+def auth_client(user):
+    client = APIClient()
+    client.force_authenticate(user=user)
+    return client
+
+
+@pytest.fixture
+def schedule(user):
+    now = int(time.time() * 1000)
+    medication = Medication.objects.create(
+        id="med123", user=user, name="TestMed", form="tablet", dosage_per_unit="10mg", unit="mg",
+        instructions="Take after meal", total_quantity=30, remaining_quantity=20, low_stock_threshold=5,
+        track_stock=False, icon_name="pill", icon_color="blue", created_at=now, updated_at=now,
+    )
+    return MedicationSchedule.objects.create(
+        id="sched123", user=user, medication=medication, frequency="daily", days=[], dates=[],
+        times=[{"time": "09:00", "dosage": "1", "unit": "mg"}], meal_relation="no_relation",
+        start_date=date.today() - timedelta(days=800), created_at=now, updated_at=now,
+    )
+
+
+@pytest.fixture
+def history(schedule):
+    # по приёму в день: 800 дней назад ... сегодня, каждый третий пропущен
+    now = int(time.time() * 1000)
+    today = date.today()
+    MedicationIntake.objects.bulk_create([
+        MedicationIntake(
+            id=f"i{offset:04d}", schedule=schedule, medication=schedule.medication, user=schedule.user,
+            scheduled_time="09:00", scheduled_date=(today - timedelta(days=offset)).isoformat(),
+            status="missed" if offset % 3 == 0 else "taken", created_at=now, updated_at=now,
+            medication_name="TestMed", meal_relation="no_relation", instructions="Take after meal",
+            dosage_by_time="1", unit="mg", icon_name="pill", icon_color="blue",
+        )
+        for offset in range(801)
+    ])
+    return today
+
+
+def test_archive_moves_old_intakes(user, history):
+    before = adherence(user.pk, history - timedelta(days=800), history)["totals"]
+    version = get_version(user.pk, "intakes")
+    cutoff = archive_cutoff(history)
+
+    assert archive_intakes(cutoff, chunk_size=100) == 800 - 365
+    assert MedicationIntake.objects.count() == 366
+    assert ArchivedIntake.objects.count() == 435
+    assert not MedicationIntake.objects.filter(scheduled_date__lt=cutoff.isoformat()).exists()
+    assert ArchivedIntake.objects.get(pk="i0800").status == "taken"
+    # перенос - не удаление: без tombstone, статистика та же, версия коллекции новая
+    assert not Tombstone.objects.exists()
+    assert adherence(user.pk, history - timedelta(days=800), history)["totals"] == before
+    assert DailyAdherence.objects.filter(date__lt=cutoff).count() == 435
+    assert get_version(user.pk, "intakes") > version
+
+    assert archive_intakes(cutoff) == 0
+
+
+def test_intakes_list_reads_archive_for_old_dates(user, auth_client, history):
+    archive_intakes(archive_cutoff(history))
+    old = history - timedelta(days=400)
+
+    response = auth_client.get("/api/intakes/", {"date": old.isoformat()})
+    assert [item["id"] for item in response.json()] == ["i0400"]
+
+    # страницы идут по порядку через границу архива
+    start = history - timedelta(days=370)
+    ids = []
+    url = f"/api/intakes/?from={start.isoformat()}&to={(history - timedelta(days=360)).isoformat()}&limit=4"
+    while url:
+        response = auth_client.get(url)
+        ids += [item["id"] for item in response.json()]
+        url = response.headers.get("Link", "").partition(">")[0].lstrip("<") or None
+    assert ids == [f"i{offset:04d}" for offset in range(370, 359, -1)]
+
+    # без явных старых дат архив не читается
+    assert len(auth_client.get("/api/intakes/", {"limit": 1000}).json()) == 366
+    assert auth_client.get("/api/intakes/", {"from": history.isoformat()}).json()[0]["id"] == "i0000"
+
+
+def test_archive_intakes_command(user, history):
+    out = StringIO()
+    call_command("archive_intakes", "--days", "500", stdout=out)
+    assert "Archived 300 intakes" in out.getvalue()
+    assert ArchivedIntake.objects.count() == 300
+
+    with pytest.raises(CommandError):
+        call_command("archive_intakes", "--days", "30")
+
+
+def test_user_delete_removes_archive(user, history):
+    archive_intakes(archive_cutoff(history))
+    user.delete()
+    assert not ArchivedIntake.objects.exists()
+
+
+def test_calendar_counts_archived_months(auth_client, history):
+    archive_intakes(archive_cutoff(history))
+    month = (history - timedelta(days=500)).replace(day=1)
+    response = auth_client.get("/api/calendar/", {"month": month.strftime("%Y-%m")})
+    assert sum(item["taken"] + item["missed"] for item in response.json()["days"]) == len(response.json()["days"])
@@ -0,0 +1,170 @@
+import pytest
+import time
+from datetime import date, timedelta
+from asgiref.sync import async_to_sync
+from django.test import AsyncClient
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from api.authentication import token_cache
+from api.models import Medication, MedicationSchedule, MedicationIntake, User
+
+
+@pytest.fixture
+def user(db):
+    return User.objects.create_user(
+        id="testuser123",
+        email="test@example.com",
+        password="testpass123",
+        username="TestUser"
+    )
+
+
+@pytest.fixture
+def token(user):
+    token_cache.clear()
+    return Token.objects.create(user=user)
+
+
+@pytest.fixture
+def sync_client(token):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+    return client
+
+
+@pytest.fixture
+def async_get(token):
+    # запрос через AsyncClient: middleware и представление выполняются в async-режиме
+    client = AsyncClient()
+
+    def get(path, data=None, headers=None):
+        headers = {"Authorization": f"Token {token.key}", **(headers or {})}
+        return async_to_sync(client.get)(path, data, headers=headers)
+    return get
+
+
+@pytest.fixture
+def schedule(user):
+    now = int(time.time() * 1000)
+    medication = Medication.objects.create(
+        id="med123", user=user, name="TestMed", form="tablet", dosage_per_unit="10mg", unit="mg",
+        instructions="Take after meal", total_quantity=30, remaining_quantity=20, low_stock_threshold=5,
+        track_stock=True, icon_name="pill", icon_color="blue", created_at=now, updated_at=now
+    )
+    return MedicationSchedule.objects.create(
+        id="sched123", user=user, medication=medication, frequency="daily", days=[1, 2], dates=[],
+        times=[{"time": "09:00", "dosage": "1", "unit": "mg"}], meal_relation="no_relation",
+        start_date=date.today(), duration_days=3, created_at=now, updated_at=now
+    )
+
+
+@pytest.fixture
+def intakes(schedule):
+    # сегодняшние приёмы и один вчерашний, который в ответ попасть не должен
+    days = [date.today()] * 5 + [date.today() - timedelta(days=1)]
+    return [
+        MedicationIntake.objects.create(
+            id=f"async{index}", schedule=schedule, medication=schedule.medication, user=schedule.user,
+            scheduled_time=f"0{index}:30", scheduled_date=str(day),
+            status="taken" if index % 2 else "pending", taken_at=1714825000000 if index % 2 else None,
+            medication_name="Парацетамол \u2028 \"форте\"", meal_relation="before_meal",
+            dosage_per_unit=None, instructions="", dosage_by_time="1.5", unit="мг",
+            icon_name="pill", icon_color="blue", created_at=index, updated_at=index,
+        )
+        for index, day in enumerate(days)
+    ]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("async_name, sync_name, params", [
+    ("async-medication-list", "medication-list", {}),
+    ("async-schedule-list", "schedule-list", {}),
+    ("async-intakes-today", "intake-list", {"date": str(date.today())}),
+])
+def test_async_list_matches_sync(sync_client, async_get, intakes, async_name, sync_name, params):
+    response = async_get(reverse(async_name))
+    assert response.status_code == 200
+    assert response["Content-Type"] == "application/json"
+    # тело байт в байт как у синхронного эндпоинта
+    assert response.content == sync_client.get(reverse(sync_name), params).content
+
+
+@pytest.mark.django_db
+def test_async_intakes_today_filters_and_pagination(async_get, intakes):
+    url = reverse("async-intakes-today")
+    response = async_get(url, {"status": "taken"})
+    assert [item["id"] for item in response.json()] == ["async1", "async3"]
+
+    response = async_get(url, {"limit": 3})
+    assert [item["id"] for item in response.json()] == ["async0", "async1", "async2"]
+    next_link = response["Link"].split(";")[0].strip("<>")
+    response = async_get(next_link)
+    assert [item["id"] for item in response.json()] == ["async3", "async4"]
+    assert "Link" not in response
+
+    response = async_get(url, {"status": "unknown"})
+    assert response.status_code == 400
+    assert "status" in response.json()
+
+
+@pytest.mark.django_db
+def test_async_etag(async_get, schedule):
+    url = reverse("async-medication-list")
+    response = async_get(url)
+    etag = response["ETag"]
+    assert async_get(url, headers={"If-None-Match": etag}).status_code == 304
+
+    schedule.medication.name = "Changed"
+    schedule.medication.save()
+    assert async_get(url, headers={"If-None-Match": etag}).status_code == 200
+
+
+@pytest.mark.django_db
+def test_async_intakes_today_etag_changes_at_midnight(async_get, intakes, monkeypatch):
+    url = reverse("async-intakes-today")
+    response = async_get(url)
+    etag = response["ETag"]
+    assert async_get(url, headers={"If-None-Match": etag}).status_code == 304
+
+    class Tomorrow(date):
+        @classmethod
+        def today(cls):
+            return date.today() + timedelta(days=1)
+
+    monkeypatch.setattr("api.async_views.date", Tomorrow)
+    response = async_get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json() == []
+    assert response["ETag"] != etag
+
+
+@pytest.mark.django_db
+def test_async_authentication(token):
+    client = AsyncClient()
+    url = reverse("async-medication-list")
+
+    response = async_to_sync(client.get)(url)
+    assert response.status_code == 401
+    assert response["WWW-Authenticate"] == "Token"
+    assert response.json() == {"detail": "Authentication credentials were not provided."}
+
+    response = async_to_sync(client.get)(url, headers={"Authorization": "Token wrong"})
+    assert response.status_code == 401
+    assert response.json() == {"detail": "Invalid token."}
+
+    token.user.is_active = False
+    token.user.save()
+    response = async_to_sync(client.get)(url, headers={"Authorization": f"Token {token.key}"})
+    assert response.status_code == 401
+    assert response.json() == {"detail": "User inactive or deleted."}
+
+
+@pytest.mark.django_db
+def test_async_query_count(settings, async_get, intakes):
+    # QueryCountMiddleware в async-режиме считает запросы async ORM: токен, версия коллекции, строки
+    settings.QUERY_COUNT_HEADERS = True
+    response = async_get(reverse("async-intakes-today"))
+    assert response["X-Query-Count"] == "3"
+    # токен уже в token_cache
+    assert async_get(reverse("async-intakes-today"))["X-Query-Count"] == "2"
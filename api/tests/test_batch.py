@@ -0,0 +1,137 @@
+import pytest
+import time
+from datetime import date
+from rest_framework.test import APIClient
+from rest_framework import status
+from django.urls import reverse
+from api.models import Medication, MedicationSchedule, MedicationIntake, User
+
+
+@pytest.fixture
+def user(db):
+    return User.objects.create_user(
+        id="testuser123",
+        email="test@example.com",
+        password="testpass123",
+        username="TestUser"
+    )
+
+
+@pytest.fixture
+def auth_client(user):
+    client = APIClient()
+    client.force_authenticate(user=user)
+    return client
+
+
+def medication_data(medication_id):
+    now = int(time.time() * 1000)
+    return {
+        "id": medication_id, "name": "TestMed", "form": "tablet", "dosagePerUnit": "10mg", "unit": "mg",
+        "instructions": "Take after meal", "totalQuantity": 30, "remainingQuantity": 20,
+        "lowStockThreshold": 5, "trackStock": True, "iconName": "pill", "iconColor": "blue",
+        "createdAt": now, "updatedAt": now,
+    }
+
+
+def schedule_data(schedule_id, medication_id):
+    now = int(time.time() * 1000)
+    return {
+        "id": schedule_id, "medicationId": medication_id, "frequency": "daily", "days": [], "dates": [],
+        "times": [{"time": "09:00", "dosage": "1", "unit": "mg"}], "mealRelation": "no_relation",
+        "startDate": str(date.today()), "createdAt": now, "updatedAt": now,
+    }
+
+
+def intake_data(intake_id, schedule_id, medication_id):
+    now = int(time.time() * 1000)
+    return {
+        "id": intake_id, "scheduleId": schedule_id, "medicationId": medication_id, "scheduledTime": "09:00",
+        "scheduledDate": str(date.today()), "status": "pending", "medicationName": "TestMed",
+        "mealRelation": "no_relation", "dosageByTime": "1", "unit": "mg", "instructions": "Take after meal",
+        "iconName": "pill", "iconColor": "blue", "createdAt": now, "updatedAt": now,
+    }
+
+
+@pytest.mark.django_db
+def test_batch_applies_operations_in_order(auth_client):
+    operations = [
+        {"op": "create", "resource": "medications", "data": medication_data("med1")},
+        {"op": "create", "resource": "schedules", "data": schedule_data("sched1", "med1")},
+        {"op": "create", "resource": "intakes", "data": intake_data("intake1", "sched1", "med1")},
+        {"op": "update", "resource": "intakes", "id": "intake1", "data": {"status": "taken"}},
+        {"op": "update", "resource": "medications", "id": "med1", "data": {"name": "Renamed"}},
+    ]
+    response = auth_client.post(reverse("batch"), {"operations": operations}, format="json")
+
+    assert response.status_code == status.HTTP_200_OK, response.data
+    assert response.data["committed"] is True
+    assert [result["status"] for result in response.data["results"]] == [201, 201, 201, 200, 200]
+    assert MedicationIntake.objects.get(id="intake1").status == "taken"
+    assert Medication.objects.get(id="med1").name == "Renamed"
+
+
+@pytest.mark.django_db
+def test_batch_rolls_back_on_error(auth_client):
+    operations = [
+        {"op": "create", "resource": "medications", "data": medication_data("med1")},
+        {"op": "create", "resource": "schedules", "data": schedule_data("sched1", "missing")},
+    ]
+    response = auth_client.post(reverse("batch"), {"operations": operations}, format="json")
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.data["committed"] is False
+    assert response.data["results"][1]["status"] == 400
+    assert not Medication.objects.exists()
+
+
+@pytest.mark.django_db
+def test_batch_prefetches_referenced_objects(auth_client, user, django_assert_max_num_queries):
+    auth_client.post(reverse("batch"), {"operations": [
+        {"op": "create", "resource": "medications", "data": medication_data("med1")},
+        {"op": "create", "resource": "schedules", "data": schedule_data("sched1", "med1")},
+    ]}, format="json")
+    operations = [
+        {"op": "create", "resource": "intakes", "data": intake_data(f"intake{i}", "sched1", "med1")}
+        for i in range(10)
+    ]
+    # транзакция и предзагрузка расписаний и медикаментов, дальше на приём только проверка уникальности id,
+    # INSERT и счётчик версии коллекции (плюс 3 запроса на создание строки счётчика при первой записи)
+    with django_assert_max_num_queries(4 + 3 + 3 * len(operations)):
+        response = auth_client.post(reverse("batch"), {"operations": operations}, format="json")
+    assert response.status_code == status.HTTP_200_OK, response.data
+    assert MedicationIntake.objects.filter(user=user).count() == 10
+
+
+@pytest.mark.django_db
+def test_batch_delete_cascades_within_batch(auth_client):
+    auth_client.post(reverse("batch"), {"operations": [
+        {"op": "create", "resource": "medications", "data": medication_data("med1")},
+        {"op": "create", "resource": "schedules", "data": schedule_data("sched1", "med1")},
+    ]}, format="json")
+    response = auth_client.post(reverse("batch"), {"operations": [
+        {"op": "delete", "resource": "medications", "id": "med1"},
+        {"op": "update", "resource": "schedules", "id": "sched1", "data": {"days": [1]}},
+    ]}, format="json")
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.data["results"][1]["status"] == 404
+    assert MedicationSchedule.objects.filter(id="sched1").exists()
+
+
+@pytest.mark.django_db
+def test_batch_validates_operations(auth_client):
+    response = auth_client.post(reverse("batch"), {"operations": [{"op": "upsert", "resource": "intakes"}]},
+                                format="json")
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert "operations" in response.data
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("data", ["x", [1], 5])
+def test_batch_rejects_non_object_data(auth_client, data):
+    for op in ("create", "update", "delete"):
+        operation = {"op": op, "resource": "medications", "id": "med1", "data": data}
+        response = auth_client.post(reverse("batch"), {"operations": [operation]}, format="json")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.json()["operations"] == {"0": "data must be an object."}
@@ -0,0 +1,60 @@
+import pytest
+from django.db import OperationalError, connection, transaction
+from api.db import retry_on_locked
+
+
+@pytest.fixture
+def no_delay(settings):
+    settings.DB_RETRY_ON_LOCKED = {"ATTEMPTS": 3, "DELAY": 0}
+
+
+def flaky(errors):
+    # падает переданными ошибками по очереди, потом возвращает число вызовов
+    calls = []
+
+    def func():
+        calls.append(connection.in_atomic_block)
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return len(calls)
+    return func, calls
+
+
+@pytest.mark.django_db(transaction=True)
+def test_retry_on_locked(no_delay):
+    func, calls = flaky([OperationalError("database is locked")] * 2)
+    assert retry_on_locked(func)() == 3
+    # каждая попытка - в своей транзакции
+    assert calls == [True, True, True]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_retry_on_locked_gives_up(no_delay):
+    func, calls = flaky([OperationalError("database is locked")] * 3)
+    with pytest.raises(OperationalError):
+        retry_on_locked(func)()
+    assert len(calls) == 3
+
+    func, calls = flaky([OperationalError("no such table: api_medication")])
+    with pytest.raises(OperationalError):
+        retry_on_locked(attempts=5)(func)()
+    assert len(calls) == 1
+
+
+@pytest.mark.django_db(transaction=True)
+def test_retry_on_locked_inside_atomic(no_delay):
+    # внутри чужой транзакции повторять нельзя - ошибка пробрасывается сразу
+    func, calls = flaky([OperationalError("database is locked")])
+    with pytest.raises(OperationalError), transaction.atomic():
+        retry_on_locked(func)()
+    assert len(calls) == 1
+
+
+@pytest.mark.django_db
+def test_sqlite_profile():
+    if connection.vendor != "sqlite":
+        pytest.skip("SQLite only")
+    assert connection.transaction_mode == "IMMEDIATE"
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA synchronous")
+        assert cursor.fetchone()[0] == 1  # NORMAL
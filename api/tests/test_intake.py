@@ -1,11 +1,18 @@
 import pytest
 import time
 from datetime import date
+from io import StringIO
+from django.core.management import call_command
 from rest_framework.test import APIClient
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from api.models import Medication, MedicationSchedule, MedicationIntake, User
-from api.serializers import MedicationIntakeSerializer
+from api.materialize import horizon, intake_id, materialize_intakes
+from api.serializers import MedicationIntakeSerializer, MedicationSerializer
+from api.stock import dose_amount
 
 
 @pytest.fixture
@@ -215,4 +222,224 @@ def test_get_intakes_for_schedule(auth_client, schedule, intake):
     response = auth_client.get(url, {"scheduleId": schedule.id}, format="json")
     assert response.status_code == status.HTTP_200_OK
     assert len(response.data) == 1
-    assert response.data[0]["id"] == intake.id
\ No newline at end of file
+    assert response.data[0]["id"] == intake.id
+
+@pytest.mark.django_db
+def test_materialize_command_is_idempotent(schedule, intake):
+    call_command("materialize_intakes", "--days", "14", stdout=StringIO())
+    # у фикстуры duration_days=3, приём на сегодня уже создан клиентом
+    intakes = MedicationIntake.objects.filter(schedule=schedule).order_by("scheduled_date")
+    assert intakes.count() == 3
+    generated = intakes.exclude(id=intake.id)
+    assert all(i.id == intake_id(schedule.id, i.scheduled_date, "09:00") for i in generated)
+    assert all(i.status == "pending" and i.medication_name == "TestMed" for i in generated)
+
+    call_command("materialize_intakes", "--days", "14", stdout=StringIO())
+    assert MedicationIntake.objects.filter(schedule=schedule).count() == 3
+
+
+@pytest.mark.django_db
+def test_materialize_action(auth_client, schedule):
+    url = reverse("intake-materialize")
+    response = auth_client.post(url, {"days": 2}, format="json")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data["created"] == 2
+    assert auth_client.post(url, {"days": 2}, format="json").data["created"] == 0
+
+    response = auth_client.post(url, {"days": 0}, format="json")
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def copy_intake(intake, intake_id, **kwargs):
+    intake.pk = intake_id
+    for field, value in kwargs.items():
+        setattr(intake, field, value)
+    intake.save(force_insert=True)
+    return intake
+
+
+@pytest.mark.django_db
+def test_list_intakes_filters(auth_client, intake):
+    copy_intake(intake, "yesterday", scheduled_date="2025-01-01", status="missed")
+    copy_intake(intake, "week", scheduled_date="2025-01-05", status="taken")
+    copy_intake(intake, "pending", scheduled_date="2025-01-07", status="pending")
+    url = reverse("intake-list")
+
+    def ids(params):
+        response = auth_client.get(url, params)
+        assert response.status_code == status.HTTP_200_OK
+        return {item["id"] for item in response.data}
+
+    assert ids({"date": "2025-01-05"}) == {"week"}
+    assert ids({"from": "2025-01-02", "to": "2025-01-07"}) == {"week", "pending"}
+    assert ids({"status": "pending", "to": "2025-12-31"}) == {"pending"}
+    assert ids({"medicationId": "other"}) == set()
+    assert auth_client.get(url, {"status": "unknown"}).status_code == status.HTTP_400_BAD_REQUEST
+    assert auth_client.get(url, {"date": "05.01.2025"}).status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+def test_list_intakes_keyset_pagination(auth_client, intake):
+    for day in range(1, 6):
+        copy_intake(intake, f"day{day}", scheduled_date=f"2025-01-0{day}")
+    url = reverse("intake-list")
+
+    response = auth_client.get(url, {"to": "2025-12-31", "limit": 2})
+    assert [item["id"] for item in response.data] == ["day1", "day2"]
+    next_link = response["Link"].split(";")[0].strip("<>")
+
+    # вставка "до" курсора не сдвигает следующую страницу
+    copy_intake(intake, "day0", scheduled_date="2024-12-31")
+    response = auth_client.get(next_link)
+    assert [item["id"] for item in response.data] == ["day3", "day4"]
+
+    response = auth_client.get(response["Link"].split(";")[0].strip("<>"))
+    assert [item["id"] for item in response.data] == ["day5"]
+    assert not response.has_header("Link")
+
+
+@pytest.mark.django_db
+def test_list_intakes_invalid_cursor(auth_client, intake):
+    response = auth_client.get(reverse("intake-list"), {"cursor": "garbage"})
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+def test_taking_intake_adjusts_stock(auth_client, intake):
+    url = reverse("intake-detail", args=[intake.id])
+    intake.dosage_by_time = "2"
+    intake.save()
+
+    auth_client.patch(url, {"status": "taken"}, format="json")
+    assert Medication.objects.get(id=intake.medication_id).remaining_quantity == 18
+    # повторная отметка (например, со второго устройства) не списывает ещё раз
+    auth_client.patch(url, {"status": "taken"}, format="json")
+    assert Medication.objects.get(id=intake.medication_id).remaining_quantity == 18
+
+    auth_client.patch(url, {"status": "pending"}, format="json")
+    assert Medication.objects.get(id=intake.medication_id).remaining_quantity == 20
+
+
+@pytest.mark.django_db
+def test_stock_is_clamped_and_respects_track_stock(auth_client, intake, medication):
+    url = reverse("intake-detail", args=[intake.id])
+    Medication.objects.filter(id=medication.id).update(remaining_quantity=0)
+    auth_client.patch(url, {"status": "taken"}, format="json")
+    assert Medication.objects.get(id=medication.id).remaining_quantity == 0
+
+    # при нулевом остатке ничего не списали - отмена ничего и не возвращает
+    auth_client.patch(url, {"status": "missed"}, format="json")
+    assert Medication.objects.get(id=medication.id).remaining_quantity == 0
+
+    Medication.objects.filter(id=medication.id).update(track_stock=False, remaining_quantity=5)
+    auth_client.patch(url, {"status": "taken"}, format="json")
+    assert Medication.objects.get(id=medication.id).remaining_quantity == 5
+    # учёт запаса включили между переходами - возвращается только реально списанное
+    Medication.objects.filter(id=medication.id).update(track_stock=True)
+    auth_client.patch(url, {"status": "pending"}, format="json")
+    assert Medication.objects.get(id=medication.id).remaining_quantity == 5
+
+
+@pytest.mark.django_db
+def test_stock_deduction_is_restored_exactly(auth_client, intake, medication):
+    url = reverse("intake-detail", args=[intake.id])
+    Medication.objects.filter(id=medication.id).update(remaining_quantity=1)
+    MedicationIntake.objects.filter(id=intake.id).update(dosage_by_time="2")
+    auth_client.patch(url, {"status": "taken"}, format="json")
+    assert Medication.objects.get(id=medication.id).remaining_quantity == 0
+    assert MedicationIntake.objects.get(id=intake.id).stock_deducted == 1000
+
+    # учёт запаса выключили между переходами - списанное всё равно возвращается
+    Medication.objects.filter(id=medication.id).update(track_stock=False)
+    auth_client.patch(url, {"status": "missed"}, format="json")
+    assert Medication.objects.get(id=medication.id).remaining_quantity == 1
+    assert MedicationIntake.objects.get(id=intake.id).stock_deducted == 0
+
+
+@pytest.mark.django_db
+def test_status_change_writes_stock_without_read_modify_write(auth_client, intake, medication):
+    url = reverse("intake-detail", args=[intake.id])
+    with CaptureQueriesContext(connection) as queries:
+        assert auth_client.patch(url, {"status": "taken"}, format="json").status_code == status.HTTP_200_OK
+    sql = [query["sql"] for query in queries.captured_queries]
+    # остаток - один условный UPDATE без предварительного чтения, статус и списанное - один UPDATE приёма
+    assert not [query for query in sql if query.startswith("SELECT") and 'FROM "api_medication"' in query]
+    assert len([query for query in sql if query.startswith('UPDATE "api_medication"')]) == 1
+    intake_updates = [query for query in sql if query.startswith('UPDATE "api_medicationintake"')]
+    assert len([query for query in intake_updates if '"stock_deducted"' in query]) == 1
+    # присланные поля сохраняются без перезаписи всей строки
+    assert not [query for query in intake_updates if '"medication_name"' in query]
+
+    # правка лекарства с устаревшим объектом не затирает списанный остаток
+    stale = Medication.objects.get(id=medication.id)
+    intake_two = MedicationIntake.objects.get(id=intake.id)
+    intake_two.pk, intake_two.status, intake_two.stock_deducted = "second", "pending", 0
+    intake_two.save()
+    auth_client.patch(reverse("intake-detail", args=["second"]), {"status": "taken"}, format="json")
+    serializer = MedicationSerializer(stale, data={"name": "Ибупрофен"}, partial=True)
+    assert serializer.is_valid(), serializer.errors
+    serializer.save()
+    medication = Medication.objects.get(id=medication.id)
+    assert (medication.name, medication.remaining_quantity) == ("Ибупрофен", 18)
+
+
+@pytest.mark.django_db
+def test_fractional_doses_are_not_rounded_up(auth_client, intake, medication):
+    url = reverse("intake-detail", args=[intake.id])
+    MedicationIntake.objects.filter(id=intake.id).update(dosage_by_time="0.5")
+    auth_client.patch(url, {"status": "taken"}, format="json")
+    # половина таблетки: целых осталось 19, половина начатой учитывается отдельно
+    assert Medication.objects.get(id=medication.id).remaining_quantity == 19
+
+    copy = MedicationIntake.objects.get(id=intake.id)
+    copy.pk, copy.status, copy.stock_deducted = "second", "pending", 0
+    copy.save()
+    auth_client.patch(reverse("intake-detail", args=["second"]), {"status": "taken"}, format="json")
+    assert Medication.objects.get(id=medication.id).remaining_quantity == 19
+
+    auth_client.patch(url, {"status": "pending"}, format="json")
+    auth_client.patch(reverse("intake-detail", args=["second"]), {"status": "pending"}, format="json")
+    medication = Medication.objects.get(id=medication.id)
+    assert (medication.remaining_quantity, medication.remaining_fraction) == (20, 0)
+
+
+def test_dose_amount_parsing():
+    assert dose_amount("1") == 1000
+    assert dose_amount("2 таб") == 2000
+    assert dose_amount("1,5") == 1500
+    assert dose_amount("0.25") == 250
+    assert dose_amount("") == 0
+
+
+@pytest.mark.django_db
+def test_fast_list_matches_serializer(auth_client, schedule):
+    for index in range(5):
+        MedicationIntake.objects.create(
+            id=f"fast{index}", schedule=schedule, medication=schedule.medication, user=schedule.user,
+            scheduled_time=f"0{index}:30", scheduled_date=str(date.today()),
+            status="taken" if index % 2 else "pending", taken_at=1714825000000 if index % 2 else None,
+            medication_name="Парацетамол \u2028 \"форте\"", meal_relation="before_meal",
+            dosage_per_unit=None, instructions="", dosage_by_time="1.5", unit="мг",
+            icon_name="pill", icon_color="blue", created_at=index, updated_at=index,
+        )
+    response = auth_client.get(reverse("intake-list"), {"limit": 3})
+    assert "Link" in response
+    # вывод через values_list и RowBuilder байт в байт совпадает с сериализатором
+    expected = MedicationIntakeSerializer(
+        MedicationIntake.objects.order_by("scheduled_date", "scheduled_time", "id")[:3], many=True
+    ).data
+    assert response.content == JSONRenderer().render(expected)
+
+
+@pytest.mark.django_db
+def test_materialize_counts_only_inserted_rows(schedule):
+    # параллельный запуск уже вставил приём с тем же детерминированным id - он не считается созданным
+    today = date.today()
+    MedicationIntake.objects.create(
+        id=intake_id(schedule.id, today.isoformat(), "09:00"), schedule=schedule, medication=schedule.medication,
+        user=schedule.user, scheduled_time="10:00", scheduled_date=today.isoformat(), status="pending",
+        medication_name="TestMed", meal_relation="no_relation", instructions="-", dosage_by_time="1",
+        unit="mg", icon_name="pill", icon_color="blue", created_at=0, updated_at=0,
+    )
+    assert materialize_intakes(*horizon(today, 3), MedicationSchedule.objects.all()) == 2
+    assert MedicationIntake.objects.filter(schedule=schedule).count() == 3
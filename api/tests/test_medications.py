@@ -1,8 +1,18 @@
 import pytest
+from datetime import date, timedelta
 from rest_framework.test import APIClient
+from django.core.cache import cache
 from django.urls import reverse
-from api.models import User, Medication
+from api.fanout import MEDICATION_FIELDS, SCHEDULE_FIELDS, fan_out
+from api.low_stock import check_low_stock
+from api.pagination import encode_cursor
+from api.response_cache import ResponseCache
+from api.models import User, Medication, MedicationSchedule, MedicationIntake, NotificationSettings
+from api.sinks import MemorySink
+from api.stock import adjust_stock
 import re
+import threading
+import time
 
 
 @pytest.fixture
@@ -136,3 +146,208 @@ def test_user_cannot_access_other_medication(client, other_user, medication_data
     response = client.get(url)
 
     assert response.status_code == 404  # Нет доступа = будто не существует
+
+
+@pytest.mark.django_db
+def test_list_medications_paginated_by_updated_at(client, user, medication_data):
+    for index in range(3):
+        data = convert_camel_to_snake(medication_data)
+        data.update(id=f"med{index}", updated_at=1714825000000 - index)
+        Medication.objects.create(**data, user=user)
+    url = reverse("medication-list")
+
+    response = client.get(url, {"limit": 2})
+    assert [item["id"] for item in response.data] == ["med2", "med1"]
+    assert "cursor=" in response["Link"]
+
+    response = client.get(response["Link"].split(";")[0].strip("<>"))
+    assert [item["id"] for item in response.data] == ["med0"]
+    assert not response.has_header("Link")
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("values", [["abc", "med1"], [{"a": 1}, "med1"], [1714825000000, ["med1"]], [True, "med1"]])
+def test_list_medications_rejects_malformed_cursor(client, values):
+    # курсор правильной длины, но с чужими типами значений - 404, а не ошибка сервера
+    response = client.get(reverse("medication-list"), {"cursor": encode_cursor(values)})
+    assert response.status_code == 404
+    assert response.data["detail"] == "Invalid cursor"
+
+
+def make_intake(medication, intake_id, scheduled_date, intake_status="pending"):
+    schedule, _ = MedicationSchedule.objects.get_or_create(
+        id="sched1",
+        defaults=dict(user=medication.user, medication=medication, frequency="daily",
+                      times=[{"time": "09:00", "dosage": "1", "unit": "mg"}], meal_relation="no_relation",
+                      start_date=date.today(), created_at=0, updated_at=0),
+    )
+    return MedicationIntake.objects.create(
+        id=intake_id, schedule=schedule, medication=medication, user=medication.user,
+        scheduled_time="09:00", scheduled_date=scheduled_date, status=intake_status,
+        medication_name=medication.name, meal_relation="no_relation", dosage_per_unit=medication.dosage_per_unit,
+        instructions=medication.instructions, dosage_by_time="1", unit=medication.unit,
+        icon_name=medication.icon_name, icon_color=medication.icon_color, created_at=0, updated_at=0,
+    )
+
+
+@pytest.mark.django_db
+def test_medication_edit_fans_out_to_pending_intakes(client, user, medication_data):
+    med = Medication.objects.create(**convert_camel_to_snake(medication_data), user=user)
+    today = date.today()
+    make_intake(med, "future", str(today + timedelta(days=1)))
+    make_intake(med, "taken", str(today), intake_status="taken")
+    make_intake(med, "past", str(today - timedelta(days=1)))
+
+    response = client.patch(reverse("medication-detail", kwargs={"pk": med.id}),
+                            {"name": "Но-шпа", "iconColor": "red"}, format="json")
+    assert response.status_code == 200
+
+    future = MedicationIntake.objects.get(id="future")
+    assert (future.medication_name, future.icon_color) == ("Но-шпа", "red")
+    assert future.updated_at > 0
+    # история не переписывается
+    assert MedicationIntake.objects.get(id="taken").medication_name == "Парацетамол"
+    assert MedicationIntake.objects.get(id="past").medication_name == "Парацетамол"
+
+
+@pytest.mark.django_db
+def test_fan_out_in_chunks(user, medication_data):
+    med = Medication.objects.create(**convert_camel_to_snake(medication_data), user=user)
+    for index in range(5):
+        make_intake(med, f"intake{index}", str(date.today()))
+    assert fan_out({"medication_id": med.id}, {"unit": "г"}, chunk_size=2) == 5
+    assert set(MedicationIntake.objects.values_list("unit", flat=True)) == {"г"}
+
+
+def test_fan_out_targets_fit_source_values():
+    # продублированное поле приёма вмещает любое значение исходного поля (в PostgreSQL иначе ошибка длины)
+    for model, fields in ((Medication, MEDICATION_FIELDS), (MedicationSchedule, SCHEDULE_FIELDS)):
+        for source, target in fields.items():
+            source_length = model._meta.get_field(source).max_length
+            target_length = MedicationIntake._meta.get_field(target).max_length
+            assert target_length is None or (source_length is not None and source_length <= target_length), target
+
+
+@pytest.mark.django_db
+def test_fan_out_deferred_to_background(user, medication_data, settings, monkeypatch,
+                                        django_capture_on_commit_callbacks):
+    settings.INTAKE_FANOUT_ASYNC = True
+    submitted = []
+    monkeypatch.setattr("api.fanout.get_executor", lambda: type("Executor", (), {
+        "submit": staticmethod(lambda func, *args: submitted.append(args))
+    }))
+    med = Medication.objects.create(**convert_camel_to_snake(medication_data), user=user)
+    make_intake(med, "future", str(date.today()))
+
+    med = Medication.objects.get(id=med.id)
+    med.name = "Но-шпа"
+    with django_capture_on_commit_callbacks(execute=True):
+        med.save()
+
+    assert submitted == [({"user_id": user.id, "medication_id": med.id}, {"medication_name": "Но-шпа"})]
+    assert MedicationIntake.objects.get(id="future").medication_name == "Парацетамол"
+
+
+@pytest.mark.django_db
+def test_low_stock_alerts_are_batched_and_deduplicated(user, other_user, medication_data):
+    for index, remaining in enumerate([2, 5, 10]):
+        data = convert_camel_to_snake(medication_data)
+        data.update(id=f"med{index}", remaining_quantity=remaining)
+        Medication.objects.create(**data, user=user)
+    data = convert_camel_to_snake(medication_data)
+    data.update(id="other", remaining_quantity=0)
+    Medication.objects.create(**data, user=other_user)
+    NotificationSettings.objects.create(user=other_user, low_stock_reminders_enabled=False)
+
+    sink = MemorySink()
+    assert check_low_stock(sink, batch_size=1) == 2
+    assert sorted(n["medicationId"] for n in sink.notifications) == ["med0", "med1"]
+    assert check_low_stock(sink) == 0
+
+    # пополнили запас и снова израсходовали - уведомление приходит ещё раз
+    Medication.objects.filter(id="med0").update(remaining_quantity=20)
+    assert check_low_stock(sink) == 0
+    Medication.objects.filter(id="med0").update(remaining_quantity=1)
+    assert check_low_stock(sink) == 1
+
+
+@pytest.mark.django_db
+def test_list_and_detail_etag(client, user, medication_data, django_assert_max_num_queries):
+    url = reverse("medication-list")
+    response = client.get(url)
+    etag = response["ETag"]
+
+    # совпадение - 304 без выборки строк: остаётся только запрос версии коллекции
+    with django_assert_max_num_queries(1):
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 304
+    assert response["ETag"] == etag
+
+    client.post(url, medication_data, format="json")
+    response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert response["ETag"] != etag
+    assert len(response.data) == 1
+
+    detail = reverse("medication-detail", kwargs={"pk": "med1"})
+    detail_etag = client.get(detail)["ETag"]
+    assert client.get(detail, HTTP_IF_NONE_MATCH=detail_etag).status_code == 304
+    # массовое обновление остатка в обход сигналов тоже меняет версию
+    adjust_stock("med1", -1, user.id)
+    assert client.get(detail, HTTP_IF_NONE_MATCH=detail_etag).status_code == 200
+
+
+@pytest.mark.django_db
+def test_response_cache(client, user, medication_data, settings, django_assert_num_queries):
+    settings.RESPONSE_CACHE = {**settings.RESPONSE_CACHE, "ENABLED": True}
+    # версии коллекций начинаются заново в каждом тесте - убираем ключи прошлых тестов
+    cache.clear()
+    url = reverse("medication-list")
+    client.post(url, medication_data, format="json")
+    first = client.get(url)
+    assert len(first.data) == 1
+
+    # повторный запрос берётся из кэша: только версия коллекции
+    with django_assert_num_queries(1):
+        response = client.get(url)
+    assert response.json() == first.json()
+
+    # запись через API (сигнал) сбрасывает ключ
+    client.patch(reverse("medication-detail", kwargs={"pk": "med1"}), {"name": "Ибупрофен"}, format="json")
+    assert client.get(url).data[0]["name"] == "Ибупрофен"
+
+    # и массовое обновление в обход сигналов тоже
+    adjust_stock("med1", -5, user.id)
+    assert client.get(url).data[0]["remainingQuantity"] == 15
+
+    # кэш у каждого пользователя свой
+    other = APIClient()
+    other.force_authenticate(User.objects.create_user(id="user2", email="u2@example.com", password="p", username="U2"))
+    assert other.get(url).data == []
+
+    # ошибки не кэшируются
+    detail = reverse("medication-detail", kwargs={"pk": "missing"})
+    assert client.get(detail).status_code == 404
+    assert client.get(detail).status_code == 404
+
+
+def test_response_cache_single_flight():
+    response_cache = ResponseCache(enabled=True, ttl=60, lock_timeout=5)
+    calls = []
+
+    def build():
+        calls.append(1)
+        time.sleep(0.1)
+        return ["data"], True
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(response_cache.get_or_build("single-flight-key", build)))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [["data"]] * 8
+    assert len(calls) == 1
@@ -0,0 +1,71 @@
+import pytest
+import time
+from datetime import date
+from django.conf import settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from api.models import Medication, MedicationSchedule, MedicationIntake, NotificationSettings, User
+from api.querycount import QueryCounter
+
+
+@pytest.fixture
+def user(db):
+    return User.objects.create_user(id="budget1", email="budget@example.com", password="pass", username="Budget")
+
+
+@pytest.fixture
+def client(user):
+    client = APIClient()
+    client.force_authenticate(user=user)
+    return client
+
+
+def add_rows(user, start, count):
+    timestamp = int(time.time() * 1000)
+    common = {"user": user, "created_at": timestamp, "updated_at": timestamp}
+    for index in range(start, start + count):
+        medication = Medication.objects.create(
+            id=f"med{index}", name=f"Med {index}", form="tablet", dosage_per_unit="10mg", unit="mg",
+            instructions="-", total_quantity=30, remaining_quantity=30, low_stock_threshold=5,
+            track_stock=True, icon_name="pill", icon_color="blue", **common,
+        )
+        schedule = MedicationSchedule.objects.create(
+            id=f"sched{index}", medication=medication, frequency="daily", days=[], dates=[],
+            times=[{"time": "09:00", "dosage": "1", "unit": "mg"}], meal_relation="no_relation",
+            start_date=date.today(), **common,
+        )
+        MedicationIntake.objects.create(
+            id=f"intake{index}", schedule=schedule, medication=medication, scheduled_time="09:00",
+            scheduled_date=str(date.today()), status="pending", medication_name=medication.name,
+            meal_relation="no_relation", dosage_per_unit="10mg", instructions="-", dosage_by_time="1",
+            unit="mg", icon_name="pill", icon_color="blue", **common,
+        )
+
+
+def count_queries(client, url):
+    with QueryCounter() as counter:
+        response = client.get(url)
+    assert response.status_code == 200
+    return counter.count
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("endpoint", sorted(settings.QUERY_BUDGETS))
+def test_list_query_budget(client, user, endpoint):
+    # число запросов не зависит от числа строк и укладывается в бюджет из settings.QUERY_BUDGETS
+    NotificationSettings.objects.create(user=user)
+    url = reverse(endpoint)
+    add_rows(user, 0, 1)
+    few = count_queries(client, url)
+    add_rows(user, 1, 25)
+    many = count_queries(client, url)
+    assert few == many
+    assert many <= settings.QUERY_BUDGETS[endpoint]
+
+
+@pytest.mark.django_db
+def test_query_count_headers(client, settings):
+    settings.QUERY_COUNT_HEADERS = True
+    response = client.get(reverse("medication-list"))
+    assert int(response["X-Query-Count"]) >= 1
+    assert float(response["X-SQL-Time"]) >= 0
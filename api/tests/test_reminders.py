@@ -0,0 +1,161 @@
+import json
+import pytest
+from datetime import date, datetime, timedelta
+from io import StringIO
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework.test import APIClient
+from api.models import Medication, MedicationSchedule, MedicationIntake, NotificationSettings, User
+from api.reminders import ReminderScheduler
+from api.sinks import MemorySink
+
+
+@pytest.fixture
+def user(db):
+    return User.objects.create_user(
+        id="testuser123",
+        email="test@example.com",
+        password="testpass123",
+        username="TestUser"
+    )
+
+
+@pytest.fixture
+def schedule(user):
+    medication = Medication.objects.create(
+        id="med123", user=user, name="TestMed", form="tablet", unit="mg", instructions="",
+        icon_name="pill", icon_color="blue", created_at=0, updated_at=0
+    )
+    return MedicationSchedule.objects.create(
+        id="sched123", user=user, medication=medication, frequency="daily",
+        times=[{"time": "09:00", "dosage": "1", "unit": "mg"}], meal_relation="no_relation",
+        start_date=date(2025, 1, 1), created_at=0, updated_at=0
+    )
+
+
+def make_intake(schedule, intake_id, when, user=None, intake_status="pending"):
+    return MedicationIntake.objects.create(
+        id=intake_id, schedule=schedule, medication=schedule.medication, user=user or schedule.user,
+        scheduled_date=when.date().isoformat(), scheduled_time=when.strftime("%H:%M"), status=intake_status,
+        medication_name="TestMed", meal_relation="no_relation", instructions="", dosage_by_time="1", unit="mg",
+        icon_name="pill", icon_color="blue", created_at=0, updated_at=0
+    )
+
+
+class Clock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.mark.django_db
+def test_reminders_fire_lead_minutes_before(schedule):
+    NotificationSettings.objects.create(user=schedule.user, minutes_before_scheduled_time=10)
+    start = datetime(2025, 1, 1, 8, 0)
+    make_intake(schedule, "at0915", start + timedelta(minutes=75))
+    make_intake(schedule, "at0830", start + timedelta(minutes=30))
+    make_intake(schedule, "taken", start + timedelta(minutes=30), intake_status="taken")
+
+    sink, clock = MemorySink(), Clock(start)
+    scheduler = ReminderScheduler(sink, lookahead=timedelta(minutes=5), clock=clock)
+    assert scheduler.run_once() == 0
+
+    clock.now = start + timedelta(minutes=20)
+    assert scheduler.run_once() == 1
+    assert sink.notifications[0]["intakeId"] == "at0830"
+
+    # приём отметили до напоминания - напоминание не уходит
+    MedicationIntake.objects.filter(id="at0915").update(status="taken")
+    clock.now = start + timedelta(minutes=65)
+    assert scheduler.run_once() == 0
+    assert not scheduler.heap
+
+
+@pytest.mark.django_db
+def test_reminders_pick_up_late_intakes_and_lead_changes(schedule):
+    settings = NotificationSettings.objects.create(user=schedule.user, minutes_before_scheduled_time=10)
+    start = datetime(2025, 1, 1, 8, 0)
+    make_intake(schedule, "first", start + timedelta(minutes=12))
+
+    sink, clock = MemorySink(), Clock(start)
+    scheduler = ReminderScheduler(sink, lookahead=timedelta(minutes=5), clock=clock)
+    assert scheduler.run_once() == 0
+
+    # приём создан в уже просмотренном окне, упреждение увеличили
+    make_intake(schedule, "late", start + timedelta(minutes=14))
+    NotificationSettings.objects.filter(pk=settings.pk).update(minutes_before_scheduled_time=12)
+    clock.now = start + timedelta(minutes=1)
+    assert scheduler.run_once() == 1  # 08:12 за 12 минут - уже пора
+    clock.now = start + timedelta(minutes=2)
+    assert scheduler.run_once() == 1
+    assert [notification["intakeId"] for notification in sink.notifications] == ["first", "late"]
+
+    # уже отправленное при следующем перечитывании окна не повторяется
+    clock.now = start + timedelta(minutes=3)
+    assert scheduler.run_once() == 0
+    assert len(sink.notifications) == 2
+
+
+@pytest.mark.django_db
+def test_reminders_respect_disabled_setting_and_cross_midnight(schedule):
+    other = User.objects.create_user(id="other", email="other@example.com", password="x", username="Other")
+    NotificationSettings.objects.create(user=other, medication_reminders_enabled=False)
+    start = datetime(2025, 1, 1, 23, 50)
+    make_intake(schedule, "after_midnight", start + timedelta(minutes=20))
+    make_intake(schedule, "disabled", start + timedelta(minutes=20), user=other)
+
+    sink = MemorySink()
+    scheduler = ReminderScheduler(sink, clock=Clock(start + timedelta(minutes=5)))
+    # по умолчанию напоминание за 15 минут
+    assert scheduler.run_once() == 1
+    assert sink.notifications[0]["scheduledDate"] == "2025-01-02"
+
+
+@pytest.mark.django_db
+def test_reminders_use_user_time_zone(schedule):
+    other = User.objects.create_user(id="other", email="other@example.com", password="x", username="Other")
+    NotificationSettings.objects.create(user=schedule.user, time_zone="Europe/Moscow")
+    # 12:00 по Москве - 09:00 UTC; у второго пользователя пояса нет, его 12:00 - по поясу сервера (UTC)
+    noon = datetime(2025, 1, 1, 12, 0)
+    make_intake(schedule, "moscow", noon)
+    make_intake(schedule, "server", noon, user=other)
+
+    sink, clock = MemorySink(), Clock(datetime(2025, 1, 1, 8, 45))
+    scheduler = ReminderScheduler(sink, clock=clock)
+    assert scheduler.run_once() == 1
+    clock.now = datetime(2025, 1, 1, 11, 45)
+    assert scheduler.run_once() == 1
+    assert [notification["intakeId"] for notification in sink.notifications] == ["moscow", "server"]
+
+
+@pytest.mark.django_db
+def test_reminder_lead_is_bounded(schedule):
+    client = APIClient()
+    client.force_authenticate(user=schedule.user)
+    response = client.post(reverse("notification-list"), {"minutes_before_scheduled_time": 100000}, format="json")
+    assert response.status_code == 400
+    response = client.post(reverse("notification-list"), {"time_zone": "Mars/Olympus"}, format="json")
+    assert response.status_code == 400
+
+    # значение, записанное в обход сериализатора, не раздувает окно больше чем на сутки
+    NotificationSettings.objects.create(user=schedule.user, minutes_before_scheduled_time=100000)
+    start = datetime(2025, 1, 1, 8, 0)
+    make_intake(schedule, "tomorrow", start + timedelta(hours=23))
+    make_intake(schedule, "in_three_days", start + timedelta(days=3))
+    scheduler = ReminderScheduler(MemorySink(), clock=Clock(start))
+    scheduler.refill(scheduler.now())
+    assert [entry[1] for entry in scheduler.heap] == ["tomorrow"]
+
+
+@pytest.mark.django_db
+def test_run_reminders_command_writes_file(schedule, tmp_path, monkeypatch):
+    now = datetime(2025, 1, 1, 9, 0)
+    monkeypatch.setattr("api.reminders.server_now", lambda: now)
+    make_intake(schedule, "soon", now + timedelta(minutes=5))
+    output = tmp_path / "reminders.jsonl"
+
+    call_command("run_reminders", "--once", "--sink-file", str(output), stdout=StringIO())
+    lines = output.read_text(encoding="utf-8").splitlines()
+    assert [json.loads(line)["intakeId"] for line in lines] == ["soon"]
@@ -0,0 +1,63 @@
+import pytest
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory
+from api.models import Medication
+from api.routers import ReplicaRouter, ReplicaRoutingMiddleware, set_route_user, use_primary
+
+
+@pytest.fixture
+def replicas(settings):
+    cache.clear()
+    settings.READ_REPLICAS = {"ALIASES": ["replica1", "replica2"], "STICKY_SECONDS": 10, "CACHE_ALIAS": "default"}
+    yield settings.READ_REPLICAS
+    cache.clear()
+
+
+def request_reads(method, user_id=None):
+    # прогоняет запрос через middleware и возвращает, куда роутер отправил бы чтения до и после аутентификации
+    router = ReplicaRouter()
+    reads = []
+
+    def view(request):
+        reads.append(router.db_for_read(Medication))
+        if user_id is not None:
+            set_route_user(user_id)
+        reads.append(router.db_for_read(Medication))
+        with use_primary():
+            reads.append(router.db_for_read(Medication))
+        return HttpResponse()
+
+    ReplicaRoutingMiddleware(view)(RequestFactory().generic(method, "/api/medications/"))
+    return reads
+
+
+def test_router_without_request(replicas):
+    # команды и фоновые потоки читают с default
+    router = ReplicaRouter()
+    assert router.db_for_read(Medication) == "default"
+    assert router.db_for_write(Medication) == "default"
+    assert router.allow_migrate("default", "api") is None
+    assert router.allow_migrate("replica1", "api") is False
+
+
+def test_safe_requests_read_from_replicas(replicas):
+    first, authenticated, primary = request_reads("GET", user_id="u1")
+    assert first in replicas["ALIASES"]
+    assert authenticated in replicas["ALIASES"]
+    assert primary == "default"
+
+
+def test_writes_pin_user_to_primary(replicas):
+    assert request_reads("POST", user_id="u1") == ["default"] * 3
+    # следующее чтение того же пользователя видит свою запись
+    assert request_reads("GET", user_id="u1")[1:] == ["default", "default"]
+    assert request_reads("GET", user_id="u2")[1] in replicas["ALIASES"]
+
+    cache.clear()  # окно STICKY_SECONDS прошло
+    assert request_reads("GET", user_id="u1")[1] in replicas["ALIASES"]
+
+
+def test_no_replicas(settings):
+    settings.READ_REPLICAS = {"ALIASES": [], "STICKY_SECONDS": 10, "CACHE_ALIAS": "default"}
+    assert request_reads("GET", user_id="u1") == ["default"] * 3
@@ -1,10 +1,14 @@
+import json
 import pytest
 import time
-from datetime import date
+from datetime import date, timedelta
 from rest_framework.test import APIClient
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from django.urls import reverse
 from api.models import Medication, MedicationSchedule, User
+from api.occurrences import expand_schedule, expand_schedules
+from api.renderers import FastJSONRenderer
 from api.serializers import MedicationScheduleSerializer
 
 
@@ -215,4 +219,129 @@ def test_serializer_missing_times(medication, user):
 
     serializer = MedicationScheduleSerializer(data=payload)
     assert not serializer.is_valid()
-    assert "times" in serializer.errors
\ No newline at end of file
+    assert "times" in serializer.errors
+
+def make_schedule(medication, schedule_id, **kwargs):
+    data = {
+        "frequency": "daily",
+        "days": [],
+        "dates": [],
+        "times": [{"time": "09:00", "dosage": "1", "unit": "mg"}],
+        "meal_relation": "no_relation",
+        "start_date": date(2025, 1, 1),
+        "created_at": int(time.time() * 1000),
+        "updated_at": int(time.time() * 1000),
+    }
+    data.update(kwargs)
+    return MedicationSchedule.objects.create(id=schedule_id, user=medication.user, medication=medication, **data)
+
+
+@pytest.mark.django_db
+def test_expand_every_other_day_parity_and_duration(medication):
+    schedule = make_schedule(medication, "eod", frequency="every_other_day", duration_days=7)
+    days = [o.scheduled_date for o in expand_schedule(schedule, date(2025, 1, 2), date(2025, 1, 31))]
+    # 1 января - первый день, значит приёмы по нечётным числам до 7 января включительно
+    assert days == [date(2025, 1, 3), date(2025, 1, 5), date(2025, 1, 7)]
+
+
+@pytest.mark.django_db
+def test_expand_specific_days_and_dates(medication):
+    weekly = make_schedule(medication, "weekly", frequency="specific_days", days=[1, 5])
+    dated = make_schedule(medication, "dated", frequency="specific_dates",
+                          dates=["2025-01-10", "2025-02-01", "2024-12-31"])
+    # 2025-01-06 - понедельник
+    weekly_days = [o.scheduled_date for o in expand_schedule(weekly, date(2025, 1, 6), date(2025, 1, 17))]
+    assert weekly_days == [date(2025, 1, 6), date(2025, 1, 10), date(2025, 1, 13), date(2025, 1, 17)]
+    dated_days = [o.scheduled_date for o in expand_schedule(dated, date(2025, 1, 1), date(2025, 1, 31))]
+    assert dated_days == [date(2025, 1, 10)]
+
+
+@pytest.mark.django_db
+def test_expand_schedules_merges_in_order(medication):
+    morning = make_schedule(medication, "morning", times=[{"time": "08:00", "dosage": "1", "unit": "mg"}])
+    evening = make_schedule(medication, "evening", times=[{"time": "20:00", "dosage": "2", "unit": "mg"}],
+                            end_date=date(2025, 1, 1))
+    occurrences = list(expand_schedules([evening, morning], date(2025, 1, 1), date(2025, 1, 2)))
+    assert [(o.scheduled_date.day, o.scheduled_time) for o in occurrences] == [(1, "08:00"), (1, "20:00"), (2, "08:00")]
+
+
+@pytest.mark.django_db
+def test_occurrences_endpoint(auth_client, schedule):
+    url = reverse("schedule-occurrences")
+    start = date.today()
+    response = auth_client.get(url, {"from": str(start), "to": str(start + timedelta(days=89))})
+    assert response.status_code == status.HTTP_200_OK
+    # duration_days=3 у фикстуры
+    assert [item["scheduledDate"] for item in response.data] == [str(start + timedelta(days=i)) for i in range(3)]
+    assert response.data[0]["scheduleId"] == schedule.id
+    assert response.data[0]["scheduledTime"] == "09:00"
+
+
+@pytest.mark.django_db
+def test_occurrences_endpoint_invalid_range(auth_client, schedule):
+    url = reverse("schedule-occurrences")
+    response = auth_client.get(url, {"from": "2025-02-01", "to": "2025-01-01"})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    response = auth_client.get(url, {"from": "bad-date"})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+def test_fast_list_matches_serializer(auth_client, schedule):
+    make_schedule(schedule.medication, "sched2", end_date=date(2025, 2, 1), duration_days=None,
+                  times=[{"time": "21:00", "dosage": "½", "unit": "таб."}])
+    response = auth_client.get(reverse("schedule-list"))
+    expected = MedicationScheduleSerializer(MedicationSchedule.objects.order_by("updated_at", "id"), many=True).data
+    assert response.content == JSONRenderer().render(expected)
+
+
+def test_fast_renderer_floats():
+    pytest.importorskip("orjson")
+    # дробные числа из JSON-полей: запись другая, значение то же
+    data = [{"times": [{"time": "09:00", "dosage": 1e-05}], "days": [1e16, 0.5]}]
+    fast = FastJSONRenderer().render(data)
+    assert fast == b'[{"times":[{"time":"09:00","dosage":0.00001}],"days":[1e16,0.5]}]'
+    assert json.loads(fast) == json.loads(JSONRenderer().render(data))
+    # NaN JSONRenderer не отдаёт вовсе, orjson - как null
+    assert FastJSONRenderer().render({"dosage": float("nan")}) == b'{"dosage":null}'
+    with pytest.raises(ValueError):
+        JSONRenderer().render({"dosage": float("nan")})
+
+
+@pytest.mark.django_db
+def test_effective_end_date_maintained(auth_client, medication):
+    open_ended = make_schedule(medication, "open")
+    course = make_schedule(medication, "course", duration_days=10, end_date=date(2025, 2, 1))
+    assert open_ended.effective_end_date is None
+    assert MedicationSchedule.objects.get(pk="course").effective_end_date == date(2025, 1, 10)
+
+    # частичное обновление тоже пересчитывает поле
+    course.end_date = date(2025, 1, 5)
+    course.save(update_fields=["end_date"])
+    assert MedicationSchedule.objects.get(pk="course").effective_end_date == date(2025, 1, 5)
+
+    response = auth_client.patch(reverse("schedule-detail", args=["open"]), {"durationDays": 3}, format="json")
+    assert response.status_code == status.HTTP_200_OK
+    assert MedicationSchedule.objects.get(pk="open").effective_end_date == date(2025, 1, 3)
+
+
+@pytest.mark.django_db
+def test_schedules_active_on_filter(auth_client, medication):
+    make_schedule(medication, "open")
+    make_schedule(medication, "course", duration_days=10)
+    make_schedule(medication, "ended", end_date=date(2025, 1, 3))
+    make_schedule(medication, "later", start_date=date(2025, 3, 1))
+    url = reverse("schedule-list")
+
+    def active(day):
+        response = auth_client.get(url, {"activeOn": day})
+        assert response.status_code == status.HTTP_200_OK
+        return sorted(item["id"] for item in response.json())
+
+    assert active("2025-01-03") == ["course", "ended", "open"]
+    assert active("2025-01-10") == ["course", "open"]
+    assert active("2025-01-11") == ["open"]
+    assert active("2025-03-01") == ["later", "open"]
+    assert active("2024-12-31") == []
+    assert len(auth_client.get(url).json()) == 4
+    assert auth_client.get(url, {"activeOn": "bad-date"}).status_code == status.HTTP_400_BAD_REQUEST
@@ -0,0 +1,62 @@
+import pytest
+from datetime import date
+from io import StringIO
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from api.materialize import horizon, materialize_intakes
+from api.models import Medication, MedicationIntake, MedicationSchedule, User
+from api.seed import SCHEDULED_DATE, STATUS, generate_user, seed_population
+
+
+def test_generate_user_is_deterministic():
+    options = {"medications": (3, 5), "days": 30, "today": date(2025, 6, 1)}
+    first = generate_user(7, seed=1, **options)
+    again = generate_user(7, seed=1, **options)
+    other = generate_user(7, seed=2, **options)
+    assert first.intakes == again.intakes
+    assert [m.name for m in first.medications] == [m.name for m in again.medications]
+    assert first.intakes != other.intakes
+
+
+def test_generate_user_statuses():
+    today = date(2025, 6, 1)
+    data = generate_user(1, medications=(8, 8), days=60, future_days=5, taken_ratio=1, missed_ratio=0, today=today)
+    statuses = {(row[SCHEDULED_DATE] < today.isoformat(), row[STATUS]) for row in data.intakes}
+    # прошлые приёмы все приняты при taken_ratio=1, сегодняшние и будущие ждут
+    assert statuses <= {(True, "taken"), (False, "pending")}
+    assert (False, "pending") in statuses
+
+
+@pytest.mark.django_db
+def test_seed_population_command():
+    out = StringIO()
+    call_command("seed_population", "--users", "5", "--medications", "2-3", "--days", "20", "--seed", "3",
+                 "--keep-indexes", stdout=out)
+    assert "Created 5 users" in out.getvalue()
+    assert User.objects.filter(id__startswith="seed-").count() == 5
+    assert Medication.objects.count() == MedicationSchedule.objects.count()
+    assert MedicationIntake.objects.exists()
+
+    # id приёмов те же, что у materialize_intakes: материализация поверх сидирования ничего не дублирует
+    start, end = horizon(date.today(), 7)
+    assert materialize_intakes(start, end) == 0
+
+
+@pytest.mark.django_db
+def test_seed_population_defer_indexes_restores_indexes():
+    table = MedicationIntake._meta.db_table
+
+    def indexes():
+        with connection.cursor() as cursor:
+            return sorted(connection.introspection.get_constraints(cursor, table))
+
+    before = indexes()
+    counts = seed_population(2, medications=(1, 2), days=10, defer_indexes=True)
+    assert counts["users"] == 2
+    assert indexes() == before
+
+
+def test_seed_population_command_validation():
+    with pytest.raises(CommandError):
+        call_command("seed_population", "--taken-ratio", "0.9", "--missed-ratio", "0.2")
@@ -0,0 +1,204 @@
+import pytest
+import time
+from django.conf import settings as django_settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from api.models import Medication, MedicationIntake, MedicationSchedule, ResourceVersion, Tombstone, User, UserShard
+from api.sharding import ShardRouter, UserMoving, hash_shard, move_user, placement, use_shard, use_user
+
+# интеграционным тестам нужны две базы: DATABASE_SHARD_URLS=sqlite:///shard1.sqlite3 python -m pytest
+multi_shard = pytest.mark.skipif(
+    len(django_settings.SHARDING["SHARDS"]) < 2, reason="needs DATABASE_SHARD_URLS"
+)
+
+
+def test_hash_shard_is_stable():
+    aliases = ["default", "shard1", "shard2"]
+    placed = {user_id: hash_shard(user_id, aliases) for user_id in (f"user{index}" for index in range(3000))}
+    assert placed == {user_id: hash_shard(user_id, aliases) for user_id in placed}
+    counts = {alias: list(placed.values()).count(alias) for alias in aliases}
+    assert all(800 < count < 1200 for count in counts.values()), counts
+
+    # новый шард забирает примерно четверть пользователей, остальные остаются на месте
+    grown = {user_id: hash_shard(user_id, aliases + ["shard3"]) for user_id in placed}
+    moved = [user_id for user_id in placed if grown[user_id] != placed[user_id]]
+    assert all(grown[user_id] == "shard3" for user_id in moved)
+    assert 600 < len(moved) < 900
+
+
+@pytest.mark.django_db
+def test_router_with_single_database():
+    # без шардов роутер ни во что не вмешивается (обычные тесты идут с одним шардом, см. conftest.py)
+    router = ShardRouter()
+    with use_user("u1"):
+        assert router.db_for_read(Medication) is None
+        assert router.db_for_write(Medication) is None
+
+
+@pytest.mark.django_db
+def test_router_placement(settings):
+    user = User.objects.create_user(id="u1", email="u1@example.com", password="pass12345", username="u1")
+    cache.clear()
+    settings.SHARDING = {**settings.SHARDING, "SHARDS": ["default", "shard1"]}
+    UserShard.objects.create(user=user, shard="shard1")
+    router = ShardRouter()
+
+    assert placement("u1") == ("shard1", False)
+    assert placement("nobody") == ("default", False)  # без записи в каталоге - там, где жили до шардов
+    with use_user("u1"):
+        assert router.db_for_read(Medication) == "shard1"
+        assert router.db_for_write(MedicationIntake) == "shard1"
+        # пользователи и токены - в default
+        assert router.db_for_read(User) is None
+    assert router.db_for_read(Medication) is None
+    assert router.db_for_write(Tombstone, instance=Tombstone(user_id="u1")) == "shard1"
+    with use_shard("shard1"):
+        assert router.db_for_read(MedicationSchedule) == "shard1"
+
+    UserShard.objects.filter(user=user).update(moving=True)
+    cache.clear()
+    with use_user("u1"):
+        assert router.db_for_read(Medication) == "shard1"
+        with pytest.raises(UserMoving):
+            router.db_for_write(Medication)
+    cache.clear()
+
+
+def test_move_users_requires_shards():
+    with pytest.raises(CommandError):
+        call_command("move_users", "u1", "--to", "default")
+
+
+def medication_payload(medication_id):
+    now = int(time.time() * 1000)
+    return {
+        "id": medication_id, "name": "Парацетамол", "form": "tablet", "dosagePerUnit": "500mg", "unit": "мг",
+        "instructions": "После еды", "totalQuantity": 20, "remainingQuantity": 20, "lowStockThreshold": 5,
+        "trackStock": True, "iconName": "pill", "iconColor": "blue", "createdAt": now, "updatedAt": now,
+    }
+
+
+@multi_shard
+@pytest.mark.django_db(databases="__all__")
+def test_user_data_lives_in_its_shard_and_moves(settings):
+    cache.clear()
+    settings.SYNC_WATERMARK_LAG_MS = 0  # удаление выше должно сразу попасть в /api/sync/
+    user = User.objects.create_user(id="sharded", email="s@example.com", password="pass12345", username="s")
+    home = UserShard.objects.get(user=user).shard
+    other = next(alias for alias in django_settings.SHARDING["SHARDS"] if alias != home)
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=user).key}")
+
+    assert client.post("/api/medications/", medication_payload("m1"), format="json").status_code == 201
+    assert client.delete("/api/medications/m1/").status_code == 204
+    assert client.post("/api/medications/", medication_payload("m2"), format="json").status_code == 201
+    assert Medication.objects.using(home).filter(user_id="sharded").count() == 1
+    assert Tombstone.objects.using(home).filter(user_id="sharded").count() == 1
+    assert not Medication.objects.using(other).filter(user_id="sharded").exists()
+
+    copied = move_user("sharded", other, wait=0)
+    assert copied >= 3  # лекарство, tombstone, версии коллекций
+    assert UserShard.objects.get(user=user).shard == other
+    assert not Medication.objects.using(home).filter(user_id="sharded").exists()
+    assert not ResourceVersion.objects.using(home).filter(user_id="sharded").exists()
+
+    assert [item["id"] for item in client.get("/api/medications/").json()] == ["m2"]
+    assert client.get("/api/sync/").json()["deleted"]["medications"] == ["m1"]
+    assert client.patch("/api/medications/m2/", {"name": "Ибупрофен"}, format="json").status_code == 200
+    assert Medication.objects.using(other).get(pk="m2").name == "Ибупрофен"
+
+    # пока идёт перенос, запись отклоняется, чтение работает
+    UserShard.objects.filter(user=user).update(moving=True)
+    cache.clear()
+    assert client.patch("/api/medications/m2/", {"name": "x"}, format="json").status_code == 503
+    assert client.get("/api/medications/").status_code == 200
+    UserShard.objects.filter(user=user).update(moving=False)
+    cache.clear()
+
+    user.delete()
+    assert not Medication.objects.using(other).filter(user_id="sharded").exists()
+    assert not User.objects.using(other).filter(pk="sharded").exists()
+    cache.clear()
+
+
+@multi_shard
+@pytest.mark.django_db(databases="__all__")
+def test_failed_batch_rolls_back_in_user_shard():
+    cache.clear()
+    # пользователь не в default: транзакция пакета должна открываться в его шарде
+    user_id = next(f"batch{index}" for index in range(100) if hash_shard(f"batch{index}") != "default")
+    user = User.objects.create_user(id=user_id, email="b@example.com", password="pass12345", username="b")
+    home = UserShard.objects.get(user=user).shard
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=user).key}")
+
+    response = client.post("/api/batch/", {"operations": [
+        {"op": "create", "resource": "medications", "data": medication_payload("m1")},
+        {"op": "update", "resource": "medications", "id": "missing", "data": {"name": "x"}},
+    ]}, format="json")
+    assert response.status_code == 400
+    assert response.json()["committed"] is False
+    assert not Medication.objects.using(home).filter(user_id=user_id).exists()
+    assert not ResourceVersion.objects.using(home).filter(user_id=user_id).exists()
+
+    response = client.post("/api/batch/", {"operations": [
+        {"op": "create", "resource": "medications", "data": medication_payload("m1")},
+    ]}, format="json")
+    assert response.json()["committed"] is True
+    assert Medication.objects.using(home).filter(user_id=user_id).count() == 1
+
+    user.delete()
+    cache.clear()
+
+
+@multi_shard
+@pytest.mark.django_db(databases="__all__")
+def test_move_copies_from_one_source_transaction():
+    cache.clear()
+    user = User.objects.create_user(id="snapshot", email="snap@example.com", password="pass12345", username="snap")
+    home = UserShard.objects.get(user=user).shard
+    other = next(alias for alias in django_settings.SHARDING["SHARDS"] if alias != home)
+
+    with CaptureQueriesContext(connections[home]) as queries:
+        move_user("snapshot", other, wait=0)
+    sql = [query["sql"] for query in queries.captured_queries]
+    # все таблицы пользователя, в том числе сводки статистики и их граница, читаются в одной транзакции источника
+    first = next(index for index, query in enumerate(sql) if '"api_medication"' in query and query.startswith("SELECT"))
+    last = next(index for index, query in enumerate(sql) if '"api_tombstone"' in query and query.startswith("SELECT"))
+    opened = [index for index, query in enumerate(sql[:first]) if query.startswith(("SAVEPOINT", "BEGIN"))]
+    assert opened
+    assert not any(query.startswith(("RELEASE", "COMMIT")) for query in sql[opened[-1]:last])
+    cache.clear()
+
+
+@multi_shard
+@pytest.mark.django_db(databases="__all__")
+def test_fan_out_waits_for_user_shard_commit(settings, monkeypatch, django_capture_on_commit_callbacks):
+    cache.clear()
+    settings.INTAKE_FANOUT_ASYNC = True
+    submitted = []
+    monkeypatch.setattr("api.fanout.get_executor", lambda: type("Executor", (), {
+        "submit": staticmethod(lambda func, *args: submitted.append(args))
+    }))
+    user_id = next(f"fanout{index}" for index in range(100) if hash_shard(f"fanout{index}") != "default")
+    user = User.objects.create_user(id=user_id, email="f@example.com", password="pass12345", username="f")
+    home = UserShard.objects.get(user=user).shard
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=user).key}")
+    assert client.post("/api/medications/", medication_payload("m1"), format="json").status_code == 201
+
+    # перенос правки в приёмы ставится в очередь после коммита транзакции шарда, а не default
+    with django_capture_on_commit_callbacks(using=home) as callbacks:
+        assert client.patch("/api/medications/m1/", {"name": "Ибупрофен"}, format="json").status_code == 200
+    assert len(callbacks) == 1
+    assert submitted == []
+    callbacks[0]()
+    assert submitted == [({"user_id": user_id, "medication_id": "m1"}, {"medication_name": "Ибупрофен"})]
+
+    user.delete()
+    cache.clear()
@@ -0,0 +1,136 @@
+import pytest
+from datetime import date, timedelta
+from rest_framework.test import APIClient
+from rest_framework import status
+from django.urls import reverse
+from api.models import Medication, MedicationSchedule, MedicationIntake, DailyAdherence, User
+
+
+@pytest.fixture
+def user(db):
+    return User.objects.create_user(
+        id="testuser123",
+        email="test@example.com",
+        password="testpass123",
+        username="TestUser"
+    )
+
+
+@pytest.fixture
+def auth_client(user):
+    client = APIClient()
+    client.force_authenticate(user=user)
+    return client
+
+
+@pytest.fixture
+def schedule(user):
+    medication = Medication.objects.create(
+        id="med123", user=user, name="TestMed", form="tablet", unit="mg", instructions="Take",
+        icon_name="pill", icon_color="blue", created_at=0, updated_at=0
+    )
+    return MedicationSchedule.objects.create(
+        id="sched123", user=user, medication=medication, frequency="daily",
+        times=[{"time": "09:00", "dosage": "1", "unit": "mg"}], meal_relation="no_relation",
+        start_date=date.today() - timedelta(days=30), created_at=0, updated_at=0
+    )
+
+
+def make_intake(schedule, intake_id, day, intake_status):
+    return MedicationIntake.objects.create(
+        id=intake_id, schedule=schedule, medication=schedule.medication, user=schedule.user,
+        scheduled_date=day.isoformat(), scheduled_time="09:00", status=intake_status,
+        medication_name="TestMed", meal_relation="no_relation", instructions="Take", dosage_by_time="1",
+        unit="mg", icon_name="pill", icon_color="blue", created_at=0, updated_at=0
+    )
+
+
+@pytest.mark.django_db
+def test_adherence_by_day_uses_rollup_for_closed_days(auth_client, schedule):
+    today = date.today()
+    yesterday = today - timedelta(days=1)
+    make_intake(schedule, "y1", yesterday, "taken")
+    make_intake(schedule, "y2", yesterday, "missed")
+    make_intake(schedule, "t1", today, "pending")
+    url = reverse("stats-adherence")
+
+    response = auth_client.get(url, {"from": str(yesterday), "to": str(today)})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data["items"] == [
+        {"date": str(yesterday), "taken": 1, "missed": 1, "pending": 0, "rate": 0.5},
+        {"date": str(today), "taken": 0, "missed": 0, "pending": 1, "rate": None},
+    ]
+    assert DailyAdherence.objects.get(date=yesterday).taken == 1
+
+    # правка закрытого дня обновляет свёртку инкрементально
+    intake = MedicationIntake.objects.get(id="y2")
+    auth_client.patch(reverse("intake-detail", args=[intake.id]), {"status": "taken"}, format="json")
+    rollup = DailyAdherence.objects.get(date=yesterday)
+    assert (rollup.taken, rollup.missed) == (2, 0)
+    response = auth_client.get(url, {"from": str(yesterday), "to": str(yesterday)})
+    assert response.data["totals"] == {"taken": 2, "missed": 0, "pending": 0, "rate": 1.0}
+
+    auth_client.delete(reverse("intake-detail", args=["y1"]))
+    assert DailyAdherence.objects.get(date=yesterday).taken == 1
+
+    # каскад от удаления расписания вычитается из свёртки одной пачкой
+    auth_client.delete(reverse("schedule-detail", args=["sched123"]))
+    rollup = DailyAdherence.objects.get(date=yesterday)
+    assert (rollup.taken, rollup.missed, rollup.pending) == (0, 0, 0)
+
+
+@pytest.mark.django_db
+def test_adherence_group_by_week_and_medication(auth_client, schedule):
+    monday = date.today() - timedelta(days=date.today().weekday() + 7)
+    make_intake(schedule, "a", monday, "taken")
+    make_intake(schedule, "b", monday + timedelta(days=3), "missed")
+    url = reverse("stats-adherence")
+    params = {"from": str(monday), "to": str(monday + timedelta(days=6))}
+
+    response = auth_client.get(url, {**params, "groupBy": "week"})
+    assert response.data["items"] == [{"weekStart": str(monday), "taken": 1, "missed": 1, "pending": 0, "rate": 0.5}]
+    response = auth_client.get(url, {**params, "groupBy": "medication"})
+    assert response.data["items"][0]["medicationId"] == "med123"
+
+
+@pytest.mark.django_db
+def test_adherence_validates_params(auth_client):
+    url = reverse("stats-adherence")
+    assert auth_client.get(url, {"groupBy": "year"}).status_code == status.HTTP_400_BAD_REQUEST
+    assert auth_client.get(url, {"from": "2025-02-01", "to": "2025-01-01"}).status_code == 400
+
+
+@pytest.mark.django_db
+def test_calendar_counts_and_fills_future_days(auth_client, schedule):
+    today = date.today()
+    yesterday = today - timedelta(days=1)
+    make_intake(schedule, "y1", yesterday, "taken")
+    make_intake(schedule, "y2", yesterday, "missed")
+    make_intake(schedule, "t1", today, "taken")
+    url = reverse("calendar")
+
+    response = auth_client.get(url, {"month": today.strftime("%Y-%m")})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data["month"] == today.strftime("%Y-%m")
+    days = {item["date"]: item for item in response.data["days"]}
+    assert len(days) >= 28 and all(item["date"].startswith(response.data["month"]) for item in days.values())
+    assert days[str(today)] == {"date": str(today), "taken": 1, "missed": 0, "pending": 0}
+    if yesterday.month == today.month:
+        assert days[str(yesterday)]["taken"] == 1 and days[str(yesterday)]["missed"] == 1
+    # будущие дни без приёмов - по расписанию (ежедневно, один приём в день)
+    for day, item in days.items():
+        if day > str(today):
+            assert (item["taken"], item["missed"], item["pending"]) == (0, 0, 1)
+
+    # прошедший месяц: приёмов нет - нули, расписание не подставляется
+    response = auth_client.get(url, {"month": "2001-02"})
+    assert len(response.data["days"]) == 28
+    assert all(item["pending"] == 0 for item in response.data["days"])
+
+
+@pytest.mark.django_db
+def test_calendar_validates_month(auth_client):
+    url = reverse("calendar")
+    assert auth_client.get(url).data["month"] == date.today().strftime("%Y-%m")
+    for value in ("2025-13", "2025", "abc", "2025-01-05"):
+        assert auth_client.get(url, {"month": value}).status_code == status.HTTP_400_BAD_REQUEST
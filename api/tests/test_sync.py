@@ -0,0 +1,192 @@
+import pytest
+import time
+from datetime import date
+from rest_framework.test import APIClient
+from rest_framework import status
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from api.models import Medication, MedicationIntake, MedicationSchedule, NotificationSettings, Tombstone, User
+
+
+@pytest.fixture
+def user(db):
+    return User.objects.create_user(
+        id="testuser123",
+        email="test@example.com",
+        password="testpass123",
+        username="TestUser"
+    )
+
+
+@pytest.fixture(autouse=True)
+def no_watermark_lag(settings):
+    # тесты ниже пишут и сразу синхронизируются; запас под долгие транзакции проверяется отдельно
+    settings.SYNC_WATERMARK_LAG_MS = 0
+
+
+@pytest.fixture
+def auth_client(user):
+    client = APIClient()
+    client.force_authenticate(user=user)
+    return client
+
+
+def make_medication(user, medication_id, updated_at):
+    return Medication.objects.create(
+        id=medication_id,
+        user=user,
+        name=f"Med {medication_id}",
+        form="tablet",
+        unit="mg",
+        instructions="",
+        icon_name="pill",
+        icon_color="blue",
+        created_at=updated_at,
+        updated_at=updated_at
+    )
+
+
+@pytest.mark.django_db
+def test_sync_returns_changes_after_watermark(auth_client, user):
+    make_medication(user, "old", 1000)
+    make_medication(user, "new", 3000)
+    # изменения ищутся по серверной метке changed_at
+    Medication.objects.filter(pk="old").update(changed_at=1000)
+    Medication.objects.filter(pk="new").update(changed_at=3000)
+    NotificationSettings.objects.create(user=user)
+
+    response = auth_client.get(reverse("sync"), {"since": 2000})
+    assert response.status_code == status.HTTP_200_OK
+    assert [item["id"] for item in response.data["medications"]] == ["new"]
+    assert len(response.data["notifications"]) == 1
+    assert response.data["watermark"] >= int(time.time() * 1000) - 60000
+
+    response = auth_client.get(reverse("sync"), {"since": response.data["watermark"]})
+    assert response.data["medications"] == []
+    assert response.data["notifications"] == []
+    assert response.data["deleted"]["medications"] == []
+
+
+@pytest.mark.django_db
+def test_sync_watermark_covers_transactions_committed_after_the_read(auth_client, user, settings, monkeypatch):
+    settings.SYNC_WATERMARK_LAG_MS = 60000
+    make_medication(user, "visible", 1000)
+    Medication.objects.filter(pk="visible").update(changed_at=1000)
+    # транзакция записи началась до синхронизации: строка получила метку, но ещё не закоммичена
+    stamp = int(time.time() * 1000)
+    response = auth_client.get(reverse("sync"), {"since": 0})
+    watermark = response.data["watermark"]
+    assert [item["id"] for item in response.data["medications"]] == ["visible"]
+    assert watermark < stamp
+
+    # коммит после чтения: в базе появляется строка с меткой раньше ответа синхронизации
+    monkeypatch.setattr("api.models.now_ms", lambda: stamp)
+    make_medication(user, "slow", 1000)
+    monkeypatch.undo()
+
+    response = auth_client.get(reverse("sync"), {"since": watermark})
+    assert [item["id"] for item in response.data["medications"]] == []
+    # пока метка строки не старше запаса, она остаётся за watermark и придёт следующим запросом
+    settings.SYNC_WATERMARK_LAG_MS = 0
+    response = auth_client.get(reverse("sync"), {"since": watermark})
+    assert [item["id"] for item in response.data["medications"]] == ["slow"]
+
+
+@pytest.mark.django_db
+def test_sync_ignores_client_clock(auth_client, user):
+    watermark = auth_client.get(reverse("sync"), {"since": 0}).data["watermark"]
+    # часы устройства отстают: updatedAt меньше метки, но изменение всё равно приходит
+    make_medication(user, "late", 1000)
+    response = auth_client.patch(reverse("medication-detail", args=["late"]), {"name": "x", "updatedAt": 500}, format="json")
+    assert response.status_code == status.HTTP_200_OK
+
+    response = auth_client.get(reverse("sync"), {"since": watermark})
+    assert [item["id"] for item in response.data["medications"]] == ["late"]
+    assert response.data["medications"][0]["updatedAt"] == 500
+
+
+@pytest.mark.django_db
+def test_sync_pages_through_changes(auth_client, user):
+    for index in range(5):
+        make_medication(user, f"med{index}", 1000)
+    NotificationSettings.objects.create(user=user)
+    Medication.objects.filter(pk__in=["med3", "med4"]).delete()
+
+    ids, deleted, watermarks = [], [], set()
+    url = reverse("sync") + "?since=0&limit=2"
+    pages = 0
+    while url:
+        response = auth_client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        ids += [item["id"] for item in response.data["medications"]]
+        deleted += response.data["deleted"]["medications"]
+        watermarks.add(response.data["watermark"])
+        url = response.headers.get("Link", "").partition(">")[0].lstrip("<") or None
+        pages += 1
+    assert pages == 2
+    assert ids == ["med0", "med1", "med2"]
+    assert sorted(deleted) == ["med3", "med4"]
+    assert len(watermarks) == 1
+
+    response = auth_client.get(reverse("sync"), {"since": 0, "cursor": "bm90LWEtY3Vyc29y"})
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+def test_sync_reports_deleted_rows(auth_client, user):
+    medication = make_medication(user, "med1", 1000)
+    MedicationSchedule.objects.create(
+        id="sched1", user=user, medication=medication, frequency="daily",
+        times=[{"time": "09:00", "dosage": "1", "unit": "mg"}], meal_relation="no_relation",
+        start_date=date.today(), created_at=1000, updated_at=1000
+    )
+    watermark = auth_client.get(reverse("sync"), {"since": 0}).data["watermark"]
+
+    response = auth_client.delete(reverse("medication-detail", args=["med1"]))
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+
+    response = auth_client.get(reverse("sync"), {"since": watermark - 1})
+    assert response.data["deleted"]["medications"] == ["med1"]
+    # расписание удалено каскадом вместе с медикаментом
+    assert response.data["deleted"]["schedules"] == ["sched1"]
+
+
+@pytest.mark.django_db
+def test_cascade_delete_is_set_based(user):
+    medication = make_medication(user, "med1", 1000)
+    schedule = MedicationSchedule.objects.create(
+        id="sched1", user=user, medication=medication, frequency="daily",
+        times=[{"time": "09:00", "dosage": "1", "unit": "mg"}], meal_relation="no_relation",
+        start_date=date.today(), created_at=1000, updated_at=1000
+    )
+    MedicationIntake.objects.bulk_create([
+        MedicationIntake(
+            id=f"i{day}", schedule=schedule, medication=medication, user=user, scheduled_time="09:00",
+            scheduled_date=f"2025-01-{day:02d}", status="taken", created_at=1000, updated_at=1000,
+            medication_name="Med", meal_relation="no_relation", instructions="", dosage_by_time="1", unit="mg",
+            icon_name="pill", icon_color="blue",
+        )
+        for day in range(1, 31)
+    ])
+
+    with CaptureQueriesContext(connection) as queries:
+        medication.delete()
+    # число запросов не зависит от числа приёмов в каскаде
+    assert len(queries) < 30
+    assert Tombstone.objects.filter(resource="intakes").count() == 30
+    assert Tombstone.objects.filter(resource="schedules").count() == 1
+    assert not MedicationIntake.objects.exists()
+
+
+@pytest.mark.django_db
+def test_deleting_user_does_not_leave_tombstones(user):
+    make_medication(user, "med1", 1000)
+    user.delete()
+    assert not Tombstone.objects.exists()
+
+
+@pytest.mark.django_db
+def test_sync_invalid_since(auth_client):
+    response = auth_client.get(reverse("sync"), {"since": "yesterday"})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
@@ -50,4 +50,40 @@ def test_user_create_serializer_missing_fields():
     serializer = UserCreateSerializer(data=data, context={"request": request})
     assert not serializer.is_valid()
     assert "id" in serializer.errors
-    assert "name" in serializer.errors
\ No newline at end of file
+    assert "name" in serializer.errors
+
+@pytest.fixture
+def token_client(db):
+    from rest_framework.authtoken.models import Token
+    from rest_framework.test import APIClient
+    user = User.objects.create_user(id="user789", username="liza", email="cached@example.com", password="test1234")
+    token = Token.objects.create(user=user)
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+    return client, user
+
+
+@pytest.mark.django_db
+def test_token_auth_is_cached(token_client, django_assert_num_queries):
+    client, _ = token_client
+    assert client.get("/api/medications/").status_code == 200
+    # второй запрос без поиска токена: остаются версия коллекции (ETag) и сам список
+    with django_assert_num_queries(2):
+        assert client.get("/api/medications/").status_code == 200
+
+
+@pytest.mark.django_db
+def test_logout_evicts_cached_token(token_client):
+    client, _ = token_client
+    assert client.get("/api/medications/").status_code == 200
+    assert client.post("/api/auth/token/logout/").status_code == 204
+    assert client.get("/api/medications/").status_code == 401
+
+
+@pytest.mark.django_db
+def test_deactivation_evicts_cached_token(token_client):
+    client, user = token_client
+    assert client.get("/api/medications/").status_code == 200
+    user.is_active = False
+    user.save()
+    assert client.get("/api/medications/").status_code == 401
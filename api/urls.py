@@ -6,8 +6,13 @@ from .views import (
     MedicationViewSet,
     MedicationScheduleViewSet,
     MedicationIntakeViewSet,
-    NotificationSettingsViewSet
+    NotificationSettingsViewSet,
+    SyncView,
+    BatchView,
+    AdherenceStatsView,
+    CalendarView
 )
+from .async_views import AsyncMedicationListView, AsyncScheduleListView, AsyncTodayIntakesView
 
 router = DefaultRouter()
 router.register(r'medications', MedicationViewSet, basename='medication')
@@ -17,6 +22,14 @@ router.register(r'notifications', NotificationSettingsViewSet, basename='notific
 
 urlpatterns = [
     path('', include(router.urls)), #все адреса с роутера будут доступны здесь
+    path('sync/', SyncView.as_view(), name='sync'), #изменения после метки времени
+    path('batch/', BatchView.as_view(), name='batch'), #пакетная запись офлайн-изменений
+    path('stats/adherence/', AdherenceStatsView.as_view(), name='stats-adherence'), #статистика приёма
+    path('calendar/', CalendarView.as_view(), name='calendar'), #счётчики приёмов по дням месяца
+    #async-версии самых частых чтений (под ASGI без потока на запрос)
+    path('async/medications/', AsyncMedicationListView.as_view(), name='async-medication-list'),
+    path('async/schedules/', AsyncScheduleListView.as_view(), name='async-schedule-list'),
+    path('async/intakes/today/', AsyncTodayIntakesView.as_view(), name='async-intakes-today'),
     path("auth/", include("djoser.urls")), #для авторизации по токену
     path("auth/", include("djoser.urls.authtoken")),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
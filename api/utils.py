@@ -0,0 +1,16 @@
+import time
+from datetime import timedelta
+
+
+def now_ms():
+    #время на фронте хранится в миллисекундах (Date.now()), на сервере считаем так же
+    return int(time.time() * 1000)
+
+
+def effective_end_date(start_date, end_date, duration_days):
+    # последний день приёма: end_date или start_date + duration_days - 1, что раньше; None - бессрочно
+    end = end_date
+    if duration_days:
+        by_duration = start_date + timedelta(days=duration_days - 1)
+        end = by_duration if end is None else min(end, by_duration)
+    return end
@@ -0,0 +1,32 @@
+from django.db import IntegrityError, router, transaction
+from django.db.models import F
+
+from .models import ResourceVersion
+
+
+def bump_version(user_id, resource):
+    # вызывается при каждой записи в коллекцию (сигналы и массовые UPDATE/INSERT в обход сигналов)
+    if not user_id:
+        return
+    updated = ResourceVersion.objects.filter(user_id=user_id, resource=resource).update(version=F('version') + 1)
+    if updated:
+        return
+    try:
+        with transaction.atomic(using=router.db_for_write(ResourceVersion, instance=ResourceVersion(user_id=user_id))):
+            ResourceVersion.objects.create(user_id=user_id, resource=resource, version=1)
+    except IntegrityError:
+        # строку успели создать параллельно
+        ResourceVersion.objects.filter(user_id=user_id, resource=resource).update(version=F('version') + 1)
+
+
+def get_version(user_id, resource):
+    return ResourceVersion.objects.filter(user_id=user_id, resource=resource).values_list(
+        'version', flat=True
+    ).first() or 0
+
+
+async def aget_version(user_id, resource):
+    # то же для async-представлений (api/async_views.py)
+    return await ResourceVersion.objects.filter(user_id=user_id, resource=resource).values_list(
+        'version', flat=True
+    ).afirst() or 0
@@ -1,13 +1,83 @@
-from rest_framework import viewsets, permissions
-from .models import Medication, MedicationSchedule, MedicationIntake, NotificationSettings
+import calendar
+from datetime import date, timedelta
+
+from django.conf import settings
+from rest_framework import viewsets, permissions, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from .models import ArchivedIntake, Medication, MedicationSchedule, MedicationIntake, NotificationSettings, Tombstone
+from .archive import archive_cutoff
+from .batch import Batch, validate_operations
+from .db import RetryOnLockedMixin, retry_on_locked
+from .etag import ETagMixin
+from .materialize import horizon, materialize_intakes
+from .occurrences import active_between, expand_schedules
+from .pagination import IntakePagination, SyncPagination
+from .rows import FastListMixin
+from .signals import RESOURCES
+from .stats import GROUP_BY, adherence, month_calendar
 from .serializers import (
     MedicationSerializer,
     MedicationScheduleSerializer,
     MedicationIntakeSerializer,
     NotificationSettingsSerializer
 )
+from .utils import now_ms
+
+MAX_OCCURRENCES_RANGE_DAYS = 366
+MAX_MATERIALIZE_DAYS = 60
+MAX_STATS_RANGE_DAYS = 3 * 366
+
+
+def parse_date_param(request, name, default=None):
+    #даты в query-параметрах приходят в формате YYYY-MM-DD, как и на фронте
+    # request.GET, а не query_params: так же вызывается из async-представлений с обычным HttpRequest
+    value = request.GET.get(name)
+    if not value:
+        return default
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValidationError({name: 'Date must be in YYYY-MM-DD format.'})
+
+
+def filter_intakes(queryset, request):
+    # фильтры под составные индексы (user, scheduled_date, scheduled_time) и (user, status, scheduled_date)
+    params = request.GET
+    day = parse_date_param(request, 'date')
+    if day:
+        queryset = queryset.filter(scheduled_date=day.isoformat())
+    start = parse_date_param(request, 'from')
+    if start:
+        queryset = queryset.filter(scheduled_date__gte=start.isoformat())
+    end = parse_date_param(request, 'to')
+    if end:
+        queryset = queryset.filter(scheduled_date__lte=end.isoformat())
+
+    intake_status = params.get('status')
+    if intake_status:
+        if intake_status not in MedicationIntake.Status.values:
+            raise ValidationError({'status': f'Must be one of: {", ".join(MedicationIntake.Status.values)}.'})
+        queryset = queryset.filter(status=intake_status)
+    if params.get('medicationId'):
+        queryset = queryset.filter(medication_id=params['medicationId'])
+    if params.get('scheduleId'):
+        queryset = queryset.filter(schedule_id=params['scheduleId'])
+    return queryset
+
+
+def filter_schedules(queryset, request):
+    # ?activeOn=YYYY-MM-DD - только расписания, которые действуют в этот день (индекс schedule_user_active_idx)
+    day = parse_date_param(request, 'activeOn')
+    if day:
+        queryset = queryset.filter(active_between(day, day))
+    return queryset
+
 
-class MedicationViewSet(viewsets.ModelViewSet): #реализует все CRUD операции
+class MedicationViewSet(ETagMixin, FastListMixin, RetryOnLockedMixin, viewsets.ModelViewSet): #реализует все CRUD операции
+    etag_resource = 'medications'
     serializer_class = MedicationSerializer #подключаем сериализатор
     permission_classes = [permissions.IsAuthenticated]
 
@@ -17,29 +87,192 @@ class MedicationViewSet(viewsets.ModelViewSet): #реализует все CRUD
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
-class MedicationScheduleViewSet(viewsets.ModelViewSet):
+class MedicationScheduleViewSet(ETagMixin, FastListMixin, RetryOnLockedMixin, viewsets.ModelViewSet):
+    etag_resource = 'schedules'
     serializer_class = MedicationScheduleSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return MedicationSchedule.objects.filter(medication__user=self.request.user)
+        queryset = MedicationSchedule.objects.filter(user=self.request.user)
+        if self.action == 'list':
+            queryset = filter_schedules(queryset, self.request)
+        return queryset
 
-class MedicationIntakeViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['get'])
+    def occurrences(self, request):
+        # GET /api/schedules/occurrences/?from=YYYY-MM-DD&to=YYYY-MM-DD - развёрнутые приёмы по всем расписаниям
+        start = parse_date_param(request, 'from', date.today())
+        end = parse_date_param(request, 'to', start)
+        if end < start:
+            raise ValidationError({'to': 'Must not be earlier than from.'})
+        if (end - start).days >= MAX_OCCURRENCES_RANGE_DAYS:
+            raise ValidationError({'to': f'Range must not exceed {MAX_OCCURRENCES_RANGE_DAYS} days.'})
+
+        schedules = self.get_queryset().filter(active_between(start, end)).only(
+            'id', 'medication_id', 'frequency', 'days', 'dates', 'times',
+            'start_date', 'end_date', 'duration_days'
+        )
+        return Response([
+            {
+                'scheduleId': occurrence.schedule_id,
+                'medicationId': occurrence.medication_id,
+                'scheduledDate': occurrence.scheduled_date.isoformat(),
+                'scheduledTime': occurrence.scheduled_time,
+                'dosageByTime': occurrence.dosage,
+                'unit': occurrence.unit,
+            }
+            for occurrence in expand_schedules(schedules, start, end)
+        ])
+
+class MedicationIntakeViewSet(ETagMixin, FastListMixin, RetryOnLockedMixin, viewsets.ModelViewSet):
+    etag_resource = 'intakes'
     serializer_class = MedicationIntakeSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = IntakePagination
 
     def get_queryset(self):
-        return MedicationIntake.objects.filter(user=self.request.user)
+        queryset = MedicationIntake.objects.filter(user=self.request.user)
+        if self.action == 'list':
+            queryset = filter_intakes(queryset, self.request)
+        return queryset
+
+    def get_archived_queryset(self):
+        # архив читается, только если клиент сам запросил старые даты (date или from раньше границы архива)
+        start = parse_date_param(self.request, 'date') or parse_date_param(self.request, 'from')
+        if start is None or start >= archive_cutoff():
+            return None
+        return filter_intakes(ArchivedIntake.objects.filter(user=self.request.user), self.request)
+
+    def paginate_queryset(self, queryset):
+        archived = self.get_archived_queryset() if self.action == 'list' else None
+        if archived is None:
+            return super().paginate_queryset(queryset)
+        builder = self.get_row_builder()
+        if builder is not None:
+            archived = builder.values(archived)
+        return self.paginator.paginate_querysets([archived, queryset], self.request)
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
-class NotificationSettingsViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['post'])
+    @retry_on_locked
+    def materialize(self, request):
+        # POST /api/intakes/materialize/ {"days": 14} - создаёт приёмы по расписаниям одним запросом вместо сотни POST
+        try:
+            days = int(request.data.get('days', 14))
+        except (TypeError, ValueError):
+            raise ValidationError({'days': 'A valid integer is required.'})
+        if not 1 <= days <= MAX_MATERIALIZE_DAYS:
+            raise ValidationError({'days': f'Must be between 1 and {MAX_MATERIALIZE_DAYS}.'})
+
+        start, end = horizon(date.today(), days)
+        created = materialize_intakes(start, end, MedicationSchedule.objects.filter(user=request.user))
+        return Response({'created': created, 'from': start.isoformat(), 'to': end.isoformat()})
+
+class NotificationSettingsViewSet(ETagMixin, FastListMixin, RetryOnLockedMixin, viewsets.ModelViewSet):
+    etag_resource = 'notifications'
     serializer_class = NotificationSettingsSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = None #у пользователя одна запись настроек
 
     def get_queryset(self):
         return NotificationSettings.objects.filter(user=self.request.user)
 
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
\ No newline at end of file
+        serializer.save(user=self.request.user)
+
+
+class SyncView(APIView):
+    # GET /api/sync/?since=<ms> - всё, что изменилось или удалено после since, и новая метка для следующего запроса.
+    # Изменения ищутся по серверной метке changed_at, а не по updated_at с часов клиента
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        try:
+            since = int(request.query_params.get('since', 0))
+        except ValueError:
+            raise ValidationError({'since': 'A valid integer is required.'})
+
+        # метка берётся до чтения и с запасом SYNC_WATERMARK_LAG_MS: changed_at ставится при записи, а не при коммите,
+        # и строки ещё не закоммиченной транзакции старше метки иначе не пришли бы ни сейчас, ни в следующий раз
+        watermark = max(now_ms() - settings.SYNC_WATERMARK_LAG_MS, since)
+        user = request.user
+        context = {'request': request}
+
+        paginator = SyncPagination()
+        pages, since, watermark = paginator.paginate_sources({
+            'medications': (Medication.objects.filter(user=user), 'changed_at'),
+            'schedules': (MedicationSchedule.objects.filter(user=user), 'changed_at'),
+            'intakes': (MedicationIntake.objects.filter(user=user), 'changed_at'),
+            'notifications': (NotificationSettings.objects.filter(user=user), 'updated_at'),
+            'deleted': (Tombstone.objects.filter(user=user), 'deleted_at'),
+        }, request, since, watermark)
+
+        deleted = {resource: [] for resource in RESOURCES.values()}
+        for tombstone in pages['deleted']:
+            deleted[tombstone.resource].append(tombstone.object_id)
+
+        return Response({
+            'medications': MedicationSerializer(pages['medications'], many=True, context=context).data,
+            'schedules': MedicationScheduleSerializer(pages['schedules'], many=True, context=context).data,
+            'intakes': MedicationIntakeSerializer(pages['intakes'], many=True, context=context).data,
+            'notifications': NotificationSettingsSerializer(pages['notifications'], many=True, context=context).data,
+            'deleted': deleted,
+            # одна и та же на всех страницах: передавать в since после последней
+            'watermark': watermark,
+        }, headers=paginator.get_headers())
+
+
+class BatchView(APIView):
+    # POST /api/batch/ - очередь офлайн-изменений одним запросом и одной транзакцией
+    permission_classes = [permissions.IsAuthenticated]
+
+    @retry_on_locked
+    def post(self, request):
+        operations = request.data.get('operations') if isinstance(request.data, dict) else None
+        validate_operations(operations)
+        committed, results = Batch(request, operations).run()
+        return Response(
+            {'committed': committed, 'results': results},
+            status=status.HTTP_200_OK if committed else status.HTTP_400_BAD_REQUEST
+        )
+
+
+class AdherenceStatsView(APIView):
+    # GET /api/stats/adherence/?from=YYYY-MM-DD&to=YYYY-MM-DD&groupBy=day|week|medication
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        end = parse_date_param(request, 'to', date.today())
+        start = parse_date_param(request, 'from', end - timedelta(days=29))
+        if end < start:
+            raise ValidationError({'to': 'Must not be earlier than from.'})
+        if (end - start).days >= MAX_STATS_RANGE_DAYS:
+            raise ValidationError({'to': f'Range must not exceed {MAX_STATS_RANGE_DAYS} days.'})
+        group_by = request.query_params.get('groupBy', 'day')
+        if group_by not in GROUP_BY:
+            raise ValidationError({'groupBy': f'Must be one of: {", ".join(GROUP_BY)}.'})
+
+        result = adherence(request.user.pk, start, end, group_by)
+        return Response({'from': start.isoformat(), 'to': end.isoformat(), 'groupBy': group_by, **result})
+
+
+class CalendarView(APIView):
+    # GET /api/calendar/?month=YYYY-MM - счётчики taken/missed/pending на каждый день месяца для экрана календаря
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        value = request.query_params.get('month')
+        if value:
+            try:
+                year, month = (int(part) for part in value.split('-'))
+                first = date(year, month, 1)
+            except ValueError:
+                raise ValidationError({'month': 'Month must be in YYYY-MM format.'})
+        else:
+            first = date.today().replace(day=1)
+        last = first.replace(day=calendar.monthrange(first.year, first.month)[1])
+
+        days = month_calendar(request.user.pk, first, last, archived=first < archive_cutoff())
+        return Response({'month': first.strftime('%Y-%m'), 'days': days})
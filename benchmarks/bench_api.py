@@ -0,0 +1,365 @@
+"""
+Бенчмарки эндпоинтов API на синтетических данных разного масштаба (api/seed.py, как seed_population).
+Не входят в обычный прогон тестов, запускаются явно:
+
+    python -m pytest benchmarks/bench_api.py -q
+    BENCH_SCALES=small,medium BENCH_ITERATIONS=50 python -m pytest benchmarks/bench_api.py -q
+
+Результаты пишутся в benchmarks/results/<коммит>.json (или в BENCH_OUTPUT),
+сравнение двух прогонов - python benchmarks/compare.py old.json new.json.
+"""
+import os
+from datetime import date, timedelta
+
+import pytest
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from rest_framework.authtoken.models import Token
+
+from api.models import Medication, MedicationIntake, MedicationSchedule, User
+from api.seed import seed_population
+from benchmarks.harness import Results, measure
+
+# масштаб -> лекарств у пользователя; за DAYS дней истории это примерно 1 000 / 10 000 / 100 000 приёмов
+SCALES = {'small': 10, 'medium': 100, 'large': 1_000}
+DAYS = 90
+TIMESTAMP = 1_714_825_000_000
+
+SELECTED_SCALES = [scale for scale in os.environ.get('BENCH_SCALES', ','.join(SCALES)).split(',') if scale]
+ITERATIONS = int(os.environ.get('BENCH_ITERATIONS', 20))
+PASSWORD = 'bench-password'
+
+CASES = {}
+
+
+def case(name, iterations=None):
+    # функция случая возвращает (метод, путь, вызов, подготовка); подготовка не входит в замер
+    def register(func):
+        CASES[name] = (func, iterations)
+        return func
+    return register
+
+
+def medication_payload(medication_id):
+    return {
+        'id': medication_id, 'name': 'Бенчмарк', 'form': 'tablet', 'dosagePerUnit': '500mg', 'unit': 'мг',
+        'instructions': 'После еды', 'totalQuantity': 20, 'remainingQuantity': 20, 'lowStockThreshold': 5,
+        'trackStock': True, 'iconName': 'pill', 'iconColor': 'blue', 'createdAt': TIMESTAMP, 'updatedAt': TIMESTAMP,
+    }
+
+
+def schedule_payload(schedule_id, medication_id):
+    return {
+        'id': schedule_id, 'medicationId': medication_id, 'frequency': 'daily', 'days': [], 'dates': [],
+        'times': [{'time': '09:00', 'dosage': '1', 'unit': 'мг'}], 'mealRelation': 'after_meal',
+        'startDate': date.today().isoformat(), 'createdAt': TIMESTAMP, 'updatedAt': TIMESTAMP,
+    }
+
+
+def intake_payload(intake_id, schedule_id, medication_id):
+    return {
+        'id': intake_id, 'scheduleId': schedule_id, 'medicationId': medication_id, 'scheduledTime': '09:00',
+        'scheduledDate': date.today().isoformat(), 'status': 'pending', 'createdAt': TIMESTAMP,
+        'updatedAt': TIMESTAMP, 'medicationName': 'Лекарство 0', 'mealRelation': 'after_meal',
+        'dosagePerUnit': '500mg', 'dosageByTime': '1', 'unit': 'мг', 'instructions': 'После еды',
+        'iconName': 'pill', 'iconColor': 'blue',
+    }
+
+
+# --- лекарства ---
+
+@case('medications.list')
+def medications_list(client, data):
+    url = reverse('medication-list')
+    return 'GET', url, lambda _: client.get(url), None
+
+
+@case('medications.list_page_1000')
+def medications_list_page(client, data):
+    url = reverse('medication-list')
+    return 'GET', f'{url}?limit=1000', lambda _: client.get(url, {'limit': 1000}), None
+
+
+@case('medications.retrieve')
+def medications_retrieve(client, data):
+    url = reverse('medication-detail', kwargs={'pk': f'{data["user"].id}-m0'})
+    return 'GET', url, lambda _: client.get(url), None
+
+
+@case('medications.create')
+def medications_create(client, data):
+    url = reverse('medication-list')
+    return 'POST', url, lambda payload: client.post(url, payload, format='json'), \
+        lambda index: medication_payload(f'bench-m{index}')
+
+
+@case('medications.partial_update')
+def medications_partial_update(client, data):
+    url = reverse('medication-detail', kwargs={'pk': f'{data["user"].id}-m0'})
+    return 'PATCH', url, lambda name: client.patch(url, {'name': name}, format='json'), \
+        lambda index: f'Лекарство {index}'
+
+
+@case('medications.destroy')
+def medications_destroy(client, data):
+    def setup(index):
+        return Medication.objects.create(
+            id=f'bench-d{index}', user=data['user'], name='Бенчмарк', form='tablet', unit='мг',
+            instructions='-', total_quantity=1, remaining_quantity=1, low_stock_threshold=0, icon_name='pill',
+            icon_color='blue', created_at=TIMESTAMP, updated_at=TIMESTAMP,
+        ).pk
+    return 'DELETE', reverse('medication-detail', kwargs={'pk': 'id'}), \
+        lambda pk: client.delete(reverse('medication-detail', kwargs={'pk': pk})), setup
+
+
+# --- расписания ---
+
+@case('schedules.list')
+def schedules_list(client, data):
+    url = reverse('schedule-list')
+    return 'GET', url, lambda _: client.get(url), None
+
+
+@case('schedules.retrieve')
+def schedules_retrieve(client, data):
+    url = reverse('schedule-detail', kwargs={'pk': f'{data["user"].id}-s0'})
+    return 'GET', url, lambda _: client.get(url), None
+
+
+@case('schedules.create')
+def schedules_create(client, data):
+    url = reverse('schedule-list')
+    medication_id = f'{data["user"].id}-m0'
+    return 'POST', url, lambda payload: client.post(url, payload, format='json'), \
+        lambda index: schedule_payload(f'bench-s{index}', medication_id)
+
+
+@case('schedules.partial_update')
+def schedules_partial_update(client, data):
+    url = reverse('schedule-detail', kwargs={'pk': f'{data["user"].id}-s0'})
+    relations = MedicationSchedule.MealRelation.values
+    return 'PATCH', url, lambda relation: client.patch(url, {'mealRelation': relation}, format='json'), \
+        lambda index: relations[index % len(relations)]
+
+
+@case('schedules.destroy')
+def schedules_destroy(client, data):
+    medication_id = f'{data["user"].id}-m0'
+
+    def setup(index):
+        return MedicationSchedule.objects.create(
+            id=f'bench-ds{index}', user=data['user'], medication_id=medication_id, frequency='daily',
+            times=[{'time': '09:00', 'dosage': '1', 'unit': 'мг'}], meal_relation='after_meal',
+            start_date=date.today(), created_at=TIMESTAMP, updated_at=TIMESTAMP,
+        ).pk
+    return 'DELETE', reverse('schedule-detail', kwargs={'pk': 'id'}), \
+        lambda pk: client.delete(reverse('schedule-detail', kwargs={'pk': pk})), setup
+
+
+@case('schedules.occurrences_30d')
+def schedules_occurrences(client, data):
+    url = reverse('schedule-occurrences')
+    params = {'from': date.today().isoformat(), 'to': (date.today() + timedelta(days=29)).isoformat()}
+    return 'GET', f'{url}?from=&to=+29d', lambda _: client.get(url, params), None
+
+
+# --- приёмы ---
+
+@case('intakes.list')
+def intakes_list(client, data):
+    url = reverse('intake-list')
+    return 'GET', url, lambda _: client.get(url), None
+
+
+@case('intakes.list_today')
+def intakes_list_today(client, data):
+    url = reverse('intake-list')
+    return 'GET', f'{url}?date=today', lambda _: client.get(url, {'date': date.today().isoformat()}), None
+
+
+@case('intakes.list_month')
+def intakes_list_month(client, data):
+    url = reverse('intake-list')
+    params = {'from': (date.today() - timedelta(days=30)).isoformat(), 'to': date.today().isoformat(),
+              'limit': 1000}
+    return 'GET', f'{url}?from=-30d&to=today&limit=1000', lambda _: client.get(url, params), None
+
+
+@case('intakes.retrieve')
+def intakes_retrieve(client, data):
+    url = reverse('intake-detail', kwargs={'pk': data['intake_ids'][0]})
+    return 'GET', url, lambda _: client.get(url), None
+
+
+@case('intakes.create')
+def intakes_create(client, data):
+    url = reverse('intake-list')
+    user_id = data['user'].id
+    return 'POST', url, lambda payload: client.post(url, payload, format='json'), \
+        lambda index: intake_payload(f'bench-i{index}', f'{user_id}-s0', f'{user_id}-m0')
+
+
+@case('intakes.partial_update_status')
+def intakes_partial_update(client, data):
+    def setup(index):
+        # туда и обратно по одному и тому же приёму: taken списывает остаток, pending возвращает
+        return data['intake_ids'][0], ('taken', 'pending')[index % 2]
+    return 'PATCH', reverse('intake-detail', kwargs={'pk': 'id'}), \
+        lambda arg: client.patch(reverse('intake-detail', kwargs={'pk': arg[0]}), {'status': arg[1]}, format='json'), \
+        setup
+
+
+@case('intakes.destroy')
+def intakes_destroy(client, data):
+    user_id = data['user'].id
+    schedule = MedicationSchedule.objects.select_related('medication').get(pk=f'{user_id}-s0')
+
+    def setup(index):
+        return MedicationIntake.objects.create(
+            id=f'bench-di{index}', user=data['user'], schedule=schedule, medication=schedule.medication,
+            scheduled_date=date.today().isoformat(), scheduled_time='23:59', status='pending',
+            medication_name='-', meal_relation='after_meal', instructions='-', dosage_by_time='1', unit='мг',
+            icon_name='pill', icon_color='blue', created_at=TIMESTAMP, updated_at=TIMESTAMP,
+        ).pk
+    return 'DELETE', reverse('intake-detail', kwargs={'pk': 'id'}), \
+        lambda pk: client.delete(reverse('intake-detail', kwargs={'pk': pk})), setup
+
+
+@case('intakes.materialize_1d', iterations=5)
+def intakes_materialize(client, data):
+    url = reverse('intake-materialize')
+    return 'POST', url, lambda _: client.post(url, {'days': 1}, format='json'), None
+
+
+# --- настройки уведомлений ---
+
+@case('notifications.list')
+def notifications_list(client, data):
+    url = reverse('notification-list')
+    return 'GET', url, lambda _: client.get(url), None
+
+
+@case('notifications.partial_update')
+def notifications_partial_update(client, data):
+    url = reverse('notification-detail', kwargs={'pk': data['user'].notification_settings.pk})
+    return 'PATCH', url, \
+        lambda minutes: client.patch(url, {'minutes_before_scheduled_time': minutes}, format='json'), \
+        lambda index: 5 + index % 10
+
+
+# --- синхронизация, пакетная запись, статистика ---
+
+@case('sync.incremental')
+def sync_incremental(client, data):
+    url = reverse('sync')
+    # примерно 100 последних изменённых приёмов
+    since = data['recent_since']
+    return 'GET', f'{url}?since=recent', lambda _: client.get(url, {'since': since}), None
+
+
+@case('sync.full', iterations=3)
+def sync_full(client, data):
+    url = reverse('sync')
+    return 'GET', f'{url}?since=0', lambda _: client.get(url, {'since': 0}), None
+
+
+@case('batch.status_updates_10')
+def batch_status_updates(client, data):
+    url = reverse('batch')
+
+    def setup(index):
+        status = ('taken', 'pending')[index % 2]
+        return [
+            {'op': 'update', 'resource': 'intakes', 'id': intake_id, 'data': {'status': status}}
+            for intake_id in data['intake_ids'][:10]
+        ]
+    return 'POST', url, lambda operations: client.post(url, {'operations': operations}, format='json'), setup
+
+
+@case('stats.adherence_30d_by_day')
+def stats_by_day(client, data):
+    url = reverse('stats-adherence')
+    return 'GET', f'{url}?groupBy=day', lambda _: client.get(url, {'groupBy': 'day'}), None
+
+
+@case('stats.adherence_365d_by_medication')
+def stats_by_medication(client, data):
+    url = reverse('stats-adherence')
+    params = {'from': (date.today() - timedelta(days=364)).isoformat(), 'groupBy': 'medication'}
+    return 'GET', f'{url}?from=-365d&groupBy=medication', lambda _: client.get(url, params), None
+
+
+# --- аутентификация ---
+
+@case('auth.login', iterations=5)
+def auth_login(client, data):
+    url = '/api/auth/token/login/'
+    anonymous = APIClient()
+    return 'POST', url, \
+        lambda _: anonymous.post(url, {'email': data['user'].email, 'password': PASSWORD}, format='json'), None
+
+
+@case('auth.register', iterations=5)
+def auth_register(client, data):
+    url = '/api/auth/users/'
+    anonymous = APIClient()
+    return 'POST', url, lambda payload: anonymous.post(url, payload, format='json'), \
+        lambda index: {'id': f'bench-u{index}', 'name': f'Bench {index}', 'email': f'bench-u{index}@bench.local',
+                       'password': 'Str0ng-bench-pass'}
+
+
+@case('auth.me')
+def auth_me(client, data):
+    url = '/api/auth/users/me/'
+    return 'GET', url, lambda _: client.get(url), None
+
+
+# --- фикстуры и сам прогон ---
+
+@pytest.fixture(scope='session')
+def results():
+    collected = Results()
+    yield collected
+    if collected.rows:
+        print(f'\nbenchmark results: {collected.write()}')
+
+
+@pytest.fixture(scope='module', params=SELECTED_SCALES)
+def dataset(request, django_db_setup, django_db_blocker):
+    # данные создаются один раз на масштаб и не откатываются; изменения внутри замеров откатываются
+    scale = request.param
+    medications = SCALES[scale]
+    prefix = f'bench-{scale}-'
+    with django_db_blocker.unblock():
+        # тот же генератор, что у manage.py seed_population; индексы не снимаем - это тестовая база
+        counts = seed_population(1, prefix=prefix, medications=(medications, medications), days=DAYS,
+                                 password=PASSWORD, defer_indexes=False)
+        user = User.objects.get(pk=f'{prefix}0')
+        intakes = MedicationIntake.objects.filter(user=user)
+        recent = list(intakes.order_by('-updated_at').values_list('updated_at', flat=True)[:101])
+        data = {
+            'scale': scale, 'user': user, 'token': Token.objects.get(user=user).key,
+            'medications': medications, 'intakes': counts['intakes'],
+            'intake_ids': list(intakes.order_by('-scheduled_date', 'id').values_list('id', flat=True)[:10]),
+            'recent_since': recent[-1],
+        }
+    return data
+
+
+@pytest.fixture
+def client(dataset):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Token {dataset["token"]}')
+    return client
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('name', list(CASES))
+def test_endpoint(name, dataset, client, results):
+    func, iterations = CASES[name]
+    method, path, call, setup = func(client, dataset)
+    stats = measure(call, min(iterations or ITERATIONS, ITERATIONS), setup)
+    assert all(status < 400 for status in stats['statuses']), stats['statuses']
+    results.add(name, dataset['scale'], method, path,
+                {**stats, 'medications': dataset['medications'], 'intakes': dataset['intakes']})
@@ -0,0 +1,128 @@
+"""
+Синхронные и async-эндпоинты чтения (api/async_views.py) под высокой конкурентностью.
+Запросы идут прямо в ASGI-приложение (backend/asgi.py) из одного event loop, как от ASGI-сервера:
+синхронное представление Django выполняет в потоке, async - в самом цикле.
+Не входит в обычный прогон тестов, запускается явно:
+
+    python -m pytest benchmarks/bench_async.py -q -s
+    BENCH_SCALES=medium BENCH_CONCURRENCY=50,200 BENCH_REQUESTS=1000 python -m pytest benchmarks/bench_async.py -q -s
+
+Результаты пишутся в benchmarks/results/<коммит>-async.json (или в BENCH_OUTPUT).
+"""
+import asyncio
+import os
+import time
+from datetime import date
+from urllib.parse import urlencode
+
+import pytest
+from django.core.asgi import get_asgi_application
+from django.urls import reverse
+
+from benchmarks.bench_api import dataset  # noqa: F401 - фикстура с данными того же масштаба
+from benchmarks.harness import Results, percentile
+
+CONCURRENCY = [int(value) for value in os.environ.get('BENCH_CONCURRENCY', '10,100').split(',') if value]
+REQUESTS = int(os.environ.get('BENCH_REQUESTS', 500))
+
+# имя -> (синхронный url, async url, параметры синхронного запроса)
+PAIRS = {
+    'medications.list': ('medication-list', 'async-medication-list', {}),
+    'schedules.list': ('schedule-list', 'async-schedule-list', {}),
+    'intakes.today': ('intake-list', 'async-intakes-today', {'date': date.today().isoformat()}),
+}
+
+
+async def asgi_get(application, path, query, token):
+    # минимальный HTTP scope ASGI; ответ собирается из сообщений send
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+        'path': path, 'raw_path': path.encode(), 'query_string': urlencode(query).encode(), 'root_path': '',
+        'headers': [(b'host', b'testserver'), (b'authorization', f'Token {token}'.encode())],
+        'client': ('127.0.0.1', 0), 'server': ('testserver', 80),
+    }
+    disconnect = asyncio.Event()
+    request_sent = False
+    response = {'headers': {}}
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        # Django слушает разрыв соединения до конца ответа
+        await disconnect.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+            response['headers'] = {name.decode().lower(): value.decode() for name, value in message['headers']}
+
+    await application(scope, receive, send)
+    disconnect.set()
+    return response
+
+
+async def load(application, path, query, token, concurrency, requests):
+    # requests запросов, не больше concurrency одновременно
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, statuses, queries = [], set(), []
+
+    async def one():
+        async with semaphore:
+            started = time.perf_counter()
+            response = await asgi_get(application, path, query, token)
+            latencies.append((time.perf_counter() - started) * 1000)
+            statuses.add(response['status'])
+            queries.append(int(response['headers'].get('x-query-count', 0)))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - started
+    return {
+        'iterations': requests,
+        'concurrency': concurrency,
+        'rps': round(requests / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p90_ms': round(percentile(latencies, 90), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'max_ms': round(max(latencies), 3),
+        'queries': max(queries),
+        'statuses': sorted(statuses),
+    }
+
+
+@pytest.fixture(scope='session')
+def results():
+    collected = Results()
+    yield collected
+    if collected.rows:
+        print(f'\nbenchmark results: {collected.write(suffix="-async")}')
+
+
+@pytest.fixture
+def application(settings):
+    # X-Query-Count нужен для числа запросов в результатах
+    settings.QUERY_COUNT_HEADERS = True
+    return get_asgi_application()
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('concurrency', CONCURRENCY)
+@pytest.mark.parametrize('name', list(PAIRS))
+def test_sync_vs_async(name, concurrency, dataset, application, results):  # noqa: F811
+    sync_name, async_name, sync_query = PAIRS[name]
+    runs = {
+        'sync': (reverse(sync_name), sync_query),
+        'async': (reverse(async_name), {}),
+    }
+    for mode, (path, query) in runs.items():
+        # прогрев: кэш токена, ленивые импорты, подключения
+        asyncio.run(load(application, path, query, dataset['token'], concurrency, concurrency))
+        stats = asyncio.run(load(application, path, query, dataset['token'], concurrency, REQUESTS))
+        assert stats['statuses'] == [200], stats['statuses']
+        results.add(f'{name}.{mode}.c{concurrency}', dataset['scale'], 'GET', path,
+                    {**stats, 'medications': dataset['medications'], 'intakes': dataset['intakes']})
+        print(f'\n{name:<18} {mode:<5} c={concurrency:<4} {stats["rps"]:>8.1f} req/s  '
+              f'p50 {stats["p50_ms"]:>8.2f} ms  p99 {stats["p99_ms"]:>8.2f} ms  queries {stats["queries"]}')
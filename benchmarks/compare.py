@@ -0,0 +1,53 @@
+"""
+Сравнение двух прогонов бенчмарков:
+
+    python benchmarks/compare.py benchmarks/results/abc123.json benchmarks/results/def456.json --threshold 1.2
+
+Код возврата 1, если p50 какого-то случая вырос больше чем в threshold раз или выросло число запросов.
+"""
+import argparse
+import json
+import sys
+
+
+def load(path):
+    with open(path, encoding='utf-8') as file:
+        data = json.load(file)
+    return data['meta'], {(row['name'], row['scale']): row for row in data['results']}
+
+
+def compare(old, new, threshold):
+    lines, regressions = [], 0
+    for key in sorted(set(old) & set(new)):
+        before, after = old[key], new[key]
+        ratio = after['p50_ms'] / before['p50_ms'] if before['p50_ms'] else float('inf')
+        slower = ratio > threshold
+        more_queries = after['queries'] > before['queries']
+        mark = ' <-- regression' if slower or more_queries else ''
+        regressions += bool(mark)
+        lines.append(
+            f'{key[0]:<40} {key[1]:<7} p50 {before["p50_ms"]:>9.2f} -> {after["p50_ms"]:>9.2f} ms ({ratio:5.2f}x)  '
+            f'queries {before["queries"]:>3} -> {after["queries"]:<3}{mark}'
+        )
+    return lines, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Сравнение результатов двух прогонов бенчмарков')
+    parser.add_argument('old')
+    parser.add_argument('new')
+    parser.add_argument('--threshold', type=float, default=1.2, help='допустимое замедление p50, раз')
+    args = parser.parse_args(argv)
+
+    old_meta, old = load(args.old)
+    new_meta, new = load(args.new)
+    print(f'{old_meta["revision"]} -> {new_meta["revision"]}')
+    lines, regressions = compare(old, new, args.threshold)
+    print('\n'.join(lines))
+    for key in sorted(set(old) ^ set(new)):
+        print(f'{key[0]:<40} {key[1]:<7} only in {"old" if key in old else "new"}')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,95 @@
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+import django
+
+from api.querycount import QueryCounter
+
+RESULTS_DIR = Path(__file__).resolve().parent / 'results'
+
+
+def percentile(values, percent):
+    # ближайший ранг: p50 из [1, 2, 3, 4] - 2
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, -(-len(ordered) * percent // 100) - 1))
+    return ordered[int(index)]
+
+
+def measure(call, iterations, setup=None):
+    """
+    Запускает call(arg) iterations раз (arg - результат setup(i), подготовка не замеряется).
+    Возвращает задержки (мс), число запросов и пиковую память одного дополнительного прогона под tracemalloc.
+    """
+    latencies, queries, statuses = [], [], set()
+    for index in range(iterations + 1):
+        arg = setup(index) if setup else None
+        with QueryCounter() as counter:
+            started = time.perf_counter()
+            response = call(arg)
+            elapsed = time.perf_counter() - started
+        statuses.add(response.status_code)
+        # первый прогон - прогрев (кэш токена, ленивые импорты)
+        if index:
+            latencies.append(elapsed * 1000)
+            queries.append(counter.count)
+
+    # tracemalloc замедляет выполнение, поэтому память меряется отдельным прогоном
+    arg = setup(iterations + 1) if setup else None
+    tracemalloc.start()
+    try:
+        call(arg)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'iterations': iterations,
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p90_ms': round(percentile(latencies, 90), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'mean_ms': round(sum(latencies) / len(latencies), 3),
+        'min_ms': round(min(latencies), 3),
+        'max_ms': round(max(latencies), 3),
+        'queries': max(queries),
+        'peak_kib': round(peak / 1024, 1),
+        'statuses': sorted(statuses),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=Path(__file__).resolve().parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+class Results:
+    """Результаты прогона; пишутся одним JSON-файлом для сравнения между коммитами (benchmarks/compare.py)."""
+
+    def __init__(self):
+        self.rows = []
+        self.meta = {
+            'revision': git_revision(),
+            'started_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'platform': platform.platform(),
+        }
+
+    def add(self, name, scale, method, path, stats):
+        self.rows.append({'name': name, 'scale': scale, 'method': method, 'path': path, **stats})
+
+    def write(self, path=None, suffix=''):
+        path = Path(path or os.environ.get('BENCH_OUTPUT') or RESULTS_DIR / f'{self.meta["revision"]}{suffix}.json')
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps({'meta': self.meta, 'results': self.rows}, ensure_ascii=False, indent=2))
+        return path